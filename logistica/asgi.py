@@ -2,6 +2,8 @@
 ASGI config for logistica project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (uvicorn, daphne) to enable the Server-Sent
+Events stream at ``/api/despachos/stream/``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
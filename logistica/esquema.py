@@ -0,0 +1,79 @@
+"""OpenAPI documentation served from a pre-generated JSON file.
+
+``manage.py generar_openapi`` writes the schema to
+``settings.LOGISTICA_OPENAPI_JSON``; ``/swagger/openapi.json`` serves that
+file with an ETag and long-lived caching headers, and the Swagger UI reads
+it through ``SWAGGER_SETTINGS["SPEC_URL"]``. ``drf_yasg`` is only imported
+here, on first use, so workers and management commands don't pay for it.
+"""
+import hashlib
+from functools import lru_cache
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.http import condition, require_safe
+
+INFO = {
+    "title": "Logistica API",
+    "default_version": "v1",
+    "description": "Documentación de la API de Logistica Global Ltda.",
+}
+
+
+def generar_esquema() -> bytes:
+    """Introspect every API view and return the schema as JSON bytes."""
+    from drf_yasg import openapi
+    from drf_yasg.codecs import OpenAPICodecJson
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    generador = OpenAPISchemaGenerator(openapi.Info(**INFO))
+    return OpenAPICodecJson(validators=[]).encode(generador.get_schema(public=True))
+
+
+def escribir_esquema(ruta=None):
+    ruta = ruta or settings.LOGISTICA_OPENAPI_JSON
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    contenido = generar_esquema()
+    ruta.write_bytes(contenido)
+    return ruta, contenido
+
+
+@lru_cache(maxsize=4)
+def _leer(ruta, modificado):
+    contenido = ruta.read_bytes()
+    return contenido, hashlib.sha256(contenido).hexdigest()[:32]
+
+
+def _esquema():
+    ruta = settings.LOGISTICA_OPENAPI_JSON
+    if not ruta.exists():
+        # Sin paso de build (p. ej. en desarrollo) se genera una única vez.
+        escribir_esquema(ruta)
+    return _leer(ruta, ruta.stat().st_mtime_ns)
+
+
+@require_safe
+@condition(etag_func=lambda request: _esquema()[1])
+def openapi_json(request):
+    response = HttpResponse(_esquema()[0], content_type="application/json")
+    response["Cache-Control"] = f"public, max-age={settings.LOGISTICA_OPENAPI_MAX_AGE}"
+    return response
+
+
+@lru_cache(maxsize=1)
+def _vista_swagger():
+    from drf_yasg import openapi
+    from drf_yasg.views import get_schema_view
+    from rest_framework import permissions
+
+    schema_view = get_schema_view(
+        openapi.Info(**INFO),
+        public=True,
+        permission_classes=(permissions.AllowAny,),
+    )
+    return schema_view.with_ui("swagger", cache_timeout=0)
+
+
+def swagger_ui(request, *args, **kwargs):
+    """Swagger UI page; the schema itself comes from ``openapi_json``."""
+    return _vista_swagger()(request, *args, **kwargs)
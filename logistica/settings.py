@@ -47,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'transporte.metricas.MetricasMiddleware',
      'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -55,6 +56,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'transporte.perfiles.PerfilMiddleware',
 ]
 
 CORS_ALLOW_ALL_ORIGINS = True
@@ -137,8 +139,90 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'transporte.authentication.CachedJWTAuthentication',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'transporte.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'transporte.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    'DEFAULT_PAGINATION_CLASS': 'transporte.paginacion.PaginacionCursor',
+    'PAGE_SIZE': 100,
+    'DEFAULT_THROTTLE_CLASSES': (
+        'transporte.throttling.BaldeThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'api': '1200/min',
+        'despachos': '600/min',
+        'reportes': '60/min',
+        'trabajos': '120/min',
+    },
+}
+
+# Baldes de throttling compartidos entre workers y umbrales de descarga (transporte.throttling).
+TRANSPORTE_THROTTLE_SQLITE = BASE_DIR / 'var' / 'throttle.sqlite3'
+TRANSPORTE_DESCARGA = {
+    'cola_maxima': 200,
+    'latencia_ms': 3000,
+    'reintentar_en': 10,
+}
+
+SIMPLE_JWT = {
+    'TOKEN_OBTAIN_SERIALIZER': 'transporte.serializers.TokenConPermisosSerializer',
+}
+
+# Caché en proceso de tokens verificados y datos de usuario (transporte.authentication).
+# Con TRANSPORTE_JWT_SIN_ESTADO se confía en los claims firmados del token.
+TRANSPORTE_JWT_CACHE_TTL = 60
+TRANSPORTE_JWT_CACHE_MAX = 10000
+TRANSPORTE_JWT_SIN_ESTADO = os.environ.get('TRANSPORTE_JWT_SIN_ESTADO') == '1'
+
+# Stream de cambios de despachos (SSE). "memoria" sirve solo con un proceso:
+# cada worker ve únicamente sus propios eventos. Con "sqlite" los eventos se
+# comparten entre procesos worker mediante un archivo local en lugar de un broker.
+TRANSPORTE_EVENTOS_BACKEND = os.environ.get('TRANSPORTE_EVENTOS_BACKEND', 'memoria')
+TRANSPORTE_EVENTOS_SQLITE = BASE_DIR / 'var' / 'eventos.sqlite3'
+TRANSPORTE_EVENTOS_BUFFER = 1000
+
+# Resultados de los trabajos en segundo plano (manage.py procesar_trabajos).
+TRANSPORTE_TRABAJOS_DIR = BASE_DIR / 'var' / 'trabajos'
+
+# Métricas Prometheus en /metrics (transporte.metricas), sumadas entre workers
+# en un archivo local. Sin token, solo usuarios staff pueden leerlas.
+TRANSPORTE_METRICAS_SQLITE = BASE_DIR / 'var' / 'metricas.sqlite3'
+TRANSPORTE_METRICAS_TOKEN = os.environ.get('TRANSPORTE_METRICAS_TOKEN', '')
+
+# Perfiles de CPU o memoria bajo demanda (transporte.perfiles): solo usuarios
+# staff con la cabecera X-Perfil o ?_perfil=1|memoria. Se conservan los más recientes.
+TRANSPORTE_PERFILES_DIR = BASE_DIR / 'var' / 'perfiles'
+TRANSPORTE_PERFILES_MAX = 100
+# Fracción de solicitudes cuyo pico de memoria se mide con tracemalloc para la
+# métrica http_memoria_pico_bytes. Mientras mide, el proceso corre más lento.
+TRANSPORTE_MEMORIA_MUESTREO = float(os.environ.get('TRANSPORTE_MEMORIA_MUESTREO', '0'))
+
+# Días tras los cuales un despacho ENTREGADO pasa a la tabla de archivo.
+TRANSPORTE_ARCHIVO_DIAS = 180
+
+# Caché de opciones de filtros y fragmentos HTML del panel (transporte.cache).
+# Con varios procesos worker debe usarse un backend compartido (Redis, Memcached).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'transporte',
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    }
+}
+
+# Esquema OpenAPI pregenerado con manage.py generar_openapi (logistica.esquema).
+LOGISTICA_OPENAPI_JSON = BASE_DIR / 'var' / 'openapi.json'
+LOGISTICA_OPENAPI_MAX_AGE = 3600
+
+SWAGGER_SETTINGS = {
+    'SPEC_URL': 'schema-json',
 }
 
 LOGIN_URL = 'login'
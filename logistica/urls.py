@@ -16,34 +16,28 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import include, path
-from drf_yasg import openapi
-from drf_yasg.views import get_schema_view
-from rest_framework import permissions
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
-from transporte.views import home, login_view, logout_view
-
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Logistica API",
-        default_version="v1",
-        description="Documentación de la API de Logistica Global Ltda.",
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
+from logistica.esquema import openapi_json, swagger_ui
+from transporte import perfiles
+from transporte.metricas import metricas
+from transporte.views import autocompletar, home, login_view, logout_view
 
 urlpatterns = [
+    # Antes de admin.site.urls, cuyo catch-all respondería 404.
+    path("admin/perfiles/", admin.site.admin_view(perfiles.lista), name="perfiles"),
+    path(
+        "admin/perfiles/<str:nombre>/", admin.site.admin_view(perfiles.detalle), name="perfil"
+    ),
     path("admin/", admin.site.urls),
     path("", home, name="home"),
     path("login/", login_view, name="login"),
     path("logout/", logout_view, name="logout"),
+    path("autocompletar/<str:modulo>/", autocompletar, name="autocompletar"),
     path("api/", include("transporte.urls")),
-    path(
-        "swagger/",
-        schema_view.with_ui("swagger", cache_timeout=0),
-        name="schema-swagger-ui",
-    ),
+    path("swagger/", swagger_ui, name="schema-swagger-ui"),
+    path("swagger/openapi.json", openapi_json, name="schema-json"),
+    path("metrics", metricas, name="metricas"),
 ]
 
 urlpatterns += [
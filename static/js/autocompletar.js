@@ -0,0 +1,47 @@
+// Convierte los <select data-autocomplete-url> en buscadores con carga bajo demanda.
+document.querySelectorAll("select[data-autocomplete-url]").forEach(function (select) {
+    const buscador = document.createElement("input");
+    buscador.type = "search";
+    buscador.className = "form-control form-control-sm mb-1";
+    buscador.placeholder = "Escribe para buscar…";
+    buscador.setAttribute("aria-label", "Buscar opciones");
+    select.parentNode.insertBefore(buscador, select);
+
+    let espera = null;
+    let controlador = null;
+
+    function cargar() {
+        if (controlador) controlador.abort();
+        controlador = new AbortController();
+        const url = select.dataset.autocompleteUrl + "?q=" + encodeURIComponent(buscador.value.trim());
+        fetch(url, { signal: controlador.signal, credentials: "same-origin" })
+            .then(function (respuesta) { return respuesta.json(); })
+            .then(function (datos) {
+                const actual = select.value;
+                const seleccionada = select.selectedOptions[0];
+                const vacia = select.querySelector('option[value=""]');
+                select.replaceChildren();
+                if (vacia) select.appendChild(vacia);
+                // La opción elegida se conserva aunque no coincida con la búsqueda.
+                if (actual && !datos.resultados.some(function (item) { return String(item.id) === actual; })) {
+                    select.appendChild(seleccionada);
+                }
+                datos.resultados.forEach(function (item) {
+                    const opcion = new Option(item.texto, item.id, false, String(item.id) === actual);
+                    select.appendChild(opcion);
+                });
+                if (!select.value && datos.resultados.length && buscador.value.trim()) {
+                    select.value = String(datos.resultados[0].id);
+                }
+            })
+            .catch(function () {});
+    }
+
+    buscador.addEventListener("input", function () {
+        clearTimeout(espera);
+        espera = setTimeout(cargar, 250);
+    });
+    select.addEventListener("focus", function () {
+        if (select.options.length <= 2) cargar();
+    }, { once: true });
+});
@@ -1,3 +1,170 @@
-from django.contrib import admin
+from collections import Counter
 
-# Register your models here.
+from django.contrib import admin, messages
+from django.db.models import F
+
+from .models import (
+    Aeronave,
+    Carga,
+    Cliente,
+    Conductor,
+    Despacho,
+    Piloto,
+    Ruta,
+    Ubicacion,
+    Vehiculo,
+)
+from .paginacion import ConteoEstimadoPaginator
+from .signals import filas_actualizadas
+
+
+def actualizar_en_bloque(modeladmin, request, queryset, **valores):
+    """Apply ``valores`` to the selected rows with a single UPDATE."""
+    filas = queryset.update(version=F("version") + 1, **valores)
+    filas_actualizadas.send(sender=queryset.model)
+    modeladmin.message_user(
+        request, f"{filas} registro(s) actualizado(s).", messages.SUCCESS
+    )
+
+
+def accion_valor(campo, valor, descripcion):
+    def accion(modeladmin, request, queryset):
+        actualizar_en_bloque(modeladmin, request, queryset, **{campo: valor})
+
+    accion.__name__ = f"marcar_{campo}_{str(valor).lower()}"
+    return admin.action(description=descripcion)(accion)
+
+
+def acciones_estado(Estado):
+    return [
+        accion_valor("estado", valor, f"Marcar como «{etiqueta}»")
+        for valor, etiqueta in Estado.choices
+    ]
+
+
+def accion_transicion(estado, etiqueta):
+    def accion(modeladmin, request, queryset):
+        total = queryset.count()
+        if total > Despacho.TRANSICION_MAXIMA:
+            modeladmin.message_user(
+                request,
+                f"Se seleccionaron {total} despachos; el máximo por cambio en bloque es "
+                f"{Despacho.TRANSICION_MAXIMA}.",
+                messages.ERROR,
+            )
+            return
+        resumen = Counter(resultado for resultado, _ in queryset.transicionar(estado).values())
+        modeladmin.message_user(
+            request,
+            f"{resumen['actualizado']} pasado(s) a «{etiqueta}», {resumen['sin_cambio']} ya lo "
+            f"estaban, {resumen['invalido'] + resumen['conflicto']} sin transición permitida.",
+            messages.SUCCESS,
+        )
+
+    accion.__name__ = f"transicionar_{estado.lower()}"
+    return admin.action(description=f"Pasar a «{etiqueta}»")(accion)
+
+
+def acciones_transicion():
+    """Bulk estado actions for Despacho, checked against ``Despacho.TRANSICIONES``."""
+    etiquetas = dict(Despacho.Estado.choices)
+    return [accion_transicion(estado, etiquetas[estado]) for estado in Despacho.TRANSICIONES]
+
+
+ACCIONES_ACTIVO = [
+    accion_valor("activo", True, "Marcar como activos"),
+    accion_valor("activo", False, "Marcar como inactivos"),
+]
+
+
+class TablaGrandeAdmin(admin.ModelAdmin):
+    """Changelist that never counts the whole table.
+
+    Searches go through the indexed ``clave`` prefix of models with
+    ``ClaveBusquedaMixin`` instead of ``icontains`` on every column.
+    """
+
+    paginator = ConteoEstimadoPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+    def get_search_results(self, request, queryset, search_term):
+        if search_term and hasattr(self.model, "buscar_por_prefijo"):
+            return self.model.buscar_por_prefijo(search_term, queryset), False
+        return super().get_search_results(request, queryset, search_term)
+
+
+@admin.register(Ubicacion)
+class UbicacionAdmin(TablaGrandeAdmin):
+    list_display = ["nombre", "clave"]
+    search_fields = ["clave"]
+
+
+@admin.register(Vehiculo)
+class VehiculoAdmin(TablaGrandeAdmin):
+    list_display = ["patente", "marca", "modelo", "capacidad_kg", "anio", "estado"]
+    list_filter = ["estado"]
+    search_fields = ["clave"]
+    actions = acciones_estado(Vehiculo.Estado)
+
+
+@admin.register(Aeronave)
+class AeronaveAdmin(TablaGrandeAdmin):
+    list_display = ["matricula", "fabricante", "modelo", "capacidad_kg", "estado"]
+    list_filter = ["estado"]
+    search_fields = ["clave"]
+    actions = acciones_estado(Aeronave.Estado)
+
+
+@admin.register(Conductor)
+class ConductorAdmin(TablaGrandeAdmin):
+    list_display = ["run", "nombre", "licencia", "telefono", "activo"]
+    list_filter = ["activo"]
+    search_fields = ["clave"]
+    actions = ACCIONES_ACTIVO
+
+
+@admin.register(Piloto)
+class PilotoAdmin(TablaGrandeAdmin):
+    list_display = ["run", "nombre", "licencia", "horas_vuelo", "activo"]
+    list_filter = ["activo"]
+    search_fields = ["clave"]
+    actions = ACCIONES_ACTIVO
+
+
+@admin.register(Cliente)
+class ClienteAdmin(TablaGrandeAdmin):
+    list_display = ["rut", "nombre", "telefono", "email"]
+    search_fields = ["clave"]
+
+
+@admin.register(Carga)
+class CargaAdmin(TablaGrandeAdmin):
+    list_display = ["descripcion", "cliente", "peso_kg", "tipo", "valor_estimado"]
+    list_select_related = ["cliente"]
+    autocomplete_fields = ["cliente"]
+    search_fields = ["clave"]
+
+
+@admin.register(Ruta)
+class RutaAdmin(TablaGrandeAdmin):
+    list_display = ["codigo", "origen", "destino", "tipo_transporte", "duracion_estimada_min"]
+    list_filter = ["tipo_transporte"]
+    list_select_related = ["origen", "destino"]
+    autocomplete_fields = ["origen", "destino"]
+    search_fields = ["clave"]
+
+
+@admin.register(Despacho)
+class DespachoAdmin(TablaGrandeAdmin):
+    list_display = ["codigo", "fecha", "ruta", "estado", "vehiculo", "aeronave", "carga"]
+    list_filter = ["estado"]
+    list_select_related = [
+        "ruta__origen", "ruta__destino", "vehiculo", "aeronave", "carga__cliente",
+    ]
+    autocomplete_fields = ["ruta", "vehiculo", "aeronave", "conductor", "piloto"]
+    # Cargas crece con cada despacho: un selector por id evita listarlas.
+    raw_id_fields = ["carga"]
+    search_fields = ["=codigo"]
+    # Las transiciones validan el estado de origen y quedan en el historial.
+    actions = acciones_transicion()
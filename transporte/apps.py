@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class TransporteConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'transporte'
+
+    def ready(self):
+        from . import authentication, cache, eventos, metricas, rollups, signals, transiciones  # noqa: F401
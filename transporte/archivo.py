@@ -0,0 +1,127 @@
+"""Hot/cold split of delivered despachos.
+
+``archivar`` moves old ENTREGADO rows from ``Despacho`` into
+``DespachoArchivado`` in batches. Default reads only see the hot table;
+``?include_archived=1`` unions both through ``combinar``.
+"""
+from django.db import transaction
+from django.db.models import F, OrderBy, Value
+
+from .models import Despacho, DespachoArchivado
+from .signals import sin_notificaciones
+
+PARAMETRO = "include_archived"
+
+
+def incluye_archivados(request) -> bool:
+    parametros = getattr(request, "query_params", request.GET)
+    return parametros.get(PARAMETRO) in ("1", "true", "True")
+
+
+def campos_comunes():
+    destino = {f.attname for f in DespachoArchivado._meta.concrete_fields}
+    return [f.attname for f in Despacho._meta.concrete_fields if f.attname in destino]
+
+
+def vencidos(limite):
+    """ENTREGADO despachos with ``fecha < limite``."""
+    return Despacho.objects.filter(estado=Despacho.Estado.ENTREGADO, fecha__lt=limite)
+
+
+def duplicados(limite):
+    """Expired despachos whose ``codigo`` is already taken in the archive.
+
+    ``codigo`` is unique in each table on its own, so a code reused after
+    the first despacho was archived cannot move. Those rows stay in the
+    hot table, still visible and counted, until one of the two is renamed.
+    """
+    return vencidos(limite).filter(codigo__in=DespachoArchivado.objects.values("codigo"))
+
+
+def archivar(limite, lote=1000):
+    """Move ENTREGADO despachos with ``fecha < limite``; return how many moved.
+
+    Rollups, the transition log and change events are left untouched: the
+    despachos still exist, only in the cold table. ``duplicados`` are
+    skipped.
+    """
+    campos = campos_comunes()
+    candidatos = (
+        vencidos(limite)
+        .exclude(codigo__in=DespachoArchivado.objects.values("codigo"))
+        .order_by("id")
+    )
+    movidos = 0
+    while True:
+        with transaction.atomic():
+            filas = list(candidatos.values(*campos)[:lote])
+            if not filas:
+                return movidos
+            DespachoArchivado.objects.bulk_create(
+                [DespachoArchivado(**fila) for fila in filas]
+            )
+            with sin_notificaciones():
+                Despacho.objects.filter(pk__in=[fila["id"] for fila in filas]).delete()
+        movidos += len(filas)
+
+
+def _columna(campo):
+    """Column behind an ``order_by`` term: a name, ``F()`` or ``F().desc()``."""
+    if isinstance(campo, str):
+        return campo.lstrip("-")
+    if isinstance(campo, OrderBy):
+        campo = campo.expression
+    if isinstance(campo, F):
+        return campo.name
+    raise ValueError(
+        f"No se puede combinar con el archivo ordenando por {campo!r}: "
+        "usa nombres de campo o F()."
+    )
+
+
+def _claves(activos, archivados, limite=None):
+    """Return ``[(pk, archivado)]`` for both tables, ordered by the hot query."""
+    orden = list(activos.query.order_by) or ["id"]
+    columnas = [_columna(campo) for campo in orden]
+    claves = (
+        activos.order_by()
+        .annotate(archivado=Value(False))
+        .values_list("id", "archivado", *columnas)
+        .union(
+            archivados.order_by()
+            .annotate(archivado=Value(True))
+            .values_list("id", "archivado", *columnas),
+            all=True,
+        )
+        .order_by(*orden)
+    )
+    if limite is not None:
+        claves = claves[:limite]
+    return [(pk, bool(archivado)) for pk, archivado, *_ in claves]
+
+
+def combinar(activos, archivados, limite=None):
+    """Return hot and archived instances in one list, ordered by the hot query.
+
+    Only the ids and ordering columns go through the SQL ``UNION``; the
+    rows are then loaded from each table with ``in_bulk``.
+    """
+    claves = _claves(activos, archivados, limite)
+    calientes = activos.in_bulk([pk for pk, archivado in claves if not archivado])
+    frios = archivados.in_bulk([pk for pk, archivado in claves if archivado])
+    return [
+        (frios if archivado else calientes)[pk] for pk, archivado in claves
+    ]
+
+
+def combinar_filas(activos, archivados, campos, limite=None):
+    """Like ``combinar`` but return ``values_list(*campos)`` tuples."""
+    claves = _claves(activos, archivados, limite)
+    if limite is not None:
+        activos = activos.filter(pk__in=[pk for pk, archivado in claves if not archivado])
+        archivados = archivados.filter(pk__in=[pk for pk, archivado in claves if archivado])
+    calientes = {fila[0]: fila[1:] for fila in activos.values_list("id", *campos)}
+    frios = {fila[0]: fila[1:] for fila in archivados.values_list("id", *campos)}
+    return [
+        (frios if archivado else calientes)[pk] for pk, archivado in claves
+    ]
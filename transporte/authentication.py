@@ -0,0 +1,130 @@
+"""JWT authentication without a ``User`` query on every API request.
+
+``CachedJWTAuthentication`` keeps two bounded in-process caches: verified
+raw tokens and the user claims the permission classes read (id,
+is_staff, is_active). Saving or deleting a user drops its entry; entries
+also expire after ``TRANSPORTE_JWT_CACHE_TTL`` seconds, which bounds how
+long other worker processes may see stale flags.
+
+With ``TRANSPORTE_JWT_SIN_ESTADO`` the claims come straight from the
+signed token (see ``TokenConPermisosSerializer``), so flag changes only
+take effect when the access token expires.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+CLAIMS = ("is_staff", "is_active")
+
+
+class CacheTTL:
+    """Thread-safe LRU mapping whose entries expire individually."""
+
+    def __init__(self, maximo, ttl):
+        self.maximo = maximo
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            vence, valor = entrada
+            if vence <= time.monotonic():
+                del self._datos[clave]
+                return None
+            self._datos.move_to_end(clave)
+            return valor
+
+    def set(self, clave, valor, ttl=None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + ttl, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+
+    def pop(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self):
+        return len(self._datos)
+
+
+tokens = CacheTTL(settings.TRANSPORTE_JWT_CACHE_MAX, settings.TRANSPORTE_JWT_CACHE_TTL)
+usuarios = CacheTTL(settings.TRANSPORTE_JWT_CACHE_MAX, settings.TRANSPORTE_JWT_CACHE_TTL)
+
+
+def usuario_desde_claims(user_id, is_staff, is_active):
+    """Build a ``User`` with only the given fields loaded.
+
+    Any other attribute (username, email, ...) is fetched lazily as a
+    deferred field, so views that need it still work.
+    """
+    User = get_user_model()
+    campos = [User._meta.pk.attname, *CLAIMS]
+    return User.from_db(
+        "default", campos, [User._meta.pk.to_python(user_id), is_staff, is_active]
+    )
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_validated_token(self, raw_token):
+        validated_token = tokens.get(raw_token)
+        if validated_token is None:
+            validated_token = super().get_validated_token(raw_token)
+            tokens.set(raw_token, validated_token, ttl=validated_token["exp"] - time.time())
+        return validated_token
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # La verificación necesita el hash de la contraseña actual.
+            return super().get_user(validated_token)
+        try:
+            # simplejwt guarda el id como texto en el token.
+            user_id = str(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        if settings.TRANSPORTE_JWT_SIN_ESTADO and all(c in validated_token for c in CLAIMS):
+            claims = tuple(validated_token[c] for c in CLAIMS)
+        else:
+            claims = usuarios.get(user_id)
+            if claims is None:
+                User = get_user_model()
+                claims = (
+                    User.objects.filter(**{api_settings.USER_ID_FIELD: user_id})
+                    .values_list(*CLAIMS)
+                    .first()
+                )
+                if claims is None:
+                    raise AuthenticationFailed(_("User not found"), code="user_not_found")
+                usuarios.set(user_id, claims)
+
+        is_staff, is_active = claims
+        if api_settings.CHECK_USER_IS_ACTIVE and not is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return usuario_desde_claims(user_id, is_staff, is_active)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidar_usuario(sender, instance, **kwargs):
+    usuarios.pop(str(getattr(instance, api_settings.USER_ID_FIELD)))
@@ -0,0 +1,113 @@
+"""Versioned caches for panel data derived from whole tables.
+
+Every transporte model has a version number in the Django cache that is
+bumped on each write. Cached artifacts (filter option lists, rendered
+table fragments) are keyed by that version, so a write invalidates them
+without having to know which keys exist.
+"""
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import (
+    Aeronave,
+    Carga,
+    Cliente,
+    Conductor,
+    Despacho,
+    Piloto,
+    Ruta,
+    Ubicacion,
+    Vehiculo,
+)
+from .signals import despacho_cambiado, despachos_cambiados, filas_actualizadas
+
+PREFIJO = "transporte"
+
+# Aciertos y fallos por tipo de caché en este proceso.
+estadisticas = Counter()
+
+_locales = {}
+
+MODELOS_VERSIONADOS = {
+    Vehiculo, Aeronave, Conductor, Piloto, Cliente, Carga, Ruta, Despacho, Ubicacion,
+}
+
+# Modelos cuyo texto (``__str__``, búsquedas) incluye filas de otro modelo:
+# una ruta se muestra y se busca por los nombres de sus ubicaciones, y los
+# despachos muestran su ruta.
+DEPENDIENTES = {
+    Ubicacion: (Ruta, Despacho),
+}
+
+
+def registrar(tipo, acierto):
+    estadisticas[f"{tipo}_{'aciertos' if acierto else 'fallos'}"] += 1
+
+
+def _clave_version(model):
+    return f"{PREFIJO}:version:{model._meta.label_lower}"
+
+
+def version_modelo(model) -> int:
+    clave = _clave_version(model)
+    version = cache.get(clave)
+    if version is None:
+        # Un valor basado en el reloj evita reutilizar versiones tras un desalojo.
+        cache.add(clave, time.time_ns(), timeout=None)
+        version = cache.get(clave)
+    return version
+
+
+def invalidar_modelo(model):
+    """Bump the version of ``model`` and of the models that display it."""
+    for modelo in (model, *DEPENDIENTES.get(model, ())):
+        try:
+            cache.incr(_clave_version(modelo))
+        except ValueError:
+            cache.set(_clave_version(modelo), time.time_ns(), timeout=None)
+
+
+def opciones_modelo(model):
+    """Return ``(opciones, ids)`` for a choice widget over every row of ``model``.
+
+    ``opciones`` is a list of ``(str(pk), str(instance))`` and ``ids`` a set
+    of the valid string pks. Lookups go process memory -> shared cache ->
+    database, always for the current model version.
+    """
+    version = version_modelo(model)
+    local = _locales.get(model)
+    if local is not None and local[0] == version:
+        registrar("opciones", True)
+        return local[1]
+    clave = f"{PREFIJO}:opciones:{model._meta.label_lower}:{version}"
+    opciones = cache.get(clave)
+    registrar("opciones", opciones is not None)
+    if opciones is None:
+        opciones = [(str(obj.pk), str(obj)) for obj in model.objects.order_by("pk")]
+        cache.set(clave, opciones, timeout=None)
+    datos = (opciones, frozenset(pk for pk, _ in opciones))
+    _locales[model] = (version, datos)
+    return datos
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidar_al_escribir(sender, **kwargs):
+    if sender in MODELOS_VERSIONADOS:
+        invalidar_modelo(sender)
+
+
+@receiver(despacho_cambiado)
+@receiver(despachos_cambiados)
+def invalidar_despachos(sender, **kwargs):
+    invalidar_modelo(Despacho)
+
+
+@receiver(filas_actualizadas)
+def invalidar_actualizacion_masiva(sender, **kwargs):
+    if sender in MODELOS_VERSIONADOS:
+        invalidar_modelo(sender)
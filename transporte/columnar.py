@@ -0,0 +1,173 @@
+"""Column-oriented list responses for bulk API consumers.
+
+Instead of one object per row, a columnar response carries the column
+names once and one array per column::
+
+    {"columnas": ["id", "codigo", ...], "total": 2, "datos": [[1, 2], ["D-1", "D-2"], ...]}
+
+The arrays are transposed straight from ``values_list()`` tuples, so no
+per-row dict or serializer instance is built. ``MessagePackRenderer``
+packs the same structure with ``msgpack`` or, when it's not installed,
+with the pure-Python ``empaquetar`` below.
+"""
+import struct
+from typing import NamedTuple
+
+from rest_framework import serializers
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - dependencia opcional
+    msgpack = None
+
+FORMATOS = ("columnas", "msgpack")
+
+# Campos cuyo valor en base de datos difiere de la representación JSON.
+CONVERTIBLES = (
+    serializers.DateField,
+    serializers.DateTimeField,
+    serializers.TimeField,
+    serializers.DecimalField,
+    serializers.DurationField,
+    serializers.UUIDField,
+)
+
+
+class Columna(NamedTuple):
+    nombre: str
+    lookup: str
+    campo: serializers.Field
+
+
+def columnas(serializer, prefijo=""):
+    """Return the readable serializer fields that map to a column lookup.
+
+    Nested serializers are flattened as ``padre.hijo``; fields without a
+    plain source (method fields, ``*``) are left out.
+    """
+    resultado = []
+    for nombre, campo in serializer.fields.items():
+        if campo.write_only or campo.source in ("*", None):
+            continue
+        if isinstance(campo, serializers.SerializerMethodField):
+            continue
+        lookup = f"{prefijo}{campo.source.replace('.', '__')}"
+        if isinstance(campo, serializers.BaseSerializer):
+            if not isinstance(campo, serializers.ListSerializer):
+                for hija in columnas(campo, f"{lookup}__"):
+                    resultado.append(hija._replace(nombre=f"{nombre}.{hija.nombre}"))
+            continue
+        if isinstance(campo, serializers.SlugRelatedField):
+            lookup = f"{lookup}__{campo.slug_field}"
+        resultado.append(Columna(nombre, lookup, campo))
+    return resultado
+
+
+def tabla(filas, cols):
+    """Transpose ``filas`` (tuples ordered like ``cols``) into the columnar layout."""
+    datos = [list(columna) for columna in zip(*filas)] or [[] for _ in cols]
+    for indice, columna in enumerate(cols):
+        if isinstance(columna.campo, CONVERTIBLES):
+            representar = columna.campo.to_representation
+            datos[indice] = [None if v is None else representar(v) for v in datos[indice]]
+    return {
+        "columnas": [columna.nombre for columna in cols],
+        "total": len(datos[0]) if datos else 0,
+        "datos": datos,
+    }
+
+
+_convertir = JSONEncoder().default
+
+
+def empaquetar(obj) -> bytes:
+    """Pack ``obj`` as MessagePack."""
+    if msgpack is not None:
+        return msgpack.packb(obj, default=_convertir, use_bin_type=True)
+    partes = []
+    _empaquetar(obj, partes.append)
+    return b"".join(partes)
+
+
+_B = struct.Struct(">B").pack
+_H = struct.Struct(">BH").pack
+_I = struct.Struct(">BI").pack
+_Q = struct.Struct(">BQ").pack
+_b = struct.Struct(">Bb").pack
+_h = struct.Struct(">Bh").pack
+_i = struct.Struct(">Bi").pack
+_q = struct.Struct(">Bq").pack
+_d = struct.Struct(">Bd").pack
+
+
+def _cabecera(escribir, n, corto, tipo16, tipo32, limite_corto):
+    if n < limite_corto:
+        escribir(_B(corto | n))
+    elif n < 0x10000:
+        escribir(_H(tipo16, n))
+    else:
+        escribir(_I(tipo32, n))
+
+
+def _empaquetar(obj, escribir):
+    if obj is None:
+        escribir(b"\xc0")
+    elif obj is True:
+        escribir(b"\xc3")
+    elif obj is False:
+        escribir(b"\xc2")
+    elif isinstance(obj, int):
+        if 0 <= obj < 0x80:
+            escribir(_B(obj))
+        elif -0x20 <= obj < 0:
+            escribir(_B(obj & 0xFF))
+        elif 0 <= obj <= 0xFF:
+            escribir(bytes((0xCC, obj)))
+        elif 0 <= obj <= 0xFFFF:
+            escribir(_H(0xCD, obj))
+        elif 0 <= obj <= 0xFFFFFFFF:
+            escribir(_I(0xCE, obj))
+        elif 0 <= obj <= 0xFFFFFFFFFFFFFFFF:
+            escribir(_Q(0xCF, obj))
+        elif -0x80 <= obj:
+            escribir(_b(0xD0, obj))
+        elif -0x8000 <= obj:
+            escribir(_h(0xD1, obj))
+        elif -0x80000000 <= obj:
+            escribir(_i(0xD2, obj))
+        elif -0x8000000000000000 <= obj:
+            escribir(_q(0xD3, obj))
+        else:
+            raise OverflowError("Entero fuera del rango de MessagePack.")
+    elif isinstance(obj, float):
+        escribir(_d(0xCB, obj))
+    elif isinstance(obj, str):
+        datos = obj.encode()
+        n = len(datos)
+        if n < 32:
+            escribir(_B(0xA0 | n))
+        elif n < 0x100:
+            escribir(bytes((0xD9, n)))
+        else:
+            _cabecera(escribir, n, 0, 0xDA, 0xDB, 0)
+        escribir(datos)
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        datos = bytes(obj)
+        n = len(datos)
+        if n < 0x100:
+            escribir(bytes((0xC4, n)))
+        else:
+            _cabecera(escribir, n, 0, 0xC5, 0xC6, 0)
+        escribir(datos)
+    elif isinstance(obj, (list, tuple)):
+        _cabecera(escribir, len(obj), 0x90, 0xDC, 0xDD, 16)
+        for valor in obj:
+            _empaquetar(valor, escribir)
+    elif isinstance(obj, dict):
+        _cabecera(escribir, len(obj), 0x80, 0xDE, 0xDF, 16)
+        for clave, valor in obj.items():
+            _empaquetar(clave, escribir)
+            _empaquetar(valor, escribir)
+    else:
+        _empaquetar(_convertir(obj), escribir)
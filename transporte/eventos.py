@@ -0,0 +1,285 @@
+"""Broadcast hub for Despacho change events.
+
+Each worker keeps a bounded in-memory buffer of recent events that
+subscribers (the SSE stream) read from, so following changes never hits
+the main database. With ``TRANSPORTE_EVENTOS_BACKEND = "sqlite"`` the
+events are also appended to a local SQLite file and every worker pumps
+new rows from it into its own buffer, which gives fan-out across worker
+processes without an external broker.
+
+The memory backend is for a single process only: every worker would see
+just its own events. Its cursors start from the clock, so a cursor from
+before a restart (or from another worker) is not mistaken for one of
+this process. A subscriber whose cursor is unknown, or older than what
+the buffer or the SQLite retention still holds, first gets a
+``{"tipo": "reinicio"}`` event and must reload the full list.
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.dispatch import receiver
+
+from .signals import despacho_cambiado, despachos_cambiados
+
+
+class Evento(NamedTuple):
+    cursor: int
+    datos: dict
+
+    @property
+    def json(self) -> str:
+        return json.dumps(self.datos, cls=DjangoJSONEncoder)
+
+
+class MemoriaBackend:
+    """Keep events only in this process; cursors are a local sequence."""
+
+    persistente = False
+
+    def __init__(self):
+        # La secuencia parte en los microsegundos actuales: tras un reinicio
+        # los cursores nuevos superan a los del proceso anterior.
+        self.inicio = self._ultimo = time.time_ns() // 1000
+        self._lock = threading.Lock()
+
+    def agregar(self, datos) -> int:
+        with self._lock:
+            self._ultimo += 1
+            return self._ultimo
+
+    def leer_desde(self, cursor, limite):
+        return []
+
+    def ultimo_cursor(self) -> int:
+        return self._ultimo
+
+
+class SQLiteBackend:
+    """Shared append-only log in a local SQLite file, read by every worker."""
+
+    persistente = True
+    retencion = 10000
+
+    def __init__(self, ruta):
+        self.ruta = str(ruta)
+        self._local = threading.local()
+        with self._conexion() as conexion:
+            conexion.execute(
+                "CREATE TABLE IF NOT EXISTS eventos "
+                "(id INTEGER PRIMARY KEY AUTOINCREMENT, datos TEXT NOT NULL)"
+            )
+
+    def _conexion(self):
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=5, isolation_level=None)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            self._local.conexion = conexion
+        return conexion
+
+    def agregar(self, datos) -> int:
+        conexion = self._conexion()
+        cursor = conexion.execute(
+            "INSERT INTO eventos (datos) VALUES (?)",
+            (json.dumps(datos, cls=DjangoJSONEncoder),),
+        ).lastrowid
+        if cursor % 1000 == 0:
+            conexion.execute("DELETE FROM eventos WHERE id <= ?", (cursor - self.retencion,))
+        return cursor
+
+    def leer_desde(self, cursor, limite):
+        filas = self._conexion().execute(
+            "SELECT id, datos FROM eventos WHERE id > ? ORDER BY id LIMIT ?",
+            (cursor, limite),
+        )
+        return [Evento(id_, json.loads(datos)) for id_, datos in filas]
+
+    def ultimo_cursor(self) -> int:
+        fila = self._conexion().execute("SELECT MAX(id) FROM eventos").fetchone()
+        return fila[0] or 0
+
+    def conoce(self, cursor) -> bool:
+        """True if every event after ``cursor`` is still in the log."""
+        minimo, maximo = self._conexion().execute(
+            "SELECT MIN(id), MAX(id) FROM eventos"
+        ).fetchone()
+        if maximo is None:
+            return cursor == 0
+        return minimo - 1 <= cursor <= maximo
+
+
+class HubEventos:
+    """In-process broadcast hub with resumable cursors."""
+
+    def __init__(self, backend, capacidad=1000, intervalo=1.0):
+        self.backend = backend
+        self.intervalo = intervalo
+        self._buffer = deque(maxlen=capacidad)
+        self._lock = threading.Lock()
+        self._suscriptores = set()
+        self._bomba = None
+        self._ultimo = backend.ultimo_cursor()
+
+    @property
+    def ultimo_cursor(self) -> int:
+        return self._ultimo
+
+    def publicar(self, datos):
+        """Append an event; safe to call from any thread."""
+        if self.backend.persistente:
+            self.backend.agregar(datos)
+            # La bomba lee el log compartido y conserva el orden de los cursores.
+            self._notificar()
+            return
+        # El cursor se toma y se agrega al buffer bajo el mismo lock: si no, un
+        # publicador que llega después con un cursor menor se descartaría.
+        with self._lock:
+            self._anexar([Evento(self.backend.agregar(datos), datos)])
+        self._notificar()
+
+    def _incorporar(self, eventos):
+        with self._lock:
+            self._anexar(eventos)
+        self._notificar()
+
+    def _anexar(self, eventos):
+        """Buffer the events newer than the last cursor; needs ``_lock`` held."""
+        for evento in eventos:
+            if evento.cursor > self._ultimo:
+                self._buffer.append(evento)
+                self._ultimo = evento.cursor
+
+    def _notificar(self):
+        for loop, aviso in list(self._suscriptores):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(aviso.set)
+
+    def _pendientes(self, cursor):
+        """Return buffered events after ``cursor`` and whether some were evicted."""
+        with self._lock:
+            if cursor >= self._ultimo:
+                return [], False
+            eventos = []
+            for evento in reversed(self._buffer):
+                if evento.cursor <= cursor:
+                    break
+                eventos.append(evento)
+            eventos.reverse()
+            return eventos, not eventos or eventos[0].cursor > cursor + 1
+
+    def conoce(self, cursor) -> bool:
+        """True if ``cursor`` belongs to this event sequence and can be resumed."""
+        if self.backend.persistente:
+            return self.backend.conoce(cursor)
+        return self.backend.inicio <= cursor <= self._ultimo
+
+    async def _bombear(self):
+        while True:
+            eventos = await asyncio.to_thread(self.backend.leer_desde, self._ultimo, 500)
+            if eventos:
+                self._incorporar(eventos)
+            if len(eventos) < 500:
+                await asyncio.sleep(self.intervalo)
+
+    def _asegurar_bomba(self):
+        if self.backend.persistente and (self._bomba is None or self._bomba.done()):
+            self._bomba = asyncio.get_running_loop().create_task(self._bombear())
+
+    async def suscribir(self, cursor=None, espera=15.0):
+        """Yield events after ``cursor``; yields ``None`` as a keep-alive tick.
+
+        When the cursor is unknown, or older than what the buffer and the
+        backend can replay, a single ``Evento(cursor, {"tipo": "reinicio"})``
+        is yielded so the client knows it must reload the full list.
+        """
+        self._asegurar_bomba()
+        aviso = asyncio.Event()
+        registro = (asyncio.get_running_loop(), aviso)
+        self._suscriptores.add(registro)
+        try:
+            if cursor is not None and not await asyncio.to_thread(self.conoce, cursor):
+                cursor = None
+                yield Evento(self._ultimo, {"tipo": "reinicio"})
+            if cursor is None:
+                cursor = self._ultimo
+            while True:
+                aviso.clear()
+                eventos, perdidos = self._pendientes(cursor)
+                if perdidos:
+                    if self.backend.persistente and await asyncio.to_thread(
+                        self.backend.conoce, cursor
+                    ):
+                        eventos = await asyncio.to_thread(self.backend.leer_desde, cursor, 500)
+                    else:
+                        inicio = eventos[0].cursor - 1 if eventos else self._ultimo
+                        eventos = [Evento(inicio, {"tipo": "reinicio"})] + eventos
+                for evento in eventos:
+                    cursor = evento.cursor
+                    yield evento
+                if eventos:
+                    continue
+                try:
+                    await asyncio.wait_for(aviso.wait(), espera)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self._suscriptores.discard(registro)
+
+
+@lru_cache(maxsize=None)
+def obtener_hub() -> HubEventos:
+    if settings.TRANSPORTE_EVENTOS_BACKEND == "sqlite":
+        ruta = settings.TRANSPORTE_EVENTOS_SQLITE
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        backend = SQLiteBackend(ruta)
+    else:
+        backend = MemoriaBackend()
+    return HubEventos(backend, capacidad=settings.TRANSPORTE_EVENTOS_BUFFER)
+
+
+def _evento(antes, despues):
+    actual = despues or antes
+    if antes is None:
+        tipo = "creado"
+    elif despues is None:
+        tipo = "eliminado"
+    else:
+        tipo = "actualizado"
+    return {
+        "tipo": tipo,
+        "id": actual.id,
+        "codigo": actual.codigo,
+        "ruta": actual.ruta_id,
+        "estado": actual.estado,
+        "estado_anterior": antes.estado if antes else None,
+        "fecha": actual.fecha,
+        "ts": time.time(),
+    }
+
+
+@receiver(despacho_cambiado)
+def publicar_cambio(sender, antes, despues, **kwargs):
+    """Queue the change for subscribers once the surrounding transaction commits."""
+    datos = _evento(antes, despues)
+    transaction.on_commit(lambda: obtener_hub().publicar(datos))
+
+
+@receiver(despachos_cambiados)
+def publicar_cambios(sender, cambios, **kwargs):
+    eventos = [_evento(antes, despues) for antes, despues in cambios]
+
+    def publicar():
+        hub = obtener_hub()
+        for datos in eventos:
+            hub.publicar(datos)
+
+    transaction.on_commit(publicar)
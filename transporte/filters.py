@@ -2,9 +2,12 @@
 import django_filters
 from django import forms
 from django.db.models import Q
+from django_filters.fields import ChoiceField
+
+from .cache import opciones_modelo
 from .models import (
     Vehiculo, Aeronave, Conductor, Piloto,
-    Cliente, Carga, Ruta, Despacho
+    Cliente, Carga, Ruta, Despacho, Ubicacion
 )
 
 class BaseFilterSet(django_filters.FilterSet):
@@ -23,6 +26,42 @@ class BaseFilterSet(django_filters.FilterSet):
             else:
                 field.widget.attrs.update({'class': 'form-control'})
 
+    @property
+    def filtrado(self):
+        """True if the data is valid and at least one filter has a value."""
+        return self.is_valid() and any(
+            self.form.cleaned_data.get(nombre) not in (None, "", [])
+            for nombre in self.filters
+        )
+
+class OpcionesCacheadas:
+    """Lazy iterable over the cached ``(pk, label)`` options of a model."""
+
+    def __init__(self, model):
+        self.model = model
+
+    def __iter__(self):
+        return iter(opciones_modelo(self.model)[0])
+
+
+class CachedChoiceField(ChoiceField):
+    """Choice field validated against the cached id set instead of a query."""
+
+    def __init__(self, *args, model, **kwargs):
+        self.model = model
+        kwargs["choices"] = OpcionesCacheadas(model)
+        super().__init__(*args, **kwargs)
+
+    def valid_value(self, value):
+        return str(value) in opciones_modelo(self.model)[1]
+
+
+class CachedModelChoiceFilter(django_filters.ChoiceFilter):
+    """Drop-in for ``ModelChoiceFilter`` backed by the versioned options cache."""
+
+    field_class = CachedChoiceField
+
+
 # --- Definición de Filtros por Modelo ---
 
 class VehiculoFilter(BaseFilterSet):
@@ -122,7 +161,7 @@ class CargaFilter(BaseFilterSet):
         label="Buscar",
         widget=forms.TextInput(attrs={'placeholder': 'Buscar descripción, tipo, cliente...'})
     )
-    cliente = django_filters.ModelChoiceFilter(queryset=Cliente.objects.all())
+    cliente = CachedModelChoiceFilter(model=Cliente)
 
     class Meta:
         model = Carga
@@ -149,11 +188,15 @@ class RutaFilter(BaseFilterSet):
         fields = ['q', 'tipo_transporte']
 
     def search_filter(self, queryset, name, value):
+        # Origen y destino se comparan por id contra las ubicaciones que
+        # contienen el texto: la tabla de ubicaciones es chica y el ``icontains``
+        # recorre esa tabla, no la de rutas.
+        ubicaciones = Ubicacion.objects.filter(nombre__icontains=value).values("pk")
         return queryset.filter(
             Q(codigo__icontains=value) |
-            Q(origen__icontains=value) |
-            Q(destino__icontains=value)
-        ).distinct()
+            Q(origen__in=ubicaciones) |
+            Q(destino__in=ubicaciones)
+        )
 
 class DespachoFilter(BaseFilterSet):
     q = django_filters.CharFilter(
@@ -162,7 +205,7 @@ class DespachoFilter(BaseFilterSet):
         widget=forms.TextInput(attrs={'placeholder': 'Buscar código, ruta...'})
     )
     estado = django_filters.ChoiceFilter(choices=Despacho.Estado.choices)
-    ruta = django_filters.ModelChoiceFilter(queryset=Ruta.objects.all())
+    ruta = CachedModelChoiceFilter(model=Ruta)
 
     class Meta:
         model = Despacho
@@ -1,4 +1,5 @@
 from django import forms
+from django.urls import reverse
 
 from .models import (
     Aeronave,
@@ -8,7 +9,9 @@ from .models import (
     Despacho,
     Piloto,
     Ruta,
+    Ubicacion,
     Vehiculo,
+    normalizar_clave,
 )
 
 
@@ -16,6 +19,65 @@ class DateInput(forms.DateInput):
     input_type = "date"
 
 
+class AutocompleteSelect(forms.Select):
+    """Select that renders only the chosen option.
+
+    The remaining options are fetched from the ``autocompletar`` endpoint
+    as the user types, so rendering cost does not grow with the table.
+    """
+
+    def __init__(self, modulo, attrs=None):
+        super().__init__(attrs)
+        self.modulo = modulo
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context["widget"]["attrs"]["data-autocomplete-url"] = reverse(
+            "autocompletar", args=[self.modulo]
+        )
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        field = self.choices.field
+        opciones = []
+        if field.empty_label is not None:
+            opciones.append(("", field.empty_label))
+        seleccionados = [v for v in value if v not in ("", None)]
+        if seleccionados:
+            opciones.extend(
+                (obj.pk, field.label_from_instance(obj))
+                for obj in field.queryset.filter(pk__in=seleccionados)
+            )
+        return [
+            (
+                None,
+                [self.create_option(name, val, label, str(val) in value, index, attrs=attrs)],
+                index,
+            )
+            for index, (val, label) in enumerate(opciones)
+        ]
+
+
+class UbicacionField(forms.CharField):
+    """Free-text place name that cleans to its ``Ubicacion``.
+
+    Validation only looks the name up: an unknown name cleans to an unsaved
+    ``Ubicacion`` that the form interns in ``save()``.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("max_length", 100)
+        super().__init__(**kwargs)
+
+    def clean(self, value):
+        nombre = super().clean(value)
+        if not nombre:
+            return None
+        if not normalizar_clave(nombre):
+            raise forms.ValidationError("Ingresa un nombre con letras o números.")
+        return Ubicacion.buscar(nombre)
+
+
 class BaseModelForm(forms.ModelForm):
     """Base form to provide consistent styles and widgets."""
 
@@ -94,19 +156,37 @@ class CargaForm(BaseModelForm):
     class Meta:
         model = Carga
         fields = ["cliente", "descripcion", "peso_kg", "tipo", "valor_estimado"]
+        widgets = {
+            "cliente": AutocompleteSelect("clientes"),
+        }
 
 
 class RutaForm(BaseModelForm):
+    origen = UbicacionField(label="Origen")
+    destino = UbicacionField(label="Destino")
+
+    field_order = ["codigo", "origen", "destino"]
+
     class Meta:
         model = Ruta
+        # Origen y destino se asignan en ``save()``, una vez internados.
         fields = [
             "codigo",
-            "origen",
-            "destino",
             "tipo_transporte",
             "duracion_estimada_min",
         ]
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.initial.setdefault("origen", self.instance.origen.nombre)
+            self.initial.setdefault("destino", self.instance.destino.nombre)
+
+    def save(self, commit=True):
+        self.instance.origen = Ubicacion.interna(self.cleaned_data["origen"])
+        self.instance.destino = Ubicacion.interna(self.cleaned_data["destino"])
+        return super().save(commit)
+
 
 class DespachoForm(BaseModelForm):
     class Meta:
@@ -125,5 +205,11 @@ class DespachoForm(BaseModelForm):
         ]
         widgets = {
             "fecha": DateInput(),
+            "ruta": AutocompleteSelect("rutas"),
+            "vehiculo": AutocompleteSelect("vehiculos"),
+            "aeronave": AutocompleteSelect("aeronaves"),
+            "conductor": AutocompleteSelect("conductores"),
+            "piloto": AutocompleteSelect("pilotos"),
+            "carga": AutocompleteSelect("cargas"),
         }
 
@@ -0,0 +1,114 @@
+"""Cached HTML fragments for the table rows of the ``home()`` panel.
+
+Rows are keyed by model, pk, the row ``version`` and the versions of the
+related models shown in the row, so only changed rows are rendered again.
+Unfiltered listings additionally cache the whole ``<tbody>`` keyed by the
+model versions. Hits and misses are counted in ``cache.estadisticas``.
+"""
+from django.core.cache import cache
+from django.db.models import ForeignKey
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from .cache import PREFIJO, estadisticas, registrar, version_modelo
+
+# Cambiar al modificar transporte/_fila.html para descartar fragmentos viejos.
+VERSION_PLANTILLA = 1
+
+
+def formatear_valor(instance, field_name):
+    display_method = getattr(instance, f"get_{field_name}_display", None)
+    if callable(display_method):
+        value = display_method()
+    else:
+        value = getattr(instance, field_name)
+    if value is None or value == "":
+        return "—"
+    if isinstance(value, bool):
+        return "Sí" if value else "No"
+    return str(value)
+
+
+def _relaciones(model, fields):
+    """Return ``(select_related paths, related models)`` for the shown FKs.
+
+    One extra level is followed because ``__str__`` of a related row may
+    print its own relations (e.g. ``Carga`` shows the cliente).
+    """
+    rutas, modelos = [], []
+    for name, _ in fields:
+        campo = model._meta.get_field(name)
+        if not isinstance(campo, ForeignKey):
+            continue
+        rutas.append(name)
+        modelos.append(campo.related_model)
+        for anidado in campo.related_model._meta.concrete_fields:
+            if isinstance(anidado, ForeignKey):
+                rutas.append(f"{name}__{anidado.name}")
+                modelos.append(anidado.related_model)
+    return rutas, sorted(set(modelos), key=lambda m: m._meta.label_lower)
+
+
+def _clave_fila(model, pk, version, relacionadas):
+    return f"{PREFIJO}:fila:{VERSION_PLANTILLA}:{model._meta.label_lower}:{pk}:{version}:{relacionadas}"
+
+
+def tabla(module, config, instances, cacheable=False):
+    """Return ``(tbody_html, total)`` for the module listing.
+
+    ``instances`` is a queryset or, when archived rows are included, a list
+    of already loaded instances.
+    """
+    model = config["model"]
+    relaciones, modelos = _relaciones(model, config["fields"])
+    relacionadas = "-".join(str(version_modelo(m)) for m in modelos)
+    clave_tabla = None
+    if cacheable:
+        clave_tabla = (
+            f"{PREFIJO}:tabla:{VERSION_PLANTILLA}:{module['key']}:"
+            f"{version_modelo(model)}:{relacionadas}"
+        )
+        resultado = cache.get(clave_tabla)
+        registrar("tablas", resultado is not None)
+        if resultado is not None:
+            return mark_safe(resultado[0]), resultado[1]
+
+    if isinstance(instances, list):
+        filas = [(type(obj), obj.pk, getattr(obj, "version", 0), obj) for obj in instances]
+    else:
+        filas = [
+            (model, pk, version, None)
+            for pk, version in instances.values_list("pk", "version")
+        ]
+    claves = [_clave_fila(m, pk, version, relacionadas) for m, pk, version, _ in filas]
+    encontrados = cache.get_many(claves)
+
+    faltantes = [fila for fila, clave in zip(filas, claves) if clave not in encontrados]
+    if faltantes:
+        cargar = [pk for m, pk, _, obj in faltantes if obj is None]
+        cargados = (
+            model._default_manager.select_related(*relaciones).in_bulk(cargar)
+            if cargar else {}
+        )
+        plantilla = get_template("transporte/_fila.html")
+        nuevos = {}
+        for m, pk, version, obj in faltantes:
+            obj = obj or cargados[pk]
+            row = {
+                "pk": pk,
+                "archived": m is not model,
+                "values": [formatear_valor(obj, name) for name, _ in config["fields"]],
+            }
+            nuevos[_clave_fila(m, pk, version, relacionadas)] = plantilla.render(
+                {"module": module, "row": row}
+            )
+        cache.set_many(nuevos, timeout=None)
+        encontrados.update(nuevos)
+
+    estadisticas["filas_aciertos"] += len(filas) - len(faltantes)
+    estadisticas["filas_fallos"] += len(faltantes)
+
+    html = "".join(encontrados[clave] for clave in claves)
+    if clave_tabla:
+        cache.set(clave_tabla, (html, len(filas)), timeout=None)
+    return mark_safe(html), len(filas)
@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from transporte import archivo
+
+
+class Command(BaseCommand):
+    help = "Mueve los despachos entregados antiguos a la tabla de archivo."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dias", type=int, default=settings.TRANSPORTE_ARCHIVO_DIAS,
+            help="Antigüedad mínima (según fecha del despacho) para archivar.",
+        )
+        parser.add_argument("--lote", type=int, default=1000)
+        parser.add_argument(
+            "--simular", action="store_true",
+            help="Solo informa cuántos despachos se archivarían.",
+        )
+
+    def handle(self, *args, **options):
+        limite = timezone.localdate() - timedelta(days=options["dias"])
+        duplicados = archivo.duplicados(limite).count()
+        if options["simular"]:
+            total = archivo.vencidos(limite).count() - duplicados
+            self.stdout.write(f"Se archivarían {total} despacho(s) anteriores a {limite}.")
+        else:
+            movidos = archivo.archivar(limite, lote=options["lote"])
+            self.stdout.write(
+                self.style.SUCCESS(f"{movidos} despacho(s) anteriores a {limite} archivados.")
+            )
+        if duplicados:
+            self.stderr.write(
+                f"{duplicados} despacho(s) quedan en la tabla activa: su código ya existe "
+                "en el archivo."
+            )
@@ -0,0 +1,106 @@
+import io
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from transporte import memoria
+from transporte.models import Despacho
+from transporte.parsers import ORJSONParser
+from transporte.renderers import ORJSONRenderer, orjson
+
+
+def filas_despacho(cantidad):
+    inicio = date(2024, 1, 1)
+    estados = [valor for valor, _ in Despacho.Estado.choices]
+    return [
+        {
+            "id": i,
+            "codigo": f"D-{i:07d}",
+            "fecha": inicio + timedelta(days=i % 365),
+            "estado": estados[i % len(estados)],
+            "ruta": i % 50 + 1,
+            "vehiculo": i % 200 + 1 if i % 2 else None,
+            "aeronave": i % 20 + 1 if not i % 2 else None,
+            "conductor": i % 300 + 1 if i % 2 else None,
+            "piloto": i % 40 + 1 if not i % 2 else None,
+            "carga": i + 1,
+            "version": 1,
+        }
+        for i in range(cantidad)
+    ]
+
+
+def filas_carga(cantidad):
+    tipos = ["General", "Refrigerada", "Peligrosa", "Frágil"]
+    azar = random.Random(cantidad)
+    return [
+        {
+            "id": i,
+            "descripcion": f"Carga {i} — pallets mixtos",
+            "cliente": i % 500 + 1,
+            "peso_kg": Decimal(azar.randint(1, 2_000_000)) / 100,
+            "tipo": tipos[i % len(tipos)],
+            "valor_estimado": Decimal(azar.randint(1, 10_000_000)) / 100,
+            "version": 1,
+        }
+        for i in range(cantidad)
+    ]
+
+
+class Command(BaseCommand):
+    help = "Compara el renderer/parser JSON de DRF con los basados en orjson."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--filas", type=int, default=100_000)
+        parser.add_argument("--repeticiones", type=int, default=5)
+
+    def medir(self, funcion, repeticiones):
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            resultado = funcion()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        return statistics.median(tiempos), resultado
+
+    def pico_mb(self, funcion):
+        """Peak Python memory of one extra run, outside the timed repetitions."""
+        with memoria.medir() as medicion:
+            funcion()
+        return medicion["pico"] / 1_000_000
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stderr.write("orjson no está instalado; solo se mediría la ruta estándar.")
+            return
+        filas, repeticiones = options["filas"], options["repeticiones"]
+        self.stdout.write(f"{filas} filas, mediana de {repeticiones} repeticiones")
+        for nombre, datos in (("despachos", filas_despacho(filas)), ("cargas", filas_carga(filas))):
+            base, contenido = self.medir(lambda: JSONRenderer().render(datos), repeticiones)
+            rapido, contenido_rapido = self.medir(
+                lambda: ORJSONRenderer().render(datos), repeticiones
+            )
+            if contenido != contenido_rapido:
+                raise CommandError(f"La salida de ORJSONRenderer difiere para {nombre}.")
+            lectura, _ = self.medir(lambda: JSONParser().parse(io.BytesIO(contenido)), repeticiones)
+            lectura_rapida, _ = self.medir(
+                lambda: ORJSONParser().parse(io.BytesIO(contenido)), repeticiones
+            )
+            mb = len(contenido) / 1_000_000
+            self.stdout.write(
+                f"{nombre} ({mb:.1f} MB): render {base:.0f} -> {rapido:.0f} ms "
+                f"(x{base / rapido:.1f}), parse {lectura:.0f} -> {lectura_rapida:.0f} ms "
+                f"(x{lectura / lectura_rapida:.1f})"
+            )
+            self.stdout.write(
+                f"{nombre} pico de memoria: render "
+                f"{self.pico_mb(lambda: JSONRenderer().render(datos)):.1f} -> "
+                f"{self.pico_mb(lambda: ORJSONRenderer().render(datos)):.1f} MB, parse "
+                f"{self.pico_mb(lambda: JSONParser().parse(io.BytesIO(contenido))):.1f} -> "
+                f"{self.pico_mb(lambda: ORJSONParser().parse(io.BytesIO(contenido))):.1f} MB"
+            )
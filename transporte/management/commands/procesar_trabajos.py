@@ -0,0 +1,95 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from transporte import trabajos
+
+ERROR_POOL = "El proceso que ejecutaba el trabajo terminó inesperadamente."
+
+
+def _inicializar_proceso():
+    django.setup()
+    # Cada proceso hijo abre su propia conexión a la base de datos.
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Ejecuta los trabajos en segundo plano encolados en la base de datos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--procesos", type=int, default=2)
+        parser.add_argument(
+            "--intervalo", type=float, default=1.0,
+            help="Segundos de espera cuando no hay trabajos pendientes.",
+        )
+        parser.add_argument(
+            "--huerfanos-min", type=int, default=30,
+            help="Libera trabajos EN_CURSO con más de estos minutos al iniciar.",
+        )
+        parser.add_argument(
+            "--una-vez", action="store_true",
+            help="Procesa lo pendiente y termina.",
+        )
+
+    def handle(self, *args, **options):
+        liberados = trabajos.liberar_huerfanos(timedelta(minutes=options["huerfanos_min"]))
+        if liberados:
+            self.stdout.write(f"{liberados} trabajo(s) huérfano(s) liberado(s).")
+
+        procesos = options["procesos"]
+        connections.close_all()
+        en_curso = {}
+        pool = self._crear_pool(procesos)
+        try:
+            while True:
+                libres = procesos - len(en_curso)
+                if libres:
+                    for trabajo_id in trabajos.reclamar(libres):
+                        try:
+                            futuro = pool.submit(trabajos.ejecutar, trabajo_id)
+                        except BrokenProcessPool:
+                            # Se reporta junto con los demás al esperar.
+                            futuro = Future()
+                            futuro.set_exception(BrokenProcessPool())
+                        en_curso[futuro] = trabajo_id
+                if not en_curso:
+                    if options["una_vez"]:
+                        break
+                    time.sleep(options["intervalo"])
+                    continue
+                listos, _ = wait(
+                    en_curso, timeout=options["intervalo"], return_when=FIRST_COMPLETED
+                )
+                roto = False
+                for futuro in listos:
+                    trabajo_id = en_curso.pop(futuro)
+                    try:
+                        estado = futuro.result()
+                    except BrokenProcessPool:
+                        roto = True
+                        estado = trabajos.devolver(trabajo_id, ERROR_POOL)
+                    except Exception as exc:
+                        # Falló fuera del manejo de errores de ejecutar() (p. ej.
+                        # al leer el trabajo): sin esto quedaría EN_CURSO.
+                        estado = trabajos.devolver(trabajo_id, f"error del worker: {exc}")
+                    self.stdout.write(f"Trabajo {trabajo_id}: {estado}")
+                if roto:
+                    # Un hijo murió (OOM, señal): el pool queda inutilizable y
+                    # todos sus trabajos en curso se pierden con él.
+                    for trabajo_id in en_curso.values():
+                        estado = trabajos.devolver(trabajo_id, ERROR_POOL)
+                        self.stdout.write(f"Trabajo {trabajo_id}: {estado}")
+                    en_curso.clear()
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    self.stderr.write("El pool de procesos se cayó; se crea uno nuevo.")
+                    pool = self._crear_pool(procesos)
+        finally:
+            pool.shutdown()
+
+    def _crear_pool(self, procesos):
+        return ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar_proceso)
@@ -0,0 +1,127 @@
+import asyncio
+import getpass
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from transporte import prueba_carga
+
+
+class Command(BaseCommand):
+    help = (
+        "Prueba de carga HTTP del panel y la API con clientes asyncio concurrentes; "
+        "informa rps, p50/p95/p99 y errores por paso y compara con una línea base."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--servidor", choices=["wsgi", "asgi"], default="wsgi",
+            help="Servidor local a levantar: runserver (WSGI) o uvicorn (ASGI).",
+        )
+        parser.add_argument(
+            "--url", help="Probar un servidor ya levantado en lugar de iniciar uno local."
+        )
+        parser.add_argument("--workers", type=int, default=1, help="Procesos de uvicorn.")
+        parser.add_argument(
+            "--escenario", default="mixto",
+            help=f"{', '.join(prueba_carga.ESCENARIOS)} o un archivo JSON con los pasos.",
+        )
+        parser.add_argument("--clientes", type=int, default=20)
+        parser.add_argument("--duracion", type=float, default=30.0, help="Segundos medidos.")
+        parser.add_argument(
+            "--calentamiento", type=float, default=3.0,
+            help="Segundos iniciales que no se miden.",
+        )
+        parser.add_argument("--usuario", default=os.environ.get("PRUEBA_CARGA_USUARIO"))
+        parser.add_argument(
+            "--clave", default=os.environ.get("PRUEBA_CARGA_CLAVE"),
+            help="Por defecto PRUEBA_CARGA_CLAVE o se pregunta.",
+        )
+        parser.add_argument("--semilla", type=int, default=0)
+        parser.add_argument(
+            "--base", default=str(settings.BASE_DIR / "var" / "prueba_carga_base.json"),
+            help="Línea base con la que comparar (si existe).",
+        )
+        parser.add_argument(
+            "--guardar-base", action="store_true",
+            help="Guarda este resultado como nueva línea base en lugar de comparar.",
+        )
+        parser.add_argument("--tolerancia", type=float, default=0.2)
+        parser.add_argument("--json", help="Escribe el resultado completo en este archivo.")
+
+    def handle(self, *args, **options):
+        if not options["usuario"]:
+            raise CommandError("Indica --usuario (o PRUEBA_CARGA_USUARIO).")
+        clave = options["clave"] or getpass.getpass(f"Clave de {options['usuario']}: ")
+        try:
+            pasos = prueba_carga.cargar_escenario(options["escenario"])
+        except (OSError, ValueError, TypeError) as error:
+            raise CommandError(f"Escenario inválido: {error}")
+
+        parametros = {
+            "escenario": options["escenario"],
+            "servidor": "externo" if options["url"] else options["servidor"],
+            "clientes": options["clientes"],
+            "duracion": options["duracion"],
+        }
+        try:
+            if options["url"]:
+                resultados = self.ejecutar(options["url"], pasos, options, clave)
+            else:
+                with prueba_carga.servidor_local(options["servidor"], options["workers"]) as url:
+                    resultados = self.ejecutar(url, pasos, options, clave)
+        except (RuntimeError, ValueError, OSError) as error:
+            raise CommandError(str(error))
+
+        datos = {"parametros": parametros, **prueba_carga.resumen(resultados, options["duracion"])}
+        self.imprimir(datos)
+        if options["json"]:
+            with open(options["json"], "w", encoding="utf-8") as archivo:
+                json.dump(datos, archivo, indent=2)
+
+        base = options["base"]
+        if options["guardar_base"]:
+            os.makedirs(os.path.dirname(base) or ".", exist_ok=True)
+            with open(base, "w", encoding="utf-8") as archivo:
+                json.dump(datos, archivo, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Línea base guardada en {base}."))
+            return
+        if not os.path.exists(base):
+            self.stdout.write(f"Sin línea base en {base}; usa --guardar-base para crearla.")
+            return
+        with open(base, encoding="utf-8") as archivo:
+            anterior = json.load(archivo)
+        if anterior.get("parametros") != parametros:
+            self.stderr.write(
+                f"Aviso: la línea base se midió con {anterior.get('parametros')}."
+            )
+        regresiones = prueba_carga.comparar(datos, anterior, options["tolerancia"])
+        if regresiones:
+            for regresion in regresiones:
+                self.stderr.write(self.style.ERROR(f"Regresión — {regresion}"))
+            raise CommandError(f"{len(regresiones)} regresión(es) respecto de {base}.")
+        self.stdout.write(self.style.SUCCESS("Sin regresiones respecto de la línea base."))
+
+    def ejecutar(self, url, pasos, options, clave):
+        self.stderr.write(
+            f"{options['clientes']} clientes contra {url} durante "
+            f"{options['calentamiento'] + options['duracion']:.0f} s…"
+        )
+        return asyncio.run(prueba_carga.ejecutar(
+            url, pasos, options["clientes"], options["duracion"], options["calentamiento"],
+            options["usuario"], clave, options["semilla"],
+        ))
+
+    def imprimir(self, datos):
+        self.stdout.write(
+            f"{'paso':<26}{'solic.':>8}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}"
+            f"{'p99 ms':>9}{'error':>8}{'429/503':>9}"
+        )
+        for nombre, fila in [*datos["pasos"].items(), ("total", datos["total"])]:
+            self.stdout.write(
+                f"{nombre:<26}{fila['solicitudes']:>8}{fila['rps']:>9}{fila['p50_ms']:>9}"
+                f"{fila['p95_ms']:>9}{fila['p99_ms']:>9}{fila['tasa_error']:>8.1%}"
+                f"{fila['tasa_limitadas']:>9.1%}"
+            )
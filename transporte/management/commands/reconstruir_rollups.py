@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from transporte import rollups
+from transporte.models import DespachoDiario
+
+
+class Command(BaseCommand):
+    help = "Recalcula la tabla de rollups diarios de despachos desde cero."
+
+    def handle(self, *args, **options):
+        rollups.reconstruir()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rollups reconstruidos: {DespachoDiario.objects.count()} filas."
+            )
+        )
@@ -0,0 +1,30 @@
+import json
+import time
+from datetime import date, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from transporte import utilizacion
+
+
+class Command(BaseCommand):
+    help = "Calcula la utilización de capacidad por vehículo, aeronave y ruta."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--desde", type=date.fromisoformat)
+        parser.add_argument("--hasta", type=date.fromisoformat)
+        parser.add_argument("--periodo", choices=utilizacion.PERIODOS)
+        parser.add_argument("--include-archived", action="store_true")
+
+    def handle(self, *args, **options):
+        hasta = options["hasta"] or timezone.localdate()
+        desde = options["desde"] or hasta - timedelta(days=30)
+        inicio = time.perf_counter()
+        resultado = utilizacion.calcular(
+            desde, hasta, options["periodo"], options["include_archived"]
+        )
+        duracion = (time.perf_counter() - inicio) * 1000
+        self.stdout.write(json.dumps(resultado, cls=DjangoJSONEncoder, ensure_ascii=False, indent=2))
+        self.stderr.write(f"Calculado en {duracion:.0f} ms.")
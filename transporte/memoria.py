@@ -0,0 +1,100 @@
+"""``tracemalloc`` measurements: peak memory of a block and where it went.
+
+``medir()`` traces Python allocations made while the block runs and
+reports the peak above the starting point and what is still retained at
+the end. With ``informe=True`` it also diffs a snapshot taken before and
+after the block: per allocation line, and attributed to the most recent
+frame in this project's code (the view, serializer or template helper
+that asked for the memory). Data still alive when the block ends, such
+as a response's ``data`` list and rendered body, shows up in the diff;
+short-lived intermediates only count towards the peak.
+
+tracemalloc is process-wide and slows every thread while it runs, so it
+is started only for the measured block and one measurement runs at a
+time; allocations from other threads in that window are included.
+"""
+import os
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+
+MARCOS = 25
+LIMITE_INFORME = 25
+
+_lock = threading.Lock()
+
+
+@contextmanager
+def medir(informe=False):
+    """Yield a dict filled on exit with ``pico`` and ``retenido`` bytes.
+
+    Yields None (and measures nothing) while another measurement runs.
+    """
+    if not _lock.acquire(blocking=False):
+        yield None
+        return
+    resultado = {}
+    activo = tracemalloc.is_tracing()
+    try:
+        if not activo:
+            tracemalloc.start(MARCOS if informe else 1)
+        tracemalloc.reset_peak()
+        antes = tracemalloc.take_snapshot() if informe else None
+        inicial, _ = tracemalloc.get_traced_memory()
+        try:
+            yield resultado
+        finally:
+            actual, pico = tracemalloc.get_traced_memory()
+            resultado["pico"] = max(pico - inicial, 0)
+            resultado["retenido"] = actual - inicial
+            if informe:
+                resultado.update(_informe(antes, tracemalloc.take_snapshot()))
+    finally:
+        if not activo:
+            tracemalloc.stop()
+        _lock.release()
+
+
+def _relativa(archivo):
+    # La raíz más larga primero: site-packages puede estar dentro del proyecto.
+    for raiz in sorted({str(settings.BASE_DIR), *filter(None, sys.path)}, key=len, reverse=True):
+        if archivo.startswith(raiz + os.sep):
+            return archivo[len(raiz) + 1:]
+    return archivo
+
+
+def _propio(archivo):
+    return archivo.startswith(str(settings.BASE_DIR)) and "site-packages" not in archivo
+
+
+def _informe(antes, despues):
+    excluir = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    antes, despues = antes.filter_traces(excluir), despues.filter_traces(excluir)
+    por_linea = [
+        {
+            "ubicacion": f"{_relativa(marco.filename)}:{marco.lineno}",
+            "bytes": diferencia.size_diff,
+            "bloques": diferencia.count_diff,
+        }
+        for diferencia in despues.compare_to(antes, "lineno")[:LIMITE_INFORME]
+        for marco in diferencia.traceback[:1]
+        if diferencia.size_diff > 0
+    ]
+    propio = Counter()
+    for diferencia in despues.compare_to(antes, "traceback"):
+        # El traceback va del marco más antiguo al más reciente.
+        marco = next((m for m in reversed(diferencia.traceback) if _propio(m.filename)), None)
+        clave = f"{_relativa(marco.filename)}:{marco.lineno}" if marco else "(fuera del proyecto)"
+        propio[clave] += diferencia.size_diff
+    return {
+        "por_linea": por_linea,
+        "por_codigo_propio": [
+            {"ubicacion": ubicacion, "bytes": total}
+            for ubicacion, total in propio.most_common(LIMITE_INFORME)
+            if total > 0
+        ],
+    }
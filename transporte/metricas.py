@@ -0,0 +1,299 @@
+"""Request metrics in the Prometheus text format.
+
+``MetricasMiddleware`` records, per route name and method, a request
+counter (with the status class), a latency histogram and the number and
+time of the SQL queries the request ran. Recording only adds to a dict in
+process memory; about once per second (``INTERVALO_VOLCADO``) each worker
+adds its deltas to a local SQLite file (``TRANSPORTE_METRICAS_SQLITE``),
+so ``/metrics`` reports the sum over every worker process on the host.
+The cache hit/miss counters from ``cache.estadisticas`` ride along.
+"""
+import atexit
+import bisect
+import hmac
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+
+from .cache import estadisticas
+
+PREFIJO = "logistica"
+CUBETAS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CUBETAS_BYTES = tuple(2**n for n in range(16, 32, 2))  # 64 KiB .. 1 GiB
+INTERVALO_VOLCADO = 1.0
+
+# nombre -> (tipo, ayuda)
+METRICAS = {
+    "http_solicitudes_total": ("counter", "Solicitudes HTTP por ruta, método y clase de estado."),
+    "http_duracion_segundos": ("histogram", "Duración de la solicitud hasta la respuesta."),
+    "http_memoria_pico_bytes": (
+        "histogram", "Pico de memoria Python por solicitud (muestreado con tracemalloc)."
+    ),
+    "db_consultas_total": ("counter", "Consultas SQL ejecutadas por ruta y método."),
+    "db_segundos_total": ("counter", "Tiempo en consultas SQL por ruta y método."),
+    "cache_operaciones_total": ("counter", "Aciertos y fallos de las cachés de transporte."),
+    "cache_aciertos_ratio": ("gauge", "Aciertos / (aciertos + fallos) por tipo de caché."),
+}
+CUBETAS_METRICA = {"http_memoria_pico_bytes": CUBETAS_BYTES}
+
+
+class AlmacenSQLite:
+    """Counters summed across processes in a SQLite file."""
+
+    def __init__(self, ruta):
+        self.ruta = str(ruta)
+        self._local = threading.local()
+        self._conexion().execute(
+            "CREATE TABLE IF NOT EXISTS metricas (nombre TEXT NOT NULL, etiquetas TEXT NOT NULL, "
+            "le TEXT NOT NULL, valor REAL NOT NULL, PRIMARY KEY (nombre, etiquetas, le))"
+        )
+
+    def _conexion(self):
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=5, isolation_level=None)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=OFF")
+            self._local.conexion = conexion
+        return conexion
+
+    def sumar(self, deltas):
+        conexion = self._conexion()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            conexion.executemany(
+                "INSERT INTO metricas (nombre, etiquetas, le, valor) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (nombre, etiquetas, le) DO UPDATE SET valor = valor + excluded.valor",
+                [(*clave, valor) for clave, valor in deltas.items()],
+            )
+            conexion.execute("COMMIT")
+        except BaseException:
+            conexion.execute("ROLLBACK")
+            raise
+
+    def leer(self):
+        return self._conexion().execute(
+            "SELECT nombre, etiquetas, le, valor FROM metricas ORDER BY nombre, etiquetas"
+        ).fetchall()
+
+
+@lru_cache(maxsize=1)
+def obtener_almacen():
+    ruta = settings.TRANSPORTE_METRICAS_SQLITE
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    return AlmacenSQLite(ruta)
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def etiquetas(**valores):
+    """Canonical Prometheus label string: ``a="1",b="2"``."""
+    return ",".join(f'{clave}="{_escapar(valor)}"' for clave, valor in sorted(valores.items()))
+
+
+def _leer_etiquetas(texto):
+    return dict(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', texto))
+
+
+class Registro:
+    """Deltas accumulated in this process since the last flush."""
+
+    def __init__(self):
+        self._deltas = defaultdict(float)
+        self._lock = threading.Lock()
+        self._volcado = time.monotonic()
+        self._cache_previa = {}
+
+    def sumar(self, nombre, etiquetas, valor=1.0):
+        with self._lock:
+            self._deltas[(nombre, etiquetas, "")] += valor
+
+    def observar(self, nombre, etiquetas, valor):
+        cubetas = CUBETAS_METRICA.get(nombre, CUBETAS)
+        indice = bisect.bisect_left(cubetas, valor)
+        with self._lock:
+            if indice < len(cubetas):
+                self._deltas[(f"{nombre}_bucket", etiquetas, str(cubetas[indice]))] += 1
+            self._deltas[(f"{nombre}_count", etiquetas, "")] += 1
+            self._deltas[(f"{nombre}_sum", etiquetas, "")] += valor
+
+    def volcar(self):
+        """Add this process' deltas to the shared store."""
+        for clave, total in list(estadisticas.items()):
+            delta = total - self._cache_previa.get(clave, 0)
+            if delta:
+                tipo, _, resultado = clave.rpartition("_")
+                self.sumar("cache_operaciones_total", etiquetas(tipo=tipo, resultado=resultado), delta)
+                self._cache_previa[clave] = total
+        with self._lock:
+            deltas, self._deltas = self._deltas, defaultdict(float)
+            self._volcado = time.monotonic()
+        if deltas:
+            obtener_almacen().sumar(deltas)
+
+    def debe_volcar(self):
+        return time.monotonic() - self._volcado >= INTERVALO_VOLCADO
+
+
+registro = Registro()
+atexit.register(registro.volcar)
+
+# [consultas, segundos] de la solicitud en curso; None fuera de una solicitud.
+_sql = ContextVar("metricas_sql", default=None)
+
+
+def medir_sql(execute, sql, params, many, context):
+    acumulado = _sql.get()
+    if acumulado is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        acumulado[0] += 1
+        acumulado[1] += time.perf_counter() - inicio
+
+
+@receiver(connection_created)
+def instalar_medicion_sql(sender, connection, **kwargs):
+    if medir_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(medir_sql)
+
+
+def nombre_ruta(request):
+    coincidencia = getattr(request, "resolver_match", None)
+    return coincidencia.view_name if coincidencia else "sin_ruta"
+
+
+def registrar(request, response, duracion, consultas, segundos_sql):
+    ruta = nombre_ruta(request)
+    base = etiquetas(ruta=ruta, metodo=request.method)
+    registro.sumar(
+        "http_solicitudes_total",
+        etiquetas(ruta=ruta, metodo=request.method, estado=f"{response.status_code // 100}xx"),
+    )
+    registro.observar("http_duracion_segundos", base, duracion)
+    if consultas:
+        registro.sumar("db_consultas_total", base, consultas)
+        registro.sumar("db_segundos_total", base, segundos_sql)
+
+
+def registrar_memoria(request, pico):
+    registro.observar(
+        "http_memoria_pico_bytes", etiquetas(ruta=nombre_ruta(request), metodo=request.method), pico
+    )
+
+
+class MetricasMiddleware:
+    """Time every request and count its SQL queries; works under WSGI and ASGI."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.asincrono = iscoroutinefunction(get_response)
+        if self.asincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.asincrono:
+            return self.__acall__(request)
+        token = _sql.set([0, 0.0])
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            consultas, segundos = _sql.get()
+            _sql.reset(token)
+        registrar(request, response, time.perf_counter() - inicio, consultas, segundos)
+        if registro.debe_volcar():
+            registro.volcar()
+        return response
+
+    async def __acall__(self, request):
+        token = _sql.set([0, 0.0])
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            consultas, segundos = _sql.get()
+            _sql.reset(token)
+        registrar(request, response, time.perf_counter() - inicio, consultas, segundos)
+        if registro.debe_volcar():
+            await sync_to_async(registro.volcar, thread_sensitive=False)()
+        return response
+
+
+def exportar(filas):
+    """Render the stored rows in the Prometheus text exposition format."""
+    series = defaultdict(lambda: defaultdict(dict))
+    for nombre, etiquetas_, le, valor in filas:
+        series[nombre][etiquetas_][le] = valor
+
+    cache = defaultdict(lambda: {"aciertos": 0.0, "fallos": 0.0})
+    for etiquetas_, valores in series.get("cache_operaciones_total", {}).items():
+        campos = _leer_etiquetas(etiquetas_)
+        cache[campos["tipo"]][campos["resultado"]] += valores[""]
+
+    lineas = []
+    for nombre, (tipo, ayuda) in METRICAS.items():
+        completo = f"{PREFIJO}_{nombre}"
+        lineas.append(f"# HELP {completo} {ayuda}")
+        lineas.append(f"# TYPE {completo} {tipo}")
+        if tipo == "histogram":
+            for etiquetas_, valores in sorted(series.get(f"{nombre}_count", {}).items()):
+                cubetas = series.get(f"{nombre}_bucket", {}).get(etiquetas_, {})
+                separador = "," if etiquetas_ else ""
+                acumulado = 0.0
+                for cubeta in CUBETAS_METRICA.get(nombre, CUBETAS):
+                    acumulado += cubetas.get(str(cubeta), 0.0)
+                    lineas.append(
+                        f'{completo}_bucket{{{etiquetas_}{separador}le="{cubeta}"}} {acumulado:g}'
+                    )
+                total = valores[""]
+                suma = series[f"{nombre}_sum"][etiquetas_][""]
+                lineas.append(f'{completo}_bucket{{{etiquetas_}{separador}le="+Inf"}} {total:g}')
+                lineas.append(f"{completo}_sum{{{etiquetas_}}} {suma:.6f}")
+                lineas.append(f"{completo}_count{{{etiquetas_}}} {total:g}")
+        elif nombre == "cache_aciertos_ratio":
+            for tipo_cache, conteos in sorted(cache.items()):
+                total = conteos["aciertos"] + conteos["fallos"]
+                if total:
+                    ratio = conteos["aciertos"] / total
+                    lineas.append(f"{completo}{{{etiquetas(tipo=tipo_cache)}}} {ratio:.4f}")
+        else:
+            for etiquetas_, valores in sorted(series.get(nombre, {}).items()):
+                lineas.append(f"{completo}{{{etiquetas_}}} {valores['']:g}")
+    return "\n".join(lineas) + "\n"
+
+
+def _autorizado(request):
+    token = settings.TRANSPORTE_METRICAS_TOKEN
+    cabecera = request.headers.get("Authorization", "")
+    if token and hmac.compare_digest(cabecera.encode(), f"Bearer {token}".encode()):
+        return True
+    return request.user.is_authenticated and request.user.is_staff
+
+
+def metricas(request):
+    """``/metrics``: staff session or ``Authorization: Bearer <TRANSPORTE_METRICAS_TOKEN>``."""
+    if not _autorizado(request):
+        return HttpResponseForbidden()
+    registro.volcar()
+    return HttpResponse(
+        exportar(obtener_almacen().leer()),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
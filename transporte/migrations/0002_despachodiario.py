@@ -0,0 +1,70 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def poblar_rollups(apps, schema_editor):
+    Despacho = apps.get_model("transporte", "Despacho")
+    DespachoDiario = apps.get_model("transporte", "DespachoDiario")
+    conteos = (
+        Despacho.objects.order_by()
+        .values("fecha", "ruta_id", "estado")
+        .annotate(total=models.Count("id"))
+    )
+    DespachoDiario.objects.bulk_create(
+        (DespachoDiario(**fila) for fila in conteos.iterator()), batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("transporte", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DespachoDiario",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("fecha", models.DateField()),
+                (
+                    "estado",
+                    models.CharField(
+                        choices=[
+                            ("PENDIENTE", "Pendiente"),
+                            ("EN_RUTA", "En ruta"),
+                            ("ENTREGADO", "Entregado"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("total", models.IntegerField(default=0)),
+                (
+                    "ruta",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="transporte.ruta",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("fecha", "ruta", "estado"), name="despachodiario_unico"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(poblar_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:06
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("transporte", "0002_despachodiario"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Trabajo",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("tipo", models.CharField(max_length=50)),
+                ("parametros", models.JSONField(blank=True, default=dict)),
+                (
+                    "estado",
+                    models.CharField(
+                        choices=[
+                            ("PENDIENTE", "Pendiente"),
+                            ("EN_CURSO", "En curso"),
+                            ("COMPLETADO", "Completado"),
+                            ("FALLIDO", "Fallido"),
+                            ("CANCELADO", "Cancelado"),
+                        ],
+                        default="PENDIENTE",
+                        max_length=20,
+                    ),
+                ),
+                ("progreso", models.PositiveSmallIntegerField(default=0)),
+                ("intentos", models.PositiveSmallIntegerField(default=0)),
+                ("max_intentos", models.PositiveSmallIntegerField(default=3)),
+                ("cancelacion_solicitada", models.BooleanField(default=False)),
+                ("resultado", models.CharField(blank=True, max_length=255)),
+                ("tipo_contenido", models.CharField(blank=True, max_length=100)),
+                ("error", models.TextField(blank=True)),
+                ("creado", models.DateTimeField(auto_now_add=True)),
+                (
+                    "disponible_desde",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("iniciado", models.DateTimeField(blank=True, null=True)),
+                ("finalizado", models.DateTimeField(blank=True, null=True)),
+                (
+                    "duracion_ejecucion_ms",
+                    models.PositiveIntegerField(blank=True, null=True),
+                ),
+                (
+                    "creado_por",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["estado", "disponible_desde"],
+                        name="transporte__estado_419d52_idx",
+                    )
+                ],
+            },
+        ),
+    ]
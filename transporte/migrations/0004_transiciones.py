@@ -0,0 +1,94 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("transporte", "0003_trabajo"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TiempoEstadoRuta",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("estado", models.PositiveSmallIntegerField()),
+                ("cubeta", models.PositiveSmallIntegerField()),
+                ("total", models.PositiveIntegerField(default=0)),
+                ("segundos", models.BigIntegerField(default=0)),
+                (
+                    "ruta",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="transporte.ruta",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("ruta", "estado", "cubeta"),
+                        name="tiempoestadoruta_unico",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="TransicionDespacho",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("desde", models.PositiveSmallIntegerField()),
+                ("hacia", models.PositiveSmallIntegerField()),
+                (
+                    "instante",
+                    models.BigIntegerField(help_text="Segundos desde epoch (UTC)."),
+                ),
+                (
+                    "despacho",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="transporte.despacho",
+                    ),
+                ),
+                (
+                    "ruta",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="transporte.ruta",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["despacho", "-id"],
+                        name="transporte__despach_0564c8_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("transporte", "0004_transiciones"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DespachoArchivado",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("codigo", models.CharField(max_length=50, unique=True)),
+                ("fecha", models.DateField(db_index=True)),
+                (
+                    "estado",
+                    models.CharField(
+                        choices=[
+                            ("PENDIENTE", "Pendiente"),
+                            ("EN_RUTA", "En ruta"),
+                            ("ENTREGADO", "Entregado"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("observaciones", models.TextField(blank=True)),
+                ("archivado_en", models.DateTimeField(auto_now_add=True)),
+                (
+                    "aeronave",
+                    models.ForeignKey(
+                        blank=True,
+                        db_constraint=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="transporte.aeronave",
+                    ),
+                ),
+                (
+                    "carga",
+                    models.ForeignKey(
+                        blank=True,
+                        db_constraint=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="transporte.carga",
+                    ),
+                ),
+                (
+                    "conductor",
+                    models.ForeignKey(
+                        blank=True,
+                        db_constraint=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="transporte.conductor",
+                    ),
+                ),
+                (
+                    "piloto",
+                    models.ForeignKey(
+                        blank=True,
+                        db_constraint=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="transporte.piloto",
+                    ),
+                ),
+                (
+                    "ruta",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="transporte.ruta",
+                    ),
+                ),
+                (
+                    "vehiculo",
+                    models.ForeignKey(
+                        blank=True,
+                        db_constraint=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="transporte.vehiculo",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:11
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+CAMPOS_CLAVE = {
+    "Vehiculo": "patente",
+    "Aeronave": "matricula",
+    "Conductor": "run",
+    "Piloto": "run",
+    "Cliente": "rut",
+    "Carga": "descripcion",
+    "Ruta": "codigo",
+}
+
+
+def normalizar_clave(valor):
+    valor = (
+        unicodedata.normalize("NFKD", str(valor or ""))
+        .encode("ascii", "ignore")
+        .decode()
+    )
+    return re.sub(r"[^0-9A-Z]", "", valor.upper())
+
+
+def poblar_claves(apps, schema_editor):
+    for nombre, campo in CAMPOS_CLAVE.items():
+        modelo = apps.get_model("transporte", nombre)
+        instancias = list(modelo.objects.only("pk", campo))
+        for instancia in instancias:
+            instancia.clave = normalizar_clave(getattr(instancia, campo))
+        modelo.objects.bulk_update(instancias, ["clave"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("transporte", "0005_despachoarchivado"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="aeronave",
+            name="clave",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=50
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="carga",
+            name="clave",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=255
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="cliente",
+            name="clave",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=20
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="conductor",
+            name="clave",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=20
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="piloto",
+            name="clave",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=20
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="ruta",
+            name="clave",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=50
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="vehiculo",
+            name="clave",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=20
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(poblar_claves, migrations.RunPython.noop),
+    ]
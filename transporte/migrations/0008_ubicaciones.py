@@ -0,0 +1,156 @@
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def normalizar_clave(valor):
+    valor = (
+        unicodedata.normalize("NFKD", str(valor or ""))
+        .encode("ascii", "ignore")
+        .decode()
+    )
+    return re.sub(r"[^0-9A-Z]", "", valor.upper())
+
+
+def internar_ubicaciones(apps, schema_editor):
+    """Create one Ubicacion per normalized name and point the rutas at it.
+
+    Spelling variants that normalize to the same key are merged; the most
+    frequent spelling becomes the canonical ``nombre``.
+    """
+    Ruta = apps.get_model("transporte", "Ruta")
+    Ubicacion = apps.get_model("transporte", "Ubicacion")
+    rutas = list(Ruta.objects.only("pk", "origen", "destino"))
+    variantes = defaultdict(Counter)
+    for ruta in rutas:
+        for nombre in (ruta.origen, ruta.destino):
+            nombre = " ".join(nombre.split())
+            variantes[normalizar_clave(nombre)][nombre] += 1
+    Ubicacion.objects.bulk_create(
+        [
+            Ubicacion(
+                clave=clave,
+                nombre=min(conteo, key=lambda nombre: (-conteo[nombre], nombre)),
+            )
+            for clave, conteo in variantes.items()
+        ],
+        batch_size=1000,
+    )
+    ids = dict(Ubicacion.objects.values_list("clave", "pk"))
+    for ruta in rutas:
+        ruta.origen_ubicacion_id = ids[normalizar_clave(" ".join(ruta.origen.split()))]
+        ruta.destino_ubicacion_id = ids[
+            normalizar_clave(" ".join(ruta.destino.split()))
+        ]
+    Ruta.objects.bulk_update(
+        rutas, ["origen_ubicacion", "destino_ubicacion"], batch_size=1000
+    )
+
+
+def restaurar_textos(apps, schema_editor):
+    Ruta = apps.get_model("transporte", "Ruta")
+    rutas = list(Ruta.objects.select_related("origen_ubicacion", "destino_ubicacion"))
+    for ruta in rutas:
+        ruta.origen = ruta.origen_ubicacion.nombre
+        ruta.destino = ruta.destino_ubicacion.nombre
+    Ruta.objects.bulk_update(rutas, ["origen", "destino"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("transporte", "0007_version_filas"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Ubicacion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("nombre", models.CharField(max_length=100)),
+                (
+                    "clave",
+                    models.CharField(editable=False, max_length=100, unique=True),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="ruta",
+            name="origen_ubicacion",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="transporte.ubicacion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="ruta",
+            name="destino_ubicacion",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="transporte.ubicacion",
+            ),
+        ),
+        migrations.RunPython(internar_ubicaciones, restaurar_textos),
+        # Un valor por defecto permite volver a crear las columnas al revertir.
+        migrations.AlterField(
+            model_name="ruta",
+            name="origen",
+            field=models.CharField(default="", max_length=100),
+        ),
+        migrations.AlterField(
+            model_name="ruta",
+            name="destino",
+            field=models.CharField(default="", max_length=100),
+        ),
+        migrations.RemoveField(
+            model_name="ruta",
+            name="origen",
+        ),
+        migrations.RemoveField(
+            model_name="ruta",
+            name="destino",
+        ),
+        migrations.RenameField(
+            model_name="ruta",
+            old_name="origen_ubicacion",
+            new_name="origen",
+        ),
+        migrations.RenameField(
+            model_name="ruta",
+            old_name="destino_ubicacion",
+            new_name="destino",
+        ),
+        migrations.AlterField(
+            model_name="ruta",
+            name="origen",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="rutas_origen",
+                to="transporte.ubicacion",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="ruta",
+            name="destino",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="rutas_destino",
+                to="transporte.ubicacion",
+            ),
+        ),
+    ]
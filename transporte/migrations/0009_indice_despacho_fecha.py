@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("transporte", "0008_ubicaciones"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="despacho",
+            index=models.Index(fields=["fecha", "id"], name="despacho_fecha_id"),
+        ),
+    ]
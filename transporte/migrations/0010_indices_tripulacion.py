@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-19 19:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("transporte", "0009_indice_despacho_fecha"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="despacho",
+            index=models.Index(
+                fields=["conductor", "fecha"], name="despacho_conductor_fecha"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="despacho",
+            index=models.Index(
+                fields=["piloto", "fecha"], name="despacho_piloto_fecha"
+            ),
+        ),
+    ]
@@ -1,13 +1,129 @@
-from django.db import models
+import re
+import unicodedata
+from typing import NamedTuple
 
+from django.conf import settings
+from django.db import IntegrityError, models, router, transaction
+from django.utils import timezone
 
-class Vehiculo(models.Model):
+
+def normalizar_clave(valor) -> str:
+    """Uppercase ASCII letters and digits only: ``"ab-cd.12"`` -> ``"ABCD12"``."""
+    valor = unicodedata.normalize("NFKD", str(valor or "")).encode("ascii", "ignore").decode()
+    return re.sub(r"[^0-9A-Z]", "", valor.upper())
+
+
+class ClaveBusquedaMixin:
+    """Keep ``clave``, an indexed normalized copy of ``campo_clave``, in sync.
+
+    Prefix searches become an index range scan on ``clave`` (see
+    ``buscar_por_prefijo``) instead of ``icontains`` over the whole table.
+    """
+
+    campo_clave = None
+
+    def save(self, *args, **kwargs):
+        self.clave = normalizar_clave(getattr(self, self.campo_clave))
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and self.campo_clave in update_fields:
+            kwargs["update_fields"] = {*update_fields, "clave"}
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def buscar_por_prefijo(cls, texto, queryset=None):
+        prefijo = normalizar_clave(texto)
+        queryset = (cls.objects.all() if queryset is None else queryset).order_by("clave")
+        if prefijo:
+            queryset = queryset.filter(clave__gte=prefijo, clave__lt=prefijo + "\x7f")
+        return queryset
+
+
+class ConflictoVersion(Exception):
+    """The row was changed or deleted after the version being saved was read."""
+
+    def __init__(self, instancia, esperada, actual):
+        self.instancia = instancia
+        self.esperada = esperada
+        # None si la fila ya no existe.
+        self.actual = actual
+        super().__init__(
+            f"{instancia._meta.verbose_name} {instancia.pk}: se esperaba la versión "
+            f"{esperada} y la actual es {actual}."
+        )
+
+
+class ModeloVersionado(models.Model):
+    """Adds a ``version`` stamp that increases on every save of the row.
+
+    Saving an existing row is optimistic: the UPDATE only matches while the
+    stored version is still the one on the instance, otherwise ``save()``
+    raises ``ConflictoVersion`` and nothing is written. Callers that act on
+    a version read earlier (a form, an ``If-Match`` header) set
+    ``instance.version`` to it before saving.
+    """
+
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        leida = self.version or 0
+        self._version_leida = leida
+        self.version = leida + 1
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "version"}
+        using = kwargs.get("using") or router.db_for_write(type(self), instance=self)
+        try:
+            if transaction.get_connection(using).in_atomic_block:
+                # Un conflicto no debe dejar inutilizable la transacción que
+                # lo envuelve (admin, pruebas): se aísla en un savepoint.
+                with transaction.atomic(using=using):
+                    super().save(*args, **kwargs)
+            else:
+                super().save(*args, **kwargs)
+        except BaseException:
+            # Sin escritura (conflicto, IntegrityError, señal que falla...) la
+            # instancia conserva la versión leída y se puede volver a guardar.
+            self.version = leida
+            raise
+        finally:
+            self.__dict__.pop("_version_leida", None)
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        # save_base() directo (loaddata) no pasa por save() y escribe sin condición.
+        leida = self.__dict__.pop("_version_leida", None)
+        if leida is None:
+            return super()._do_update(
+                base_qs, using, pk_val, values, update_fields, forced_update
+            )
+        if base_qs.filter(pk=pk_val, version=leida)._update(values) > 0:
+            return True
+        actual = base_qs.filter(pk=pk_val).values_list("version", flat=True).first()
+        raise ConflictoVersion(self, leida, actual)
+
+
+class EstadoDespacho(NamedTuple):
+    """Snapshot of the Despacho columns that derived data depends on."""
+
+    id: int
+    codigo: str
+    fecha: object
+    ruta_id: int
+    estado: str
+
+
+class Vehiculo(ClaveBusquedaMixin, ModeloVersionado):
     class Estado(models.TextChoices):
         ACTIVO = "ACTIVO", "Activo"
         MANTENCION = "MANTENCION", "En mantención"
         INACTIVO = "INACTIVO", "Inactivo"
 
     patente = models.CharField(max_length=20, unique=True)
+    clave = models.CharField(max_length=20, editable=False, db_index=True)
     marca = models.CharField(max_length=100)
     modelo = models.CharField(max_length=100, blank=True)
     capacidad_kg = models.PositiveIntegerField()
@@ -16,17 +132,20 @@ class Vehiculo(models.Model):
         max_length=20, choices=Estado.choices, default=Estado.ACTIVO
     )
 
+    campo_clave = "patente"
+
     def __str__(self) -> str:
         return f"{self.patente} - {self.marca}"
 
 
-class Aeronave(models.Model):
+class Aeronave(ClaveBusquedaMixin, ModeloVersionado):
     class Estado(models.TextChoices):
         OPERATIVA = "OPERATIVA", "Operativa"
         MANTENCION = "MANTENCION", "En mantención"
         FUERA = "FUERA", "Fuera de servicio"
 
     matricula = models.CharField(max_length=50, unique=True)
+    clave = models.CharField(max_length=50, editable=False, db_index=True)
     fabricante = models.CharField(max_length=100, blank=True)
     modelo = models.CharField(max_length=100, blank=True)
     capacidad_kg = models.PositiveIntegerField()
@@ -34,72 +153,223 @@ class Aeronave(models.Model):
         max_length=20, choices=Estado.choices, default=Estado.OPERATIVA
     )
 
+    campo_clave = "matricula"
+
     def __str__(self) -> str:
         return f"{self.matricula} - {self.modelo or 'Sin modelo'}"
 
 
-class Conductor(models.Model):
+class Conductor(ClaveBusquedaMixin, ModeloVersionado):
     run = models.CharField(max_length=20, unique=True)
+    clave = models.CharField(max_length=20, editable=False, db_index=True)
     nombre = models.CharField(max_length=200)
     licencia = models.CharField(max_length=50)
     telefono = models.CharField(max_length=50, blank=True)
     activo = models.BooleanField(default=True)
 
+    campo_clave = "run"
+
     def __str__(self) -> str:
         return f"{self.nombre} ({self.run})"
 
 
-class Piloto(models.Model):
+class Piloto(ClaveBusquedaMixin, ModeloVersionado):
     run = models.CharField(max_length=20, unique=True)
+    clave = models.CharField(max_length=20, editable=False, db_index=True)
     nombre = models.CharField(max_length=200)
     licencia = models.CharField(max_length=50)
     horas_vuelo = models.PositiveIntegerField(default=0)
     activo = models.BooleanField(default=True)
 
+    campo_clave = "run"
+
     def __str__(self) -> str:
         return f"{self.nombre} ({self.run})"
 
 
-class Cliente(models.Model):
+class Cliente(ClaveBusquedaMixin, ModeloVersionado):
     nombre = models.CharField(max_length=200)
     rut = models.CharField(max_length=20, unique=True)
+    clave = models.CharField(max_length=20, editable=False, db_index=True)
     direccion = models.CharField(max_length=255, blank=True)
     telefono = models.CharField(max_length=50, blank=True)
     email = models.EmailField(blank=True)
 
+    campo_clave = "rut"
+
     def __str__(self) -> str:
         return f"{self.nombre} ({self.rut})"
 
 
-class Carga(models.Model):
+class Carga(ClaveBusquedaMixin, ModeloVersionado):
     cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE)
     descripcion = models.CharField(max_length=255)
+    clave = models.CharField(max_length=255, editable=False, db_index=True)
     peso_kg = models.PositiveIntegerField()
     tipo = models.CharField(max_length=100, blank=True)
     valor_estimado = models.DecimalField(max_digits=12, decimal_places=2)
 
+    campo_clave = "descripcion"
+
     def __str__(self) -> str:
         return f"Carga {self.descripcion} para {self.cliente.nombre}"
 
 
-class Ruta(models.Model):
+class Ubicacion(ClaveBusquedaMixin, models.Model):
+    """Interned place name; spelling variants share one row through ``clave``."""
+
+    nombre = models.CharField(max_length=100)
+    clave = models.CharField(max_length=100, unique=True, editable=False)
+
+    campo_clave = "nombre"
+
+    def __str__(self) -> str:
+        return self.nombre
+
+    @classmethod
+    def buscar(cls, nombre) -> "Ubicacion":
+        """Return the row for ``nombre``, or an unsaved one; nothing is written."""
+        nombre = " ".join(str(nombre).split())
+        ubicacion = cls.objects.filter(clave=normalizar_clave(nombre)).first()
+        return ubicacion if ubicacion is not None else cls(nombre=nombre)
+
+    @classmethod
+    def interna(cls, nombre) -> "Ubicacion":
+        """Return the row for ``nombre``, creating it on first use."""
+        ubicacion = nombre if isinstance(nombre, cls) else cls.buscar(nombre)
+        if ubicacion.pk is None:
+            try:
+                with transaction.atomic():
+                    ubicacion.save()
+            except IntegrityError:
+                # Otra solicitud creó la misma ubicación en paralelo.
+                ubicacion = cls.objects.get(clave=ubicacion.clave)
+        return ubicacion
+
+
+class RutaManager(models.Manager):
+    def get_queryset(self):
+        # ``__str__`` muestra origen y destino.
+        return super().get_queryset().select_related("origen", "destino")
+
+
+class Ruta(ClaveBusquedaMixin, ModeloVersionado):
     class TipoTransporte(models.TextChoices):
         TERRESTRE = "TERRESTRE", "Terrestre"
         AEREO = "AEREO", "Aéreo"
 
     codigo = models.CharField(max_length=50, unique=True)
-    origen = models.CharField(max_length=100)
-    destino = models.CharField(max_length=100)
+    clave = models.CharField(max_length=50, editable=False, db_index=True)
+    origen = models.ForeignKey(
+        Ubicacion, on_delete=models.PROTECT, related_name="rutas_origen"
+    )
+    destino = models.ForeignKey(
+        Ubicacion, on_delete=models.PROTECT, related_name="rutas_destino"
+    )
     tipo_transporte = models.CharField(
         max_length=20, choices=TipoTransporte.choices
     )
     duracion_estimada_min = models.PositiveIntegerField(blank=True, null=True)
 
+    objects = RutaManager()
+
+    campo_clave = "codigo"
+
     def __str__(self) -> str:
         return f"{self.codigo}: {self.origen} -> {self.destino}"
 
 
-class Despacho(models.Model):
+class DespachoQuerySet(models.QuerySet):
+    """QuerySet that reports bulk writes through ``despachos_cambiados``.
+
+    ``update()``, ``bulk_update()`` and ``bulk_create()`` skip model signals,
+    so rollups, change events and the transition log are notified here,
+    once per statement with every changed row.
+    ``update()`` also bumps the row ``version`` and sends
+    ``filas_actualizadas`` so cached fragments are invalidated.
+    """
+
+    def _snapshots(self, filtro):
+        campos = ("id",) + self.model.SNAPSHOT_FIELDS
+        return {
+            fila[0]: EstadoDespacho(*fila)
+            for fila in self.model._base_manager.using(self.db)
+            .filter(filtro).values_list(*campos).iterator()
+        }
+
+    def update(self, **kwargs):
+        afecta = any(
+            self.model._meta.get_field(campo).attname in self.model.SNAPSHOT_FIELDS
+            for campo in kwargs
+        )
+        kwargs.setdefault("version", models.F("version") + 1)
+        from .signals import filas_actualizadas, notificar_lote
+
+        if not afecta:
+            filas = super().update(**kwargs)
+        else:
+            with transaction.atomic(using=self.db):
+                antes = self._snapshots(models.Q(pk__in=self.values("pk")))
+                filas = super().update(**kwargs)
+                despues = self._snapshots(models.Q(pk__in=list(antes)))
+                notificar_lote([
+                    (anterior, despues.get(pk))
+                    for pk, anterior in antes.items()
+                    if despues.get(pk) != anterior
+                ])
+        filas_actualizadas.send(sender=self.model)
+        return filas
+
+    update.alters_data = True
+
+    def transicionar(self, estado, lote=500):
+        """Move the rows to ``estado`` where ``Despacho.TRANSICIONES`` allows it.
+
+        The current estados are read in one query and the legal rows are
+        updated with one UPDATE per ``lote`` ids, guarded on the origin
+        estado. Returns ``{id: (resultado, estado)}`` with ``resultado`` one
+        of ``"actualizado"``, ``"sin_cambio"``, ``"invalido"`` or
+        ``"conflicto"`` (changed by someone else in between).
+        """
+        origenes = self.model.TRANSICIONES.get(estado, ())
+        resultados = {}
+        legales = []
+        for pk, actual in self.order_by("pk").values_list("pk", "estado"):
+            if actual == estado:
+                resultados[pk] = ("sin_cambio", actual)
+            elif actual in origenes:
+                legales.append(pk)
+            else:
+                resultados[pk] = ("invalido", actual)
+        base = self.model.objects.using(self.db)
+        for inicio in range(0, len(legales), lote):
+            ids = legales[inicio:inicio + lote]
+            filas = base.filter(pk__in=ids, estado__in=origenes).update(estado=estado)
+            if filas == len(ids):
+                resultados.update((pk, ("actualizado", estado)) for pk in ids)
+                continue
+            # Carrera con otra escritura: se relee el lote para informar cada fila.
+            for pk, actual in base.filter(pk__in=ids).values_list("pk", "estado"):
+                resultados[pk] = ("actualizado" if actual == estado else "conflicto", actual)
+        return resultados
+
+    transicionar.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from .signals import notificar_lote
+
+        with transaction.atomic(using=self.db):
+            creados = super().bulk_create(objs, *args, **kwargs)
+            cambios = []
+            for obj in creados:
+                if obj.pk is not None:
+                    obj._snapshot = obj.snapshot()
+                    cambios.append((None, obj._snapshot))
+            notificar_lote(cambios)
+        return creados
+
+
+class Despacho(ModeloVersionado):
     class Estado(models.TextChoices):
         PENDIENTE = "PENDIENTE", "Pendiente"
         EN_RUTA = "EN_RUTA", "En ruta"
@@ -118,5 +388,190 @@ class Despacho(models.Model):
     )
     observaciones = models.TextField(blank=True)
 
+    objects = DespachoQuerySet.as_manager()
+
+    SNAPSHOT_FIELDS = ("codigo", "fecha", "ruta_id", "estado")
+    # Estado destino -> estados desde los que se puede llegar a él.
+    TRANSICIONES = {
+        Estado.EN_RUTA: (Estado.PENDIENTE,),
+        Estado.ENTREGADO: (Estado.EN_RUTA,),
+    }
+    # Filas por cambio de estado en bloque (API y panel).
+    TRANSICION_MAXIMA = 5000
+
+    class Meta:
+        indexes = [
+            # Orden por fecha del API: las páginas del cursor buscan en el índice.
+            models.Index(fields=["fecha", "id"], name="despacho_fecha_id"),
+            # Carga de tripulación: agrupa por persona y fecha sin leer la tabla.
+            models.Index(fields=["conductor", "fecha"], name="despacho_conductor_fecha"),
+            models.Index(fields=["piloto", "fecha"], name="despacho_piloto_fecha"),
+        ]
+
     def __str__(self) -> str:
         return f"Despacho {self.codigo} - {self.estado}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Guardamos el estado leído para detectar cambios sin volver a consultar.
+        if instance.get_deferred_fields().isdisjoint(cls.SNAPSHOT_FIELDS):
+            instance._snapshot = instance.snapshot()
+        else:
+            instance._snapshot = None
+        return instance
+
+    def snapshot(self) -> EstadoDespacho:
+        """Return the current values tracked by rollups and change events."""
+        fecha = self.fecha
+        if isinstance(fecha, str):
+            fecha = self._meta.get_field("fecha").to_python(fecha)
+        return EstadoDespacho(self.pk, self.codigo, fecha, self.ruta_id, self.estado)
+
+
+class DespachoArchivado(models.Model):
+    """Cold copy of delivered despachos moved out by ``archivar_despachos``.
+
+    Keeps the original id and column names so filters, search, ordering
+    and ``DespachoSerializer`` work on both tables.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    codigo = models.CharField(max_length=50, unique=True)
+    fecha = models.DateField(db_index=True)
+    ruta = models.ForeignKey(
+        Ruta, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+"
+    )
+    vehiculo = models.ForeignKey(
+        Vehiculo, on_delete=models.DO_NOTHING, db_constraint=False,
+        blank=True, null=True, related_name="+",
+    )
+    aeronave = models.ForeignKey(
+        Aeronave, on_delete=models.DO_NOTHING, db_constraint=False,
+        blank=True, null=True, related_name="+",
+    )
+    conductor = models.ForeignKey(
+        Conductor, on_delete=models.DO_NOTHING, db_constraint=False,
+        blank=True, null=True, related_name="+",
+    )
+    piloto = models.ForeignKey(
+        Piloto, on_delete=models.DO_NOTHING, db_constraint=False,
+        blank=True, null=True, related_name="+",
+    )
+    carga = models.ForeignKey(
+        Carga, on_delete=models.DO_NOTHING, db_constraint=False,
+        blank=True, null=True, related_name="+",
+    )
+    estado = models.CharField(max_length=20, choices=Despacho.Estado.choices)
+    observaciones = models.TextField(blank=True)
+    version = models.PositiveIntegerField(default=1, editable=False)
+    archivado_en = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f"Despacho {self.codigo} - {self.estado} (archivado)"
+
+
+class DespachoDiario(models.Model):
+    """Daily rollup of despachos per ruta and estado, kept in sync on writes."""
+
+    fecha = models.DateField()
+    ruta = models.ForeignKey(Ruta, on_delete=models.CASCADE, related_name="+")
+    estado = models.CharField(max_length=20, choices=Despacho.Estado.choices)
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["fecha", "ruta", "estado"], name="despachodiario_unico"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.fecha} {self.ruta_id} {self.estado}: {self.total}"
+
+
+class TransicionDespacho(models.Model):
+    """Append-only log of estado changes, one compact row per transition."""
+
+    # Códigos enteros de estado; 0 representa "sin estado" (creación).
+    CODIGOS = {None: 0, "PENDIENTE": 1, "EN_RUTA": 2, "ENTREGADO": 3}
+
+    despacho = models.ForeignKey(
+        Despacho, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+"
+    )
+    ruta = models.ForeignKey(
+        Ruta, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+"
+    )
+    desde = models.PositiveSmallIntegerField()
+    hacia = models.PositiveSmallIntegerField()
+    instante = models.BigIntegerField(help_text="Segundos desde epoch (UTC).")
+
+    class Meta:
+        indexes = [models.Index(fields=["despacho", "-id"])]
+
+    def __str__(self) -> str:
+        return f"{self.despacho_id}: {self.desde} -> {self.hacia} @ {self.instante}"
+
+
+class TiempoEstadoRuta(models.Model):
+    """Histogram bucket of time spent in one estado for one ruta."""
+
+    ruta = models.ForeignKey(Ruta, on_delete=models.CASCADE, related_name="+")
+    estado = models.PositiveSmallIntegerField()
+    cubeta = models.PositiveSmallIntegerField()
+    total = models.PositiveIntegerField(default=0)
+    segundos = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["ruta", "estado", "cubeta"], name="tiempoestadoruta_unico"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.ruta_id} {self.estado}[{self.cubeta}]: {self.total}"
+
+
+class Trabajo(models.Model):
+    """Background job stored in the database and run by ``procesar_trabajos``."""
+
+    class Estado(models.TextChoices):
+        PENDIENTE = "PENDIENTE", "Pendiente"
+        EN_CURSO = "EN_CURSO", "En curso"
+        COMPLETADO = "COMPLETADO", "Completado"
+        FALLIDO = "FALLIDO", "Fallido"
+        CANCELADO = "CANCELADO", "Cancelado"
+
+    tipo = models.CharField(max_length=50)
+    parametros = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(
+        max_length=20, choices=Estado.choices, default=Estado.PENDIENTE
+    )
+    progreso = models.PositiveSmallIntegerField(default=0)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    max_intentos = models.PositiveSmallIntegerField(default=3)
+    cancelacion_solicitada = models.BooleanField(default=False)
+    resultado = models.CharField(max_length=255, blank=True)
+    tipo_contenido = models.CharField(max_length=100, blank=True)
+    error = models.TextField(blank=True)
+    creado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True
+    )
+    creado = models.DateTimeField(auto_now_add=True)
+    disponible_desde = models.DateTimeField(default=timezone.now)
+    iniciado = models.DateTimeField(blank=True, null=True)
+    finalizado = models.DateTimeField(blank=True, null=True)
+    duracion_ejecucion_ms = models.PositiveIntegerField(blank=True, null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["estado", "disponible_desde"])]
+
+    def __str__(self) -> str:
+        return f"Trabajo {self.pk} {self.tipo} - {self.estado}"
+
+    @property
+    def duracion_cola_ms(self):
+        if self.iniciado is None:
+            return None
+        return int((self.iniciado - self.creado).total_seconds() * 1000)
@@ -0,0 +1,315 @@
+"""Pagination for large tables without a ``COUNT(*)`` or deep ``OFFSET``.
+
+``PaginacionCursor`` is the API default: keyset pages behind an opaque
+cursor, so a page costs the same at any depth when the ordering column is
+indexed. ``ConteoEstimadoPaginator`` serves the admin changelists.
+
+Unfiltered lists take the row estimate the database keeps in its
+statistics (``pg_class.reltuples`` on PostgreSQL, ``sqlite_stat1`` after
+``ANALYZE`` on SQLite). Filtered lists, and tables too small or not yet
+analyzed, are counted exactly once per model version and query (see
+``cache.version_modelo``), so a page change doesn't count again until
+the table is written to.
+"""
+import base64
+import hashlib
+import json
+from typing import NamedTuple
+
+from django.core.cache import cache as django_cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import F, Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, replace_query_param
+from rest_framework.utils.encoders import JSONEncoder
+
+from .cache import PREFIJO, version_modelo
+
+# Por debajo de este estimado el conteo exacto es barato y se prefiere.
+UMBRAL_ESTIMADO = 10000
+TTL_CONTEO = 300
+
+
+def estimar_filas(model, using="default"):
+    """Return the planner's row estimate for ``model``'s table, or None."""
+    conexion = connections[using]
+    tabla = model._meta.db_table
+    if conexion.vendor == "postgresql":
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass"
+    elif conexion.vendor == "sqlite":
+        sql = "SELECT CAST(stat AS INTEGER) FROM sqlite_stat1 WHERE tbl = %s LIMIT 1"
+    elif conexion.vendor == "mysql":
+        sql = (
+            "SELECT table_rows FROM information_schema.tables "
+            "WHERE table_schema = DATABASE() AND table_name = %s"
+        )
+    else:
+        return None
+    try:
+        with conexion.cursor() as cursor:
+            cursor.execute(sql, [tabla])
+            fila = cursor.fetchone()
+    except DatabaseError:
+        # Sin ANALYZE previo no existe sqlite_stat1.
+        return None
+    if fila is None or fila[0] is None or fila[0] < 0:
+        return None
+    return int(fila[0])
+
+
+def contar(queryset) -> int:
+    """Estimated row count for an unfiltered queryset, cached exact count otherwise."""
+    model = queryset.model
+    if not queryset.query.where:
+        estimado = estimar_filas(model, queryset.db)
+        if estimado is not None and estimado >= UMBRAL_ESTIMADO:
+            return estimado
+    sql, params = queryset.query.sql_with_params()
+    huella = hashlib.md5(f"{sql}{params}".encode()).hexdigest()
+    clave = f"{PREFIJO}:conteo:{model._meta.label_lower}:{version_modelo(model)}:{huella}"
+    total = django_cache.get(clave)
+    if total is None:
+        total = queryset.count()
+        django_cache.set(clave, total, timeout=TTL_CONTEO)
+    return total
+
+
+class ConteoEstimadoPaginator(Paginator):
+    @cached_property
+    def count(self):
+        if isinstance(self.object_list, QuerySet):
+            return contar(self.object_list)
+        return super().count
+
+
+class Orden(NamedTuple):
+    campo: str
+    descendente: bool
+    nulo: bool
+
+    def expresion(self):
+        if not self.nulo:
+            return f"-{self.campo}" if self.descendente else self.campo
+        # NULL cuenta como el menor valor en ambos sentidos y en todos los motores.
+        if self.descendente:
+            return F(self.campo).desc(nulls_last=True)
+        return F(self.campo).asc(nulls_first=True)
+
+    def invertido(self):
+        return self._replace(descendente=not self.descendente)
+
+    def igual(self, valor):
+        if valor is None:
+            return Q(**{f"{self.campo}__isnull": True})
+        return Q(**{self.campo: valor})
+
+    def desde(self, valor):
+        """Rows at or after ``valor`` in this direction."""
+        if valor is None:
+            return self.igual(None) if self.descendente else Q()
+        q = Q(**{f"{self.campo}__{'lte' if self.descendente else 'gte'}": valor})
+        if self.nulo and self.descendente:
+            q |= Q(**{f"{self.campo}__isnull": True})
+        return q
+
+    def posterior(self, valor):
+        """Rows strictly after ``valor`` in this direction, or None if there are none."""
+        if valor is None:
+            return None if self.descendente else Q(**{f"{self.campo}__isnull": False})
+        q = Q(**{f"{self.campo}__{'lt' if self.descendente else 'gt'}": valor})
+        if self.nulo and self.descendente:
+            q |= Q(**{f"{self.campo}__isnull": True})
+        return q
+
+
+def _campos(model, campo):
+    """Yield the fields along a lookup path (``ruta__codigo`` -> ruta, codigo)."""
+    for parte in campo.split("__"):
+        field = model._meta.get_field(parte)
+        yield field
+        model = field.related_model
+
+
+def _es_nulo(model, campo):
+    return any(field.null for field in _campos(model, campo))
+
+
+def _valor(instancia, campo):
+    for parte in campo.split("__"):
+        if instancia is None:
+            return None
+        instancia = getattr(instancia, parte)
+    return instancia
+
+
+class PaginacionCursor(CursorPagination):
+    """Keyset pagination over the view's ordering plus the primary key.
+
+    The ordering comes from ``OrderingFilter`` (any of the view's
+    ``ordering_fields``), else the queryset's own ``order_by``, else the
+    pk. Appending the pk makes every ordering a total order, so columns
+    that are not unique, nullable, on a related table or not indexed
+    still page without gaps or repeats; only the ones backed by an index
+    let the database seek straight to the page. Views cap the page size
+    with ``max_page_size``.
+    """
+
+    page_size_query_param = "page_size"
+    max_page_size = 500
+    invalid_cursor_message = "Cursor inválido."
+    siguiente = anterior = None
+
+    def get_page_size(self, request):
+        self.max_page_size = getattr(self.view, "max_page_size", type(self).max_page_size)
+        return super().get_page_size(request)
+
+    def get_ordering(self, request, queryset, view):
+        campos = None
+        for backend in getattr(view, "filter_backends", []):
+            if hasattr(backend, "get_ordering"):
+                campos = backend().get_ordering(request, queryset, view)
+                break
+        if not campos:
+            campos = [c for c in queryset.query.order_by if isinstance(c, str)]
+        pk = queryset.model._meta.pk.name
+        orden = []
+        for campo in campos:
+            nombre, descendente = campo.lstrip("-"), campo.startswith("-")
+            if nombre in ("pk", pk):
+                orden.append(Orden(pk, descendente, False))
+                break
+            orden.append(Orden(nombre, descendente, _es_nulo(queryset.model, nombre)))
+        else:
+            orden.append(Orden(pk, False, False))
+        return tuple(orden)
+
+    def configurar(self, queryset, request, view=None):
+        """Read page size, ordering and cursor; return False if pagination is off."""
+        self.request = request
+        self.view = view
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return False
+        self.base_url = request.build_absolute_uri()
+        self.model = queryset.model
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        return True
+
+    def aplicar(self, queryset):
+        """Order ``queryset`` and keep the rows after (or before) the cursor."""
+        orden = self.ordering
+        if self.cursor is not None and self.cursor["r"]:
+            orden = tuple(o.invertido() for o in orden)
+        queryset = queryset.order_by(*(o.expresion() for o in orden))
+        if self.cursor is not None:
+            queryset = queryset.filter(self._posteriores(orden, self.cursor["p"]))
+        return queryset
+
+    def _posteriores(self, orden, valores):
+        resultado = Q(pk__in=[])
+        iguales = Q()
+        for o, valor in zip(orden, valores):
+            posterior = o.posterior(valor)
+            if posterior is not None:
+                resultado |= iguales & posterior
+            iguales &= o.igual(valor)
+        # Cota redundante sobre la primera columna: le da al índice dónde empezar.
+        return orden[0].desde(valores[0]) & resultado
+
+    def cortar(self, filas, posicion=None):
+        """Keep one page of ``filas`` (fetched with one extra row) and set the links."""
+        posicion = posicion or self.posicion
+        atras = self.cursor is not None and self.cursor["r"]
+        hay_mas = len(filas) > self.page_size
+        pagina = filas[: self.page_size]
+        if atras:
+            pagina.reverse()
+        self.siguiente = self.anterior = None
+        if pagina and (hay_mas or atras):
+            self.siguiente = posicion(pagina[-1])
+        if pagina and (hay_mas if atras else self.cursor is not None):
+            self.anterior = posicion(pagina[0])
+        if not pagina and self.cursor is not None:
+            # Página vacía: volver por donde se vino.
+            self.anterior = self.cursor["p"] if not atras else None
+            self.siguiente = self.cursor["p"] if atras else None
+        self.page = pagina
+        return pagina
+
+    def posicion(self, instancia):
+        return [_valor(instancia, o.campo) for o in self.ordering]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.paginar([queryset], lambda consulta, limite: list(consulta[:limite]), request, view)
+
+    def paginar(self, consultas, obtener, request, view=None):
+        """Paginate rows merged from ``consultas`` (same columns, e.g. hot and archived).
+
+        ``obtener(*consultas, limite)`` returns the rows of the ordered and
+        filtered querysets in order. Returns None when pagination is off.
+        """
+        if not self.configurar(consultas[0], request, view):
+            return None
+        filas = obtener(*(self.aplicar(consulta) for consulta in consultas), self.page_size + 1)
+        return self.cortar(list(filas))
+
+    def paginar_valores(self, consultas, campos, obtener, request, view=None):
+        """Like ``paginar`` for tuples: ``obtener(*consultas, columnas, limite)``.
+
+        The ordering columns are fetched after ``campos`` to build the
+        cursor and stripped from the returned rows.
+        """
+        if not self.configurar(consultas[0], request, view):
+            return None
+        n = len(campos)
+        columnas = [*campos, *(o.campo for o in self.ordering)]
+        filas = obtener(
+            *(self.aplicar(consulta) for consulta in consultas), columnas, self.page_size + 1
+        )
+        return [fila[:n] for fila in self.cortar(list(filas), lambda fila: list(fila[n:]))]
+
+    def enlaces(self):
+        return {"next": self.get_next_link(), "previous": self.get_previous_link()}
+
+    def encode_cursor(self, posicion, atras=False):
+        datos = json.dumps(
+            {"o": [o.campo for o in self.ordering], "p": posicion, "r": atras},
+            cls=JSONEncoder, separators=(",", ":"),
+        )
+        cursor = base64.urlsafe_b64encode(datos.encode()).decode().rstrip("=")
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        codificado = request.query_params.get(self.cursor_query_param)
+        if codificado is None:
+            return None
+        try:
+            datos = json.loads(base64.urlsafe_b64decode(codificado + "=" * (-len(codificado) % 4)))
+            valido = (
+                datos["o"] == [o.campo for o in self.ordering]
+                and isinstance(datos["p"], list)
+                and len(datos["p"]) == len(self.ordering)
+                and isinstance(datos["r"], bool)
+            )
+            if valido:
+                # El cursor viene del cliente: cada valor se convierte al tipo de su columna.
+                columnas = [list(_campos(self.model, o.campo))[-1] for o in self.ordering]
+                datos["p"] = [
+                    None if valor is None else columna.to_python(valor)
+                    for columna, valor in zip(columnas, datos["p"])
+                ]
+        except (TypeError, ValueError, KeyError, ValidationError):
+            valido = False
+        if not valido:
+            raise NotFound(self.invalid_cursor_message)
+        return datos
+
+    def get_next_link(self):
+        return None if self.siguiente is None else self.encode_cursor(self.siguiente)
+
+    def get_previous_link(self):
+        return None if self.anterior is None else self.encode_cursor(self.anterior, atras=True)
@@ -0,0 +1,240 @@
+"""Opt-in CPU or memory profile of a single request, for staff users.
+
+A request carrying ``X-Perfil: 1`` or ``?_perfil=1`` from a staff user
+(panel session or JWT) runs under ``cProfile``; with the value
+``memoria`` it runs under ``tracemalloc`` instead (see ``memoria``) and
+the response also carries ``X-Memoria-Pico``. The result is written to
+``TRANSPORTE_PERFILES_DIR`` as a JSON file with the route, method, query
+parameters, user, status and duration (plus the ``.prof`` stats for CPU
+profiles), and the response names it in its ``X-Perfil`` header. Staff
+list, inspect and download the stored profiles at ``/admin/perfiles/``;
+only the newest ``TRANSPORTE_PERFILES_MAX`` are kept.
+
+``TRANSPORTE_MEMORIA_MUESTREO`` is the fraction of the other requests
+whose peak memory is measured for the ``http_memoria_pico_bytes``
+metric. With the default 0, a request that asks for nothing only pays a
+header and a query string lookup.
+"""
+import cProfile
+import io
+import json
+import pstats
+import random
+import re
+import time
+import uuid
+from pathlib import Path
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib import admin
+from django.http import FileResponse, Http404
+from django.shortcuts import render
+from rest_framework.exceptions import AuthenticationFailed
+
+from . import memoria
+from .authentication import CachedJWTAuthentication
+from .metricas import nombre_ruta, registrar_memoria
+
+CABECERA = "HTTP_X_PERFIL"
+PARAMETRO = "_perfil"
+NOMBRE_VALIDO = re.compile(r"^[\w.-]+$")
+
+
+def solicitado(request):
+    """Return "cpu", "memoria" or None for the profile the request asks for."""
+    valor = request.META.get(CABECERA)
+    if valor is None:
+        if f"{PARAMETRO}=" not in request.META.get("QUERY_STRING", ""):
+            return None
+        valor = request.GET.get(PARAMETRO)
+    if not valor:
+        return None
+    return "memoria" if valor == "memoria" else "cpu"
+
+
+def es_staff(request):
+    usuario = getattr(request, "user", None)
+    if usuario is not None and usuario.is_authenticated:
+        return usuario.is_staff
+    # El API autentica con JWT dentro de DRF; aquí se verifica solo si se pidió perfil.
+    try:
+        autenticado = CachedJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return autenticado is not None and autenticado[0].is_staff
+
+
+def directorio():
+    ruta = Path(settings.TRANSPORTE_PERFILES_DIR)
+    ruta.mkdir(parents=True, exist_ok=True)
+    return ruta
+
+
+def guardar(request, response, duracion, perfil=None, memoria=None):
+    """Write the CPU stats or the memory report with its metadata; return the name."""
+    ruta = nombre_ruta(request)
+    segura = re.sub(r"[^\w.-]", "_", ruta)
+    nombre = f"{time.strftime('%Y%m%d-%H%M%S')}-{segura}-{uuid.uuid4().hex[:6]}"
+    carpeta = directorio()
+    if perfil is not None:
+        perfil.dump_stats(carpeta / f"{nombre}.prof")
+    usuario = getattr(request, "user", None)
+    metadatos = {
+        "nombre": nombre,
+        "tipo": "cpu" if perfil is not None else "memoria",
+        "ruta": ruta,
+        "metodo": request.method,
+        "path": request.path,
+        "parametros": {
+            clave: valores for clave, valores in request.GET.lists() if clave != PARAMETRO
+        },
+        "usuario": usuario.get_username() if usuario and usuario.is_authenticated else None,
+        "estado": response.status_code,
+        "duracion_ms": round(duracion * 1000, 1),
+        "instante": time.time(),
+        "memoria": memoria,
+    }
+    (carpeta / f"{nombre}.json").write_text(json.dumps(metadatos, ensure_ascii=False))
+    podar(carpeta)
+    return nombre
+
+
+def podar(carpeta, maximo=None):
+    """Delete all but the newest ``TRANSPORTE_PERFILES_MAX`` profiles."""
+    maximo = settings.TRANSPORTE_PERFILES_MAX if maximo is None else maximo
+    # El nombre empieza con la fecha, así que el orden alfabético es cronológico.
+    for metadatos in sorted(carpeta.glob("*.json"), reverse=True)[maximo:]:
+        metadatos.with_suffix(".prof").unlink(missing_ok=True)
+        metadatos.unlink(missing_ok=True)
+
+
+def listar():
+    perfiles = []
+    for archivo in sorted(directorio().glob("*.json"), reverse=True):
+        try:
+            perfiles.append(json.loads(archivo.read_text()))
+        except (OSError, ValueError):
+            continue
+    return perfiles
+
+
+class PerfilMiddleware:
+    """Profile the request when a staff user asks for it (see module docstring)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.muestreo = settings.TRANSPORTE_MEMORIA_MUESTREO
+        self.asincrono = iscoroutinefunction(get_response)
+        if self.asincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.asincrono:
+            return self.__acall__(request)
+        tipo = solicitado(request)
+        if tipo is not None and es_staff(request):
+            return self.perfilar(request, self.get_response, tipo)
+        if self.muestreo and random.random() < self.muestreo:
+            return self.medir_pico(request, self.get_response)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        tipo = solicitado(request)
+        if tipo is not None and await sync_to_async(es_staff)(request):
+            # cProfile mide un solo hilo: el resto de la cadena corre en el hilo
+            # sincrónico de la solicitud, donde se ejecutan las vistas síncronas.
+            return await sync_to_async(self.perfilar)(
+                request, async_to_sync(self.get_response), tipo
+            )
+        if self.muestreo and random.random() < self.muestreo:
+            return await sync_to_async(self.medir_pico)(request, async_to_sync(self.get_response))
+        return await self.get_response(request)
+
+    def perfilar(self, request, get_response, tipo):
+        if tipo == "memoria":
+            return self.perfilar_memoria(request, get_response)
+        perfil = cProfile.Profile()
+        inicio = time.perf_counter()
+        try:
+            perfil.enable()
+        except ValueError:
+            # Ya hay otro perfilador activo en este hilo.
+            return get_response(request)
+        try:
+            response = get_response(request)
+        finally:
+            perfil.disable()
+        response["X-Perfil"] = guardar(
+            request, response, time.perf_counter() - inicio, perfil=perfil
+        )
+        return response
+
+    def perfilar_memoria(self, request, get_response):
+        inicio = time.perf_counter()
+        with memoria.medir(informe=True) as medicion:
+            response = get_response(request)
+        if medicion is None:
+            # Otra medición de memoria en curso en este proceso.
+            return response
+        registrar_memoria(request, medicion["pico"])
+        response["X-Memoria-Pico"] = str(medicion["pico"])
+        response["X-Perfil"] = guardar(
+            request, response, time.perf_counter() - inicio, memoria=medicion
+        )
+        return response
+
+    def medir_pico(self, request, get_response):
+        with memoria.medir() as medicion:
+            response = get_response(request)
+        if medicion is not None:
+            registrar_memoria(request, medicion["pico"])
+        return response
+
+
+def _archivo(nombre, sufijo):
+    ruta = directorio() / f"{nombre}{sufijo}"
+    if not NOMBRE_VALIDO.match(nombre) or not ruta.exists():
+        raise Http404("Perfil no encontrado.")
+    return ruta
+
+
+def lista(request):
+    """Admin page with the stored profiles, newest first."""
+    return render(request, "admin/transporte/perfiles.html", {
+        **admin.site.each_context(request),
+        "title": "Perfiles de solicitudes",
+        "perfiles": listar(),
+    })
+
+
+def detalle(request, nombre):
+    """Top functions or allocations of one profile; the raw file with ``?descargar=1``."""
+    metadatos = _archivo(nombre, ".json")
+    perfil = json.loads(metadatos.read_text())
+    if perfil.get("tipo") == "memoria":
+        if request.GET.get("descargar"):
+            return FileResponse(metadatos.open("rb"), as_attachment=True, filename=metadatos.name)
+        return render(request, "admin/transporte/perfil_memoria.html", {
+            **admin.site.each_context(request),
+            "title": f"Perfil {nombre}",
+            "perfil": perfil,
+        })
+    ruta = _archivo(nombre, ".prof")
+    if request.GET.get("descargar"):
+        return FileResponse(ruta.open("rb"), as_attachment=True, filename=ruta.name)
+    orden = request.GET.get("orden", "cumulative")
+    if orden not in ("cumulative", "tottime", "ncalls"):
+        orden = "cumulative"
+    salida = io.StringIO()
+    pstats.Stats(str(ruta), stream=salida).strip_dirs().sort_stats(orden).print_stats(40)
+    return render(request, "admin/transporte/perfil.html", {
+        **admin.site.each_context(request),
+        "title": f"Perfil {nombre}",
+        "perfil": perfil,
+        "orden": orden,
+        "estadisticas": salida.getvalue(),
+    })
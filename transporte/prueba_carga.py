@@ -0,0 +1,376 @@
+"""Closed-loop HTTP load test for the panel and the API.
+
+``clientes`` asyncio tasks each keep one keep-alive connection and send
+the next request of the scenario mix as soon as the previous one answers.
+Latency is measured on the client per step name, so it includes queueing
+in the server. The client is a minimal HTTP/1.1 implementation on
+``asyncio`` streams to avoid an extra dependency; one event loop drives
+a few hundred connections before it becomes the bottleneck.
+
+``resumen`` reports requests, throughput, p50/p95/p99 and error rates per
+step; ``comparar`` flags the steps that got slower, handle less load or
+fail more often than in a stored baseline.
+"""
+import asyncio
+import contextlib
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from importlib.util import find_spec
+from typing import NamedTuple
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+
+
+class Paso(NamedTuple):
+    nombre: str
+    ruta: str
+    peso: int = 1
+    metodo: str = "GET"
+    # "jwt" (Bearer de /api/token/), "sesion" (login del panel) o "anonimo".
+    autenticacion: str = "jwt"
+    cuerpo: dict = None
+
+
+ESCENARIOS = {
+    "mixto": [
+        Paso("panel_despachos", "/?module=despachos", 2, autenticacion="sesion"),
+        Paso("panel_cargas", "/?module=cargas", 1, autenticacion="sesion"),
+        Paso("api_despachos", "/api/despachos/?page_size=50", 6),
+        Paso("api_despachos_columnas", "/api/despachos/?format=columnas&page_size=200", 2),
+        Paso("api_cargas", "/api/cargas/?page_size=50", 3),
+        Paso("api_vehiculos", "/api/vehiculos/", 2),
+        Paso("api_rutas", "/api/rutas/", 2),
+        Paso("kpi_despachos", "/api/kpis/despachos/", 1),
+        Paso("reporte_cargas", "/api/reportes/cargas/", 1),
+        Paso("reporte_utilizacion", "/api/reportes/utilizacion/", 1),
+    ],
+    "api": [
+        Paso("api_despachos", "/api/despachos/?page_size=50", 4),
+        Paso("api_cargas", "/api/cargas/?page_size=50", 2),
+        Paso("api_vehiculos", "/api/vehiculos/", 1),
+        Paso("api_rutas", "/api/rutas/", 1),
+    ],
+    "panel": [
+        Paso("panel_despachos", "/?module=despachos", 3, autenticacion="sesion"),
+        Paso("panel_cargas", "/?module=cargas", 1, autenticacion="sesion"),
+        Paso("panel_vehiculos", "/?module=vehiculos", 1, autenticacion="sesion"),
+    ],
+    "reportes": [
+        Paso("reporte_cargas", "/api/reportes/cargas/", 1),
+        Paso("reporte_rutas", "/api/reportes/rutas/", 1),
+        Paso("reporte_utilizacion", "/api/reportes/utilizacion/", 1),
+        Paso("kpi_despachos", "/api/kpis/despachos/", 2),
+        Paso("kpi_tiempos_estado", "/api/kpis/tiempos-estado/", 1),
+    ],
+}
+
+# Respuestas del throttling y del control de descarga: se cuentan aparte.
+ESTADOS_LIMITE = (429, 503)
+
+
+def cargar_escenario(nombre):
+    """Return a built-in scenario or read one from a JSON list of ``Paso`` fields."""
+    if nombre in ESCENARIOS:
+        return ESCENARIOS[nombre]
+    with open(nombre, encoding="utf-8") as archivo:
+        return [Paso(**paso) for paso in json.load(archivo)]
+
+
+class Respuesta(NamedTuple):
+    estado: int
+    cabeceras: list
+    cuerpo: bytes
+
+    def cabecera(self, nombre):
+        return next((valor for clave, valor in self.cabeceras if clave == nombre), None)
+
+    def cookies(self):
+        return dict(
+            valor.split(";", 1)[0].split("=", 1)
+            for clave, valor in self.cabeceras
+            if clave == "set-cookie"
+        )
+
+
+class Conexion:
+    """One HTTP/1.1 keep-alive connection; reconnects when the server closes it."""
+
+    def __init__(self, host, puerto, tiempo_limite=30.0):
+        self.host = host
+        self.puerto = puerto
+        self.tiempo_limite = tiempo_limite
+        self._lector = self._escritor = None
+
+    def cerrar(self):
+        if self._escritor is not None:
+            self._escritor.close()
+        self._lector = self._escritor = None
+
+    async def solicitar(self, metodo, ruta, cabeceras=None, cuerpo=b""):
+        reutilizada = self._escritor is not None
+        try:
+            return await asyncio.wait_for(
+                self._intercambio(metodo, ruta, cabeceras or {}, cuerpo), self.tiempo_limite
+            )
+        except (ConnectionError, asyncio.IncompleteReadError):
+            self.cerrar()
+            if not reutilizada:
+                raise
+        # El servidor cerró la conexión inactiva: un reintento en una nueva.
+        return await asyncio.wait_for(
+            self._intercambio(metodo, ruta, cabeceras or {}, cuerpo), self.tiempo_limite
+        )
+
+    async def _intercambio(self, metodo, ruta, cabeceras, cuerpo):
+        if self._escritor is None:
+            self._lector, self._escritor = await asyncio.open_connection(self.host, self.puerto)
+        lineas = [
+            f"{metodo} {ruta} HTTP/1.1",
+            f"Host: {self.host}:{self.puerto}",
+            f"Content-Length: {len(cuerpo)}",
+            *(f"{clave}: {valor}" for clave, valor in cabeceras.items()),
+        ]
+        self._escritor.write(("\r\n".join(lineas) + "\r\n\r\n").encode("latin-1") + cuerpo)
+        await self._escritor.drain()
+
+        linea = await self._lector.readline()
+        if not linea:
+            raise ConnectionResetError("El servidor cerró la conexión.")
+        version, estado = linea.split()[:2]
+        estado = int(estado)
+        recibidas = []
+        while (linea := await self._lector.readline()) not in (b"\r\n", b"\n", b""):
+            clave, _, valor = linea.decode("latin-1").partition(":")
+            recibidas.append((clave.strip().lower(), valor.strip()))
+        respuesta = Respuesta(estado, recibidas, b"")
+        cierre = (
+            version == b"HTTP/1.0"
+            or (respuesta.cabecera("connection") or "").lower() == "close"
+        )
+        if metodo == "HEAD" or estado in (204, 304) or 100 <= estado < 200:
+            contenido = b""
+        elif (respuesta.cabecera("transfer-encoding") or "").lower() == "chunked":
+            contenido = await self._leer_fragmentos()
+        elif respuesta.cabecera("content-length") is not None:
+            contenido = await self._lector.readexactly(int(respuesta.cabecera("content-length")))
+        else:
+            contenido = await self._lector.read()
+            cierre = True
+        if cierre:
+            self.cerrar()
+        return respuesta._replace(cuerpo=contenido)
+
+    async def _leer_fragmentos(self):
+        partes = []
+        while True:
+            tamano = int((await self._lector.readline()).split(b";")[0], 16)
+            if not tamano:
+                # Trailers opcionales hasta la línea vacía.
+                while (await self._lector.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(partes)
+            partes.append(await self._lector.readexactly(tamano))
+            await self._lector.readexactly(2)
+
+
+async def autenticar(host, puerto, usuario, clave, tipos):
+    """Return the request headers for each authentication type the scenario uses."""
+    cabeceras = {"anonimo": {}}
+    conexion = Conexion(host, puerto)
+    try:
+        if "jwt" in tipos:
+            respuesta = await conexion.solicitar(
+                "POST", "/api/token/", {"Content-Type": "application/json"},
+                json.dumps({"username": usuario, "password": clave}).encode(),
+            )
+            if respuesta.estado != 200:
+                raise ValueError(f"/api/token/ respondió {respuesta.estado}.")
+            cabeceras["jwt"] = {"Authorization": f"Bearer {json.loads(respuesta.cuerpo)['access']}"}
+        if "sesion" in tipos:
+            formulario = await conexion.solicitar("GET", "/login/")
+            csrf = formulario.cookies().get("csrftoken")
+            respuesta = await conexion.solicitar(
+                "POST", "/login/",
+                {
+                    "Content-Type": "application/x-www-form-urlencoded",
+                    "Cookie": f"csrftoken={csrf}",
+                },
+                urlencode({
+                    "username": usuario, "password": clave, "csrfmiddlewaretoken": csrf,
+                }).encode(),
+            )
+            sesion = respuesta.cookies().get("sessionid")
+            if respuesta.estado != 302 or not sesion:
+                raise ValueError(f"/login/ respondió {respuesta.estado} sin iniciar sesión.")
+            cabeceras["sesion"] = {"Cookie": f"csrftoken={csrf}; sessionid={sesion}"}
+    finally:
+        conexion.cerrar()
+    return cabeceras
+
+
+async def ejecutar(url, pasos, clientes, duracion, calentamiento=0.0, usuario=None,
+                   clave=None, semilla=0, tiempo_limite=30.0):
+    """Run the scenario and return ``{nombre: ([latencias], Counter(estados))}``."""
+    partes = urlsplit(url)
+    host, puerto = partes.hostname, partes.port or 80
+    cabeceras = await autenticar(
+        host, puerto, usuario, clave, {paso.autenticacion for paso in pasos}
+    )
+    pesos = [paso.peso for paso in pasos]
+    resultados = defaultdict(lambda: ([], Counter()))
+    inicio_medicion = time.perf_counter() + calentamiento
+    fin = inicio_medicion + duracion
+
+    async def cliente(numero):
+        azar = random.Random(semilla + numero)
+        conexion = Conexion(host, puerto, tiempo_limite)
+        try:
+            while time.perf_counter() < fin:
+                paso = azar.choices(pasos, pesos)[0]
+                cuerpo = b""
+                extra = dict(cabeceras[paso.autenticacion])
+                if paso.cuerpo is not None:
+                    cuerpo = json.dumps(paso.cuerpo).encode()
+                    extra["Content-Type"] = "application/json"
+                inicio = time.perf_counter()
+                try:
+                    estado = (await conexion.solicitar(paso.metodo, paso.ruta, extra, cuerpo)).estado
+                except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+                    # 0 = sin respuesta (conexión rechazada, cortada o tiempo agotado).
+                    estado = 0
+                    conexion.cerrar()
+                if inicio >= inicio_medicion:
+                    latencias, estados = resultados[paso.nombre]
+                    latencias.append(time.perf_counter() - inicio)
+                    estados[estado] += 1
+        finally:
+            conexion.cerrar()
+
+    await asyncio.gather(*(cliente(numero) for numero in range(clientes)))
+    return dict(resultados)
+
+
+def _estadisticas(latencias, estados, duracion):
+    total = sum(estados.values())
+    limitadas = sum(estados[estado] for estado in ESTADOS_LIMITE)
+    errores = sum(
+        cantidad for estado, cantidad in estados.items()
+        if (estado == 0 or estado >= 400) and estado not in ESTADOS_LIMITE
+    )
+    if len(latencias) > 1:
+        cortes = statistics.quantiles(latencias, n=100, method="inclusive")
+        p50, p95, p99 = cortes[49], cortes[94], cortes[98]
+    else:
+        p50 = p95 = p99 = latencias[0] if latencias else 0.0
+    return {
+        "solicitudes": total,
+        "rps": round(total / duracion, 1),
+        "p50_ms": round(p50 * 1000, 1),
+        "p95_ms": round(p95 * 1000, 1),
+        "p99_ms": round(p99 * 1000, 1),
+        "tasa_error": round(errores / total, 4) if total else 0.0,
+        "tasa_limitadas": round(limitadas / total, 4) if total else 0.0,
+        "estados": {str(estado): cantidad for estado, cantidad in sorted(estados.items())},
+    }
+
+
+def resumen(resultados, duracion):
+    """Per-step and overall statistics of an ``ejecutar`` run."""
+    todas, todos = [], Counter()
+    pasos = {}
+    for nombre, (latencias, estados) in sorted(resultados.items()):
+        pasos[nombre] = _estadisticas(latencias, estados, duracion)
+        todas.extend(latencias)
+        todos.update(estados)
+    return {"pasos": pasos, "total": _estadisticas(todas, todos, duracion)}
+
+
+def comparar(actual, base, tolerancia=0.2, margen_ms=2.0):
+    """Return a message per regression of ``actual`` against the ``base`` summary.
+
+    Latency regresses when p95 grows more than ``tolerancia`` and more than
+    ``margen_ms`` (sub-millisecond noise is ignored); throughput when it
+    drops more than ``tolerancia``; errors when the rate grows over one point.
+    """
+    regresiones = []
+    comunes = {"total": (actual["total"], base["total"])}
+    for nombre, datos in actual["pasos"].items():
+        if nombre in base.get("pasos", {}):
+            comunes[nombre] = (datos, base["pasos"][nombre])
+    for nombre, (ahora, antes) in comunes.items():
+        if (
+            ahora["p95_ms"] > antes["p95_ms"] * (1 + tolerancia)
+            and ahora["p95_ms"] - antes["p95_ms"] > margen_ms
+        ):
+            regresiones.append(f"{nombre}: p95 {antes['p95_ms']} -> {ahora['p95_ms']} ms")
+        if ahora["rps"] < antes["rps"] * (1 - tolerancia):
+            regresiones.append(f"{nombre}: rps {antes['rps']} -> {ahora['rps']}")
+        if ahora["tasa_error"] > antes["tasa_error"] + 0.01:
+            regresiones.append(
+                f"{nombre}: errores {antes['tasa_error']:.1%} -> {ahora['tasa_error']:.1%}"
+            )
+    return regresiones
+
+
+def _puerto_libre():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _comando_servidor(tipo, puerto, workers):
+    if tipo == "wsgi":
+        # Servidor WSGI con hilos de Django; un solo proceso.
+        return [
+            sys.executable, "manage.py", "runserver", f"127.0.0.1:{puerto}",
+            "--noreload", "--skip-checks",
+        ]
+    if find_spec("uvicorn") is None:
+        raise RuntimeError("uvicorn no está instalado; no se puede levantar el servidor ASGI.")
+    return [
+        sys.executable, "-m", "uvicorn", "logistica.asgi:application",
+        "--host", "127.0.0.1", "--port", str(puerto), "--workers", str(workers),
+        "--no-access-log", "--log-level", "warning",
+    ]
+
+
+@contextlib.contextmanager
+def servidor_local(tipo, workers=1, espera=30.0):
+    """Start the app under ``tipo`` ("wsgi" or "asgi") and yield its base URL."""
+    puerto = _puerto_libre()
+    proceso = subprocess.Popen(
+        _comando_servidor(tipo, puerto, workers),
+        cwd=settings.BASE_DIR,
+        env={**os.environ, "PYTHONUNBUFFERED": "1"},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    try:
+        limite = time.monotonic() + espera
+        while True:
+            if proceso.poll() is not None:
+                raise RuntimeError(
+                    f"El servidor {tipo} terminó al iniciar:\n{proceso.stderr.read().decode()}"
+                )
+            try:
+                socket.create_connection(("127.0.0.1", puerto), timeout=0.5).close()
+                break
+            except OSError:
+                if time.monotonic() > limite:
+                    raise RuntimeError(f"El servidor {tipo} no respondió en {espera:.0f} s.")
+                time.sleep(0.1)
+        yield f"http://127.0.0.1:{puerto}"
+    finally:
+        proceso.terminate()
+        try:
+            proceso.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proceso.kill()
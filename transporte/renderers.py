@@ -0,0 +1,60 @@
+"""JSON renderer backed by ``orjson``, byte-compatible with DRF's ``JSONRenderer``.
+
+``orjson`` writes bytes directly and handles ``date`` natively. Datetimes,
+times and anything it doesn't know (``Decimal``, lazy strings, ...) go
+through DRF's own encoder, so the output matches the stdlib renderer.
+Indented output and installs without ``orjson`` use the stdlib path.
+One difference remains: NaN and infinite floats are written as ``null``
+instead of raising, as ``STRICT_JSON`` would.
+"""
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import columnar
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependencia opcional
+    orjson = None
+
+if orjson is not None:
+    # DRF recorta los datetimes a milisegundos y usa "Z"; se delega a su encoder.
+    OPCIONES = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+    _convertir = JSONEncoder().default
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if orjson is None or indent is not None or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_convertir, option=OPCIONES)
+        except TypeError:
+            # Enteros de más de 64 bits u otros tipos que orjson no admite.
+            return super().render(data, accepted_media_type, renderer_context)
+        # Igual que DRF: JSON que además es un subconjunto estricto de JavaScript.
+        if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        return ret
+
+
+class ColumnarJSONRenderer(ORJSONRenderer):
+    """Same JSON encoding; list views answer with the layout of ``columnar.tabla``."""
+
+    media_type = "application/vnd.logistica.columnas+json"
+    format = "columnas"
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return columnar.empaquetar(data)
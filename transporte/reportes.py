@@ -0,0 +1,38 @@
+from django.db.models import Sum
+
+from .models import Carga, DespachoDiario, Ruta
+
+
+def reporte_cargas():
+    """Total weight of cargas per cliente, heaviest first."""
+    return (
+        Carga.objects
+        .values("cliente__nombre")
+        .annotate(total_peso=Sum("peso_kg"))
+        .order_by("-total_peso")
+    )
+
+
+def reporte_rutas():
+    """Number of despachos per ruta, busiest first.
+
+    Read from the daily rollups so archived despachos are still counted.
+    Grouping is on the integer ``ruta_id``; names are attached afterwards.
+    """
+    totales = (
+        DespachoDiario.objects
+        .values("ruta_id")
+        .annotate(total_despachos=Sum("total"))
+        .filter(total_despachos__gt=0)
+        .order_by("-total_despachos")
+    )
+    rutas = Ruta.objects.in_bulk([fila["ruta_id"] for fila in totales])
+    return [
+        {
+            "ruta__codigo": rutas[fila["ruta_id"]].codigo,
+            "ruta__origen": rutas[fila["ruta_id"]].origen.nombre,
+            "ruta__destino": rutas[fila["ruta_id"]].destino.nombre,
+            "total_despachos": fila["total_despachos"],
+        }
+        for fila in totales
+    ]
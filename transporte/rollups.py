@@ -0,0 +1,77 @@
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.dispatch import receiver
+
+from .models import Despacho, DespachoArchivado, DespachoDiario
+from .signals import despacho_cambiado, despachos_cambiados
+
+
+def _clave(snapshot):
+    return (snapshot.fecha, snapshot.ruta_id, snapshot.estado)
+
+
+def incrementar(modelo, claves, **incrementos):
+    """Add ``incrementos`` to the counter row identified by ``claves`` (upsert)."""
+    filas = modelo.objects.filter(**claves)
+    if filas.update(**{campo: F(campo) + valor for campo, valor in incrementos.items()}):
+        return
+    try:
+        with transaction.atomic():
+            modelo.objects.create(**claves, **incrementos)
+    except IntegrityError:
+        # Otro proceso creó la fila entre el UPDATE y el INSERT.
+        filas.update(**{campo: F(campo) + valor for campo, valor in incrementos.items()})
+
+
+def sumar(fecha, ruta_id, estado, delta):
+    incrementar(
+        DespachoDiario, {"fecha": fecha, "ruta_id": ruta_id, "estado": estado}, total=delta
+    )
+
+
+@receiver(despacho_cambiado)
+def actualizar_rollup(sender, antes, despues, **kwargs):
+    """Move one despacho between daily buckets when fecha, ruta or estado change."""
+    if antes is not None and despues is not None and _clave(antes) == _clave(despues):
+        return
+    if antes is not None:
+        sumar(*_clave(antes), -1)
+    if despues is not None:
+        sumar(*_clave(despues), 1)
+
+
+@receiver(despachos_cambiados)
+def actualizar_rollup_lote(sender, cambios, **kwargs):
+    """Net the moves of a bulk write so each bucket is upserted once."""
+    deltas = Counter()
+    for antes, despues in cambios:
+        if antes is not None:
+            deltas[_clave(antes)] -= 1
+        if despues is not None:
+            deltas[_clave(despues)] += 1
+    for clave, delta in deltas.items():
+        if delta:
+            sumar(*clave, delta)
+
+
+def reconstruir():
+    """Rebuild every rollup row from the hot and the archived despachos."""
+    activos, archivados = (
+        modelo.objects.order_by().values("fecha", "ruta_id", "estado").annotate(total=Count("id"))
+        for modelo in (Despacho, DespachoArchivado)
+    )
+    # Como archivo.combinar: un solo UNION ALL; cada tabla ya llega agrupada.
+    totales = Counter()
+    for fila in activos.union(archivados, all=True).iterator():
+        totales[fila["fecha"], fila["ruta_id"], fila["estado"]] += fila["total"]
+    with transaction.atomic():
+        DespachoDiario.objects.all().delete()
+        DespachoDiario.objects.bulk_create(
+            (
+                DespachoDiario(fecha=fecha, ruta_id=ruta_id, estado=estado, total=total)
+                for (fecha, ruta_id, estado), total in totales.items()
+            ),
+            batch_size=1000,
+        )
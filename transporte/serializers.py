@@ -1,4 +1,8 @@
+from datetime import timedelta
+
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
 from .models import (
     Aeronave,
@@ -8,38 +12,42 @@ from .models import (
     Despacho,
     Piloto,
     Ruta,
+    Trabajo,
+    Ubicacion,
     Vehiculo,
+    normalizar_clave,
 )
+from .trabajos import TAREAS
 
 
 class VehiculoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Vehiculo
-        fields = "__all__"
+        exclude = ["clave"]
 
 
 class AeronaveSerializer(serializers.ModelSerializer):
     class Meta:
         model = Aeronave
-        fields = "__all__"
+        exclude = ["clave"]
 
 
 class ConductorSerializer(serializers.ModelSerializer):
     class Meta:
         model = Conductor
-        fields = "__all__"
+        exclude = ["clave"]
 
 
 class PilotoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Piloto
-        fields = "__all__"
+        exclude = ["clave"]
 
 
 class ClienteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Cliente
-        fields = "__all__"
+        exclude = ["clave"]
 
 
 class CargaSerializer(serializers.ModelSerializer):
@@ -50,16 +58,186 @@ class CargaSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Carga
-        fields = "__all__"
+        exclude = ["clave"]
+
+
+class DespachoResumenSerializer(serializers.ModelSerializer):
+    """Despacho with its ruta and assigned resources flattened to names."""
+
+    ruta = serializers.CharField(source="ruta.codigo")
+    origen = serializers.CharField(source="ruta.origen.nombre")
+    destino = serializers.CharField(source="ruta.destino.nombre")
+    tipo_transporte = serializers.CharField(source="ruta.tipo_transporte")
+    vehiculo = serializers.CharField(source="vehiculo.patente", default=None)
+    aeronave = serializers.CharField(source="aeronave.matricula", default=None)
+    conductor = serializers.CharField(source="conductor.nombre", default=None)
+    piloto = serializers.CharField(source="piloto.nombre", default=None)
+
+    class Meta:
+        model = Despacho
+        fields = [
+            "id", "codigo", "fecha", "estado", "ruta", "origen", "destino",
+            "tipo_transporte", "vehiculo", "aeronave", "conductor", "piloto",
+        ]
+
+
+class CargaHistorialSerializer(serializers.ModelSerializer):
+    """Carga without its cliente, with one page of its despachos."""
+
+    despachos_total = serializers.IntegerField()
+    despachos = DespachoResumenSerializer(source="despachos_historial", many=True)
+
+    class Meta:
+        model = Carga
+        exclude = ["clave", "cliente"]
+
+
+class RangoFechasSerializer(serializers.Serializer):
+    """Optional ``desde``/``hasta`` dates, checked to be in order.
+
+    With ``rango_por_defecto`` set, a missing ``hasta`` is today and a
+    missing ``desde`` is that long before ``hasta``.
+    """
+
+    desde = serializers.DateField(required=False)
+    hasta = serializers.DateField(required=False)
+    rango_por_defecto = None
+
+    def validate(self, attrs):
+        desde, hasta = attrs.get("desde"), attrs.get("hasta")
+        if desde and hasta and desde > hasta:
+            raise serializers.ValidationError("'desde' no puede ser posterior a 'hasta'.")
+        if self.rango_por_defecto is not None:
+            attrs.setdefault("hasta", timezone.localdate())
+            attrs.setdefault("desde", attrs["hasta"] - self.rango_por_defecto)
+        return attrs
+
+
+class HistorialClienteParametrosSerializer(RangoFechasSerializer):
+    estado = serializers.ChoiceField(choices=Despacho.Estado.choices, required=False)
+    pagina = serializers.IntegerField(min_value=1, default=1)
+    por_pagina = serializers.IntegerField(min_value=1, max_value=100, default=20)
+    despachos_por_carga = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+
+class UbicacionField(serializers.SlugRelatedField):
+    """Read and write a ruta endpoint as its name.
+
+    Unknown names validate to an unsaved ``Ubicacion``; ``RutaSerializer``
+    interns them when it saves.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(slug_field="nombre", queryset=Ubicacion.objects.all(), **kwargs)
+
+    def to_internal_value(self, data):
+        nombre = serializers.CharField(max_length=100).run_validation(data)
+        if not normalizar_clave(nombre):
+            raise serializers.ValidationError("Ingresa un nombre con letras o números.")
+        return Ubicacion.buscar(nombre)
 
 
 class RutaSerializer(serializers.ModelSerializer):
+    origen = UbicacionField()
+    destino = UbicacionField()
+
     class Meta:
         model = Ruta
-        fields = "__all__"
+        exclude = ["clave"]
+
+    def save(self, **kwargs):
+        for campo in ("origen", "destino"):
+            if campo in self.validated_data:
+                self.validated_data[campo] = Ubicacion.interna(self.validated_data[campo])
+        return super().save(**kwargs)
 
 
 class DespachoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Despacho
         fields = "__all__"
+
+
+class TransicionDespachosSerializer(serializers.Serializer):
+    """Target ``estado`` plus either an ``ids`` list or a ``filtro`` (``DespachoFilter`` fields)."""
+
+    estado = serializers.ChoiceField(choices=sorted(Despacho.TRANSICIONES))
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        max_length=Despacho.TRANSICION_MAXIMA,
+    )
+    filtro = serializers.DictField(child=serializers.CharField(), required=False)
+
+    def validate(self, attrs):
+        if ("ids" in attrs) == ("filtro" in attrs):
+            raise serializers.ValidationError("Indica 'ids' o 'filtro' (solo uno de los dos).")
+        return attrs
+
+
+class KpiDespachosParametrosSerializer(RangoFechasSerializer):
+    rango_por_defecto = timedelta(days=30)
+    periodo = serializers.ChoiceField(choices=["dia", "semana", "mes"], default="dia")
+    dimension = serializers.ChoiceField(
+        choices=["estado", "tipo_transporte", "ruta"], required=False
+    )
+
+
+class UtilizacionParametrosSerializer(RangoFechasSerializer):
+    rango_por_defecto = timedelta(days=30)
+    periodo = serializers.ChoiceField(choices=["dia", "semana", "mes"], required=False)
+    include_archived = serializers.BooleanField(default=False)
+
+
+class TripulacionParametrosSerializer(RangoFechasSerializer):
+    rango_por_defecto = timedelta(days=365)
+    include_archived = serializers.BooleanField(default=False)
+    limite_7d = serializers.IntegerField(min_value=1, required=False)
+
+
+class ExportarDespachosParametrosSerializer(RangoFechasSerializer):
+    estado = serializers.ChoiceField(choices=Despacho.Estado.choices, required=False)
+    include_archived = serializers.BooleanField(default=False)
+
+
+class TrabajoSerializer(serializers.ModelSerializer):
+    """A background job; ``parametros`` is validated against its ``tipo``."""
+
+    tipo = serializers.ChoiceField(choices=sorted(TAREAS))
+    duracion_cola_ms = serializers.IntegerField(read_only=True)
+    parametros_por_tipo = {
+        "reporte_utilizacion": UtilizacionParametrosSerializer,
+        "reporte_tripulacion": TripulacionParametrosSerializer,
+        "exportar_despachos": ExportarDespachosParametrosSerializer,
+    }
+
+    class Meta:
+        model = Trabajo
+        fields = [
+            "id", "tipo", "parametros", "estado", "progreso", "intentos",
+            "max_intentos", "error", "creado", "iniciado", "finalizado",
+            "duracion_cola_ms", "duracion_ejecucion_ms",
+        ]
+        read_only_fields = [
+            "estado", "progreso", "intentos", "max_intentos", "error", "creado",
+            "iniciado", "finalizado", "duracion_ejecucion_ms",
+        ]
+
+    def validate(self, attrs):
+        clase = self.parametros_por_tipo.get(attrs["tipo"], serializers.Serializer)
+        parametros = clase(data=attrs.get("parametros", {}))
+        if not parametros.is_valid():
+            raise serializers.ValidationError({"parametros": parametros.errors})
+        attrs["parametros"] = dict(parametros.data)
+        return attrs
+
+
+class TokenConPermisosSerializer(TokenObtainPairSerializer):
+    """Add the flags read by the permission classes as signed claims."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token["is_staff"] = user.is_staff
+        token["is_active"] = user.is_active
+        return token
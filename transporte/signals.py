@@ -0,0 +1,73 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from .models import Despacho, EstadoDespacho
+
+# Se emite una vez por cada Despacho creado, modificado o eliminado.
+# Argumentos: ``antes`` y ``despues`` (EstadoDespacho o None).
+despacho_cambiado = Signal()
+
+# Variante por lotes de ``despacho_cambiado`` para las escrituras masivas de
+# DespachoQuerySet. Argumento: ``cambios``, lista de pares (antes, despues).
+despachos_cambiados = Signal()
+
+# Se emite tras un QuerySet.update() masivo (sender = modelo actualizado).
+filas_actualizadas = Signal()
+
+_silenciado = ContextVar("despacho_cambiado_silenciado", default=False)
+
+
+@contextmanager
+def sin_notificaciones():
+    """Move or delete despachos without touching rollups, history or events."""
+    token = _silenciado.set(True)
+    try:
+        yield
+    finally:
+        _silenciado.reset(token)
+
+
+def notificar(antes, despues):
+    """Send ``despacho_cambiado`` unless notifications are suspended."""
+    if not _silenciado.get():
+        despacho_cambiado.send(sender=Despacho, antes=antes, despues=despues)
+
+
+def notificar_lote(cambios):
+    """Send ``despachos_cambiados`` once for many changes unless suspended."""
+    if cambios and not _silenciado.get():
+        despachos_cambiados.send(sender=Despacho, cambios=cambios)
+
+
+@receiver(pre_save, sender=Despacho)
+def capturar_estado_previo(sender, instance, **kwargs):
+    """Remember the stored state of a Despacho before it is overwritten."""
+    if instance.pk is None:
+        instance._snapshot = None
+        return
+    snapshot = getattr(instance, "_snapshot", None)
+    if snapshot is None:
+        stored = (
+            Despacho._base_manager.filter(pk=instance.pk)
+            .values_list("id", *Despacho.SNAPSHOT_FIELDS)
+            .first()
+        )
+        snapshot = EstadoDespacho(*stored) if stored else None
+    instance._snapshot = snapshot
+
+
+@receiver(post_save, sender=Despacho)
+def notificar_guardado(sender, instance, created, **kwargs):
+    antes = None if created else instance._snapshot
+    despues = instance.snapshot()
+    instance._snapshot = despues
+    if antes != despues:
+        notificar(antes, despues)
+
+
+@receiver(post_delete, sender=Despacho)
+def notificar_eliminado(sender, instance, **kwargs):
+    notificar(getattr(instance, "_snapshot", None) or instance.snapshot(), None)
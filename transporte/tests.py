@@ -1,3 +1,1753 @@
-from django.test import TestCase
+import asyncio
+import base64
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import uuid
+from collections import Counter
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+from time import sleep
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from . import (
+    archivo,
+    authentication,
+    columnar,
+    fragmentos,
+    memoria,
+    paginacion,
+    perfiles,
+    prueba_carga,
+    reportes,
+    rollups,
+    trabajos,
+    transiciones,
+    tripulacion,
+    utilizacion,
+)
+from .cache import estadisticas, opciones_modelo, version_modelo
+from .eventos import HubEventos, MemoriaBackend, SQLiteBackend, obtener_hub
+from .filters import DespachoFilter, RutaFilter
+from .forms import DespachoForm, RutaForm
+from .metricas import exportar, obtener_almacen, registro
+from .models import (
+    Aeronave,
+    Carga,
+    Cliente,
+    Conductor,
+    ConflictoVersion,
+    Despacho,
+    DespachoArchivado,
+    DespachoDiario,
+    Ruta,
+    TiempoEstadoRuta,
+    Trabajo,
+    TransicionDespacho,
+    Ubicacion,
+    Vehiculo,
+)
+from .parsers import ORJSONParser
+from .renderers import ORJSONRenderer
+from .throttling import BaldeThrottle, cola, latencias, obtener_baldes
+from .views import VehiculoViewSet
+
+
+class ORJSONRendererCompatibilidadTests(SimpleTestCase):
+    """The orjson renderer must produce the same bytes as DRF's JSONRenderer."""
+
+    def assertIgual(self, data, accepted_media_type=None, renderer_context=None):
+        esperado = JSONRenderer().render(data, accepted_media_type, renderer_context)
+        obtenido = ORJSONRenderer().render(data, accepted_media_type, renderer_context)
+        self.assertEqual(obtenido, esperado)
+
+    def test_tipos_basicos(self):
+        self.assertIgual({"a": 1, "b": 2.5, "c": None, "d": True, "e": [1, "x", {}]})
+
+    def test_unicode_sin_escapar(self):
+        self.assertIgual({"nombre": "Logística Ñuñoa — Año"})
+
+    def test_separadores_de_linea_escapados(self):
+        self.assertIgual({"texto": "a\u2028b\u2029c"})
+
+    def test_decimal(self):
+        self.assertIgual({"valor_estimado": Decimal("1234.50"), "peso_kg": Decimal("0.1")})
+
+    def test_fechas_y_horas(self):
+        self.assertIgual({
+            "fecha": date(2024, 2, 29),
+            "hora": time(8, 30, 15, 123456),
+            "creado": datetime(2024, 1, 1, 12, 0, 0, 987654, tzinfo=timezone.utc),
+            "sin_zona": datetime(2024, 1, 1, 12, 0),
+        })
+
+    def test_otros_tipos(self):
+        self.assertIgual({
+            "id": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+            "etiqueta": gettext_lazy("Pendiente"),
+            "tupla": (1, 2),
+            "conjunto": {3},
+        })
+
+    def test_claves_no_texto(self):
+        self.assertIgual({1: "uno", 2: "dos"})
+
+    def test_entero_grande(self):
+        self.assertIgual({"n": 2 ** 70})
+
+    def test_indentado(self):
+        self.assertIgual({"a": [1, 2]}, "application/json; indent=4")
+        self.assertIgual({"a": [1, 2]}, None, {"indent": 2})
+
+    def test_none(self):
+        self.assertIgual(None)
+
+
+class ORJSONParserCompatibilidadTests(SimpleTestCase):
+    def parsear(self, parser, contenido):
+        return parser.parse(io.BytesIO(contenido), "application/json", {})
+
+    def test_mismo_resultado(self):
+        contenido = json.dumps(
+            {"codigo": "D-1", "fecha": "2024-01-01", "peso": 10.5, "items": [1, None, "ñ"]},
+            ensure_ascii=False,
+        ).encode()
+        self.assertEqual(
+            self.parsear(ORJSONParser(), contenido), self.parsear(JSONParser(), contenido)
+        )
+
+    def test_json_invalido(self):
+        for parser in (ORJSONParser(), JSONParser()):
+            with self.assertRaises(ParseError):
+                self.parsear(parser, b"{'codigo': 1}")
+
+    def test_rechaza_nan(self):
+        for parser in (ORJSONParser(), JSONParser()):
+            with self.assertRaises(ParseError):
+                self.parsear(parser, b'{"peso": NaN}')
+
+
+class TransporteTestCase(TestCase):
+    """Database tests with the ``var/`` stores (throttle, metrics, jobs...) in a temp dir."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls._directorio = tempfile.TemporaryDirectory()
+        ruta = Path(cls._directorio.name)
+        cls._ajustes = override_settings(
+            TRANSPORTE_THROTTLE_SQLITE=ruta / "throttle.sqlite3",
+            TRANSPORTE_METRICAS_SQLITE=ruta / "metricas.sqlite3",
+            TRANSPORTE_EVENTOS_SQLITE=ruta / "eventos.sqlite3",
+            TRANSPORTE_TRABAJOS_DIR=ruta / "trabajos",
+            TRANSPORTE_PERFILES_DIR=ruta / "perfiles",
+        )
+        cls._ajustes.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._ajustes.disable()
+        cls._directorio.cleanup()
+
+    def setUp(self):
+        cache.clear()
+        for obtener in (obtener_baldes, obtener_almacen, obtener_hub):
+            obtener.cache_clear()
+        # Los baldes viven fuera de la base de pruebas: no se revierten solos.
+        obtener_baldes()._conexion().execute("DELETE FROM baldes")
+        self.usuario = get_user_model().objects.create_superuser("admin", "admin@example.com", "x")
+        self.api = APIClient()
+        self.api.force_authenticate(self.usuario)
+
+    def crear_ruta(self, codigo="R1", tipo=Ruta.TipoTransporte.TERRESTRE, **kwargs):
+        return Ruta.objects.create(
+            codigo=codigo,
+            origen=Ubicacion.interna(kwargs.pop("origen", "Santiago")),
+            destino=Ubicacion.interna(kwargs.pop("destino", "Valparaíso")),
+            tipo_transporte=tipo,
+            **kwargs,
+        )
+
+    def crear_despacho(self, codigo, fecha, ruta, **kwargs):
+        return Despacho.objects.create(codigo=codigo, fecha=fecha, ruta=ruta, **kwargs)
+
+
+class PaginacionCursorTests(TransporteTestCase):
+    def recorrer(self, url, parametros, clave="codigo"):
+        """Follow ``next`` links from the first page; return every row's ``clave``."""
+        respuesta = self.api.get(url, parametros)
+        valores = []
+        while True:
+            self.assertEqual(respuesta.status_code, 200)
+            valores += [fila[clave] for fila in respuesta.data["results"]]
+            if respuesta.data["next"] is None:
+                return valores, respuesta
+            respuesta = self.api.get(respuesta.data["next"])
+
+    def cursor(self, datos):
+        return base64.urlsafe_b64encode(json.dumps(datos).encode()).decode().rstrip("=")
+
+    def test_recorre_hacia_adelante_y_atras(self):
+        ruta = self.crear_ruta()
+        for i in range(7):
+            self.crear_despacho(f"D{i}", date(2025, 1, 1) + timedelta(days=i % 3), ruta)
+        esperado = list(Despacho.objects.order_by("-fecha", "id").values_list("codigo", flat=True))
+
+        codigos, ultima = self.recorrer("/api/despachos/", {"ordering": "-fecha", "page_size": 3})
+        self.assertEqual(codigos, esperado)
+
+        atras = []
+        respuesta = self.api.get(ultima.data["previous"])
+        while True:
+            atras = [fila["codigo"] for fila in respuesta.data["results"]] + atras
+            if respuesta.data["previous"] is None:
+                break
+            respuesta = self.api.get(respuesta.data["previous"])
+        self.assertEqual(atras, esperado[:6])
+
+    def test_ordenamiento_con_nulos(self):
+        for i, duracion in enumerate([30, None, 10, None, 30, 20]):
+            self.crear_ruta(f"R{i}", duracion_estimada_min=duracion)
+        for orden in ("duracion_estimada_min", "-duracion_estimada_min"):
+            with self.subTest(orden=orden):
+                codigos, _ = self.recorrer("/api/rutas/", {"ordering": orden, "page_size": 2})
+                self.assertEqual(len(codigos), 6)
+                self.assertEqual(len(set(codigos)), 6)
+                duraciones = [Ruta.objects.get(codigo=c).duracion_estimada_min for c in codigos]
+                # NULL cuenta como el menor valor en ambos sentidos.
+                claves = [-1 if d is None else d for d in duraciones]
+                self.assertEqual(claves, sorted(claves, reverse=orden.startswith("-")))
+
+    def test_une_tablas_activa_y_archivo(self):
+        ruta = self.crear_ruta()
+        for i in range(6):
+            self.crear_despacho(
+                f"D{i}", date(2025, 1, 1 + i), ruta, estado=Despacho.Estado.ENTREGADO
+            )
+        self.assertEqual(archivo.archivar(date(2025, 1, 4)), 3)
+
+        codigos, _ = self.recorrer(
+            "/api/despachos/", {"ordering": "fecha", "page_size": 2, "include_archived": "1"}
+        )
+        self.assertEqual(codigos, [f"D{i}" for i in range(6)])
+        codigos, _ = self.recorrer("/api/despachos/", {"ordering": "fecha", "page_size": 2})
+        self.assertEqual(codigos, ["D3", "D4", "D5"])
+
+    def test_cursor_alterado_es_404(self):
+        self.crear_despacho("D1", date(2025, 1, 1), self.crear_ruta())
+        alterados = [
+            ({}, self.cursor({"o": ["id"], "p": ["abc"], "r": False})),
+            ({}, self.cursor({"o": ["id"], "p": [[1]], "r": False})),
+            ({}, self.cursor({"o": ["id"], "p": "1", "r": False})),
+            ({}, self.cursor({"o": ["fecha", "id"], "p": [1, 1], "r": False})),
+            ({}, self.cursor({"o": ["id"], "p": [1], "r": "no"})),
+            ({}, self.cursor(["id"])),
+            ({}, "no-es-base64!"),
+            (
+                {"ordering": "fecha"},
+                self.cursor({"o": ["fecha", "id"], "p": ["2025-13-45", 1], "r": False}),
+            ),
+        ]
+        for parametros, cursor in alterados:
+            with self.subTest(cursor=cursor):
+                respuesta = self.api.get("/api/despachos/", {**parametros, "cursor": cursor})
+                self.assertEqual(respuesta.status_code, 404)
+                self.assertEqual(respuesta.data["detail"], "Cursor inválido.")
+
+
+class ArchivoTests(TransporteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.r1 = self.crear_ruta("R1")
+        self.r2 = self.crear_ruta("R2", destino="Arica")
+        entregado = Despacho.Estado.ENTREGADO
+        for i in range(4):
+            self.crear_despacho(f"A{i}", date(2025, 1, 1 + i), self.r1, estado=entregado)
+        self.crear_despacho("B0", date(2025, 1, 1), self.r2, estado=entregado)
+        self.crear_despacho("B1", date(2025, 6, 1), self.r2)
+
+    def totales(self):
+        return {fila["ruta__codigo"]: fila["total_despachos"] for fila in reportes.reporte_rutas()}
+
+    def test_archivar_y_reconstruir_conserva_totales(self):
+        self.assertEqual(archivo.archivar(date(2025, 3, 1), lote=2), 5)
+        self.assertEqual(Despacho.objects.count(), 1)
+        self.assertEqual(DespachoArchivado.objects.count(), 5)
+        self.assertEqual(self.totales(), {"R1": 4, "R2": 2})
+
+        DespachoDiario.objects.all().delete()
+        rollups.reconstruir()
+        self.assertEqual(self.totales(), {"R1": 4, "R2": 2})
+        self.assertEqual(
+            DespachoDiario.objects.get(fecha=date(2025, 1, 1), ruta=self.r1).total, 1
+        )
+
+    def test_codigo_reutilizado_queda_en_tabla_activa(self):
+        archivo.archivar(date(2025, 3, 1))
+        self.crear_despacho(
+            "A0", date(2025, 2, 1), self.r1, estado=Despacho.Estado.ENTREGADO
+        )
+        duplicados = archivo.duplicados(date(2025, 3, 1))
+        self.assertEqual(list(duplicados.values_list("codigo", flat=True)), ["A0"])
+
+        self.assertEqual(archivo.archivar(date(2025, 3, 1)), 0)
+        self.assertTrue(Despacho.objects.filter(codigo="A0").exists())
+        rollups.reconstruir()
+        self.assertEqual(self.totales(), {"R1": 5, "R2": 2})
+
+        respuesta = self.api.get("/api/despachos/", {"include_archived": "1", "search": "A0"})
+        self.assertEqual([fila["codigo"] for fila in respuesta.data["results"]], ["A0", "A0"])
+
+
+    def test_combinar_con_orden_por_expresion(self):
+        archivo.archivar(date(2025, 1, 3))
+        for orden in (["-fecha"], [F("fecha").desc()], [F("fecha").desc(nulls_last=True)]):
+            with self.subTest(orden=orden):
+                filas = archivo.combinar(
+                    Despacho.objects.order_by(*orden), DespachoArchivado.objects.all()
+                )
+                # A1 viene del archivo.
+                self.assertEqual([fila.codigo for fila in filas][:4], ["B1", "A3", "A2", "A1"])
+        with self.assertRaises(ValueError):
+            archivo.combinar(
+                Despacho.objects.order_by(F("fecha") + 1), DespachoArchivado.objects.all()
+            )
+
+
+class UtilizacionTests(TransporteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.camion = Vehiculo.objects.create(patente="AA-BB-11", marca="Volvo", capacidad_kg=1000)
+        self.avion = Aeronave.objects.create(matricula="CC-AAA", capacidad_kg=10000)
+        cliente = Cliente.objects.create(nombre="ACME", rut="1-9")
+        self.carga = Carga.objects.create(
+            cliente=cliente, descripcion="cajas", peso_kg=500, valor_estimado="10.00"
+        )
+
+    def por_id(self, filas):
+        return {fila["id"]: fila for fila in filas}
+
+    def test_capacidad_de_la_ruta_segun_tipo_de_transporte(self):
+        terrestre = self.crear_ruta("T1")
+        aerea = self.crear_ruta("A1", tipo=Ruta.TipoTransporte.AEREO, destino="Arica")
+        # Ambos despachos tienen camión y avión: la ruta decide cuál capacidad usar.
+        for codigo, ruta in (("D1", terrestre), ("D2", aerea)):
+            self.crear_despacho(
+                codigo, date(2025, 1, 1), ruta,
+                vehiculo=self.camion, aeronave=self.avion, carga=self.carga,
+            )
+        resultado = utilizacion.calcular(date(2025, 1, 1), date(2025, 1, 31))
+        rutas = self.por_id(resultado["rutas"])
+        self.assertEqual(rutas[terrestre.pk]["promedio"], 50.0)
+        self.assertEqual(rutas[aerea.pk]["promedio"], 5.0)
+        self.assertEqual(self.por_id(resultado["vehiculos"])[self.camion.pk]["despachos"], 2)
+        self.assertEqual(self.por_id(resultado["aeronaves"])[self.avion.pk]["promedio"], 5.0)
+
+    def test_percentiles_por_periodo(self):
+        ruta = self.crear_ruta()
+        for i, peso in enumerate([100, 200, 300, 400, 900]):
+            carga = Carga.objects.create(
+                cliente=self.carga.cliente, descripcion=f"c{i}", peso_kg=peso,
+                valor_estimado="1.00",
+            )
+            fecha = date(2025, 1, 6) if i < 4 else date(2025, 1, 13)
+            self.crear_despacho(f"D{i}", fecha, ruta, vehiculo=self.camion, carga=carga)
+        filas = utilizacion.calcular(date(2025, 1, 1), date(2025, 1, 31), "semana")["vehiculos"]
+        self.assertEqual(
+            [fila["periodo"] for fila in filas], [date(2025, 1, 6), date(2025, 1, 13)]
+        )
+        self.assertEqual(
+            {clave: filas[0][clave] for clave in ("despachos", "promedio", "p50", "p90")},
+            {"despachos": 4, "promedio": 25.0, "p50": 25.0, "p90": 37.0},
+        )
+        self.assertEqual(filas[1]["p95"], 90.0)
+
+    def test_endpoint_valida_rango(self):
+        respuesta = self.api.get(
+            "/api/reportes/utilizacion/", {"desde": "2025-02-01", "hasta": "2025-01-01"}
+        )
+        self.assertEqual(respuesta.status_code, 400)
+
+
+class TransicionDespachosTests(TransporteTestCase):
+    def setUp(self):
+        super().setUp()
+        ruta = self.crear_ruta()
+        self.pendientes = [
+            self.crear_despacho(f"P{i}", date(2025, 1, 1), ruta) for i in range(3)
+        ]
+        self.en_ruta = self.crear_despacho(
+            "E0", date(2025, 1, 2), ruta, estado=Despacho.Estado.EN_RUTA
+        )
+        self.entregado = self.crear_despacho(
+            "X0", date(2025, 1, 3), ruta, estado=Despacho.Estado.ENTREGADO
+        )
+        self.panel = Client()
+        self.panel.force_login(self.usuario)
+
+    def estados(self):
+        return dict(Despacho.objects.values_list("codigo", "estado"))
+
+    def test_transicionar_respeta_origenes_y_registra(self):
+        TransicionDespacho.objects.all().delete()
+        resultados = Despacho.objects.all().transicionar(Despacho.Estado.EN_RUTA)
+        self.assertEqual(
+            {pk: resultado for pk, (resultado, _) in resultados.items()},
+            {
+                **{d.pk: "actualizado" for d in self.pendientes},
+                self.en_ruta.pk: "sin_cambio",
+                self.entregado.pk: "invalido",
+            },
+        )
+        self.assertEqual(self.estados()["X0"], Despacho.Estado.ENTREGADO)
+        self.assertEqual(TransicionDespacho.objects.count(), 3)
+        diario = DespachoDiario.objects.get(
+            fecha=date(2025, 1, 1), estado=Despacho.Estado.EN_RUTA
+        )
+        self.assertEqual(diario.total, 3)
+
+    def test_api_por_ids(self):
+        ids = [self.pendientes[0].pk, self.entregado.pk, 999999]
+        respuesta = self.api.post(
+            "/api/despachos/transicion/", {"estado": "EN_RUTA", "ids": ids}, format="json"
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(
+            respuesta.data["resumen"], {"actualizado": 1, "invalido": 1, "no_encontrado": 1}
+        )
+
+    def test_api_exige_un_filtro_con_valor(self):
+        for filtro in ({}, {"q": ""}, {"desconocido": "x"}):
+            with self.subTest(filtro=filtro):
+                respuesta = self.api.post(
+                    "/api/despachos/transicion/",
+                    {"estado": "EN_RUTA", "filtro": filtro},
+                    format="json",
+                )
+                self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(self.estados()["P0"], Despacho.Estado.PENDIENTE)
+
+        respuesta = self.api.post(
+            "/api/despachos/transicion/",
+            {"estado": "ENTREGADO", "filtro": {"estado": "EN_RUTA"}},
+            format="json",
+        )
+        self.assertEqual(respuesta.data["resumen"], {"actualizado": 1})
+
+    def test_api_limita_filas_por_filtro(self):
+        with mock.patch.object(Despacho, "TRANSICION_MAXIMA", 2):
+            respuesta = self.api.post(
+                "/api/despachos/transicion/",
+                {"estado": "EN_RUTA", "filtro": {"estado": "PENDIENTE"}},
+                format="json",
+            )
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn("filtro", respuesta.data)
+        self.assertEqual(self.estados()["P0"], Despacho.Estado.PENDIENTE)
+
+    def test_panel_exige_filtro(self):
+        datos = {"module": "despachos", "action": "transicion", "estado": "EN_RUTA"}
+        respuesta = self.panel.post("/?module=despachos", datos, follow=True)
+        self.assertContains(respuesta, "Filtra el listado antes de cambiar estados")
+        self.assertEqual(self.estados()["P0"], Despacho.Estado.PENDIENTE)
+
+        self.panel.post("/?module=despachos&estado=PENDIENTE", datos)
+        self.assertEqual(self.estados()["P0"], Despacho.Estado.EN_RUTA)
+
+    def test_accion_admin_usa_transiciones(self):
+        TransicionDespacho.objects.all().delete()
+        respuesta = self.panel.post(
+            "/admin/transporte/despacho/",
+            {
+                "action": "transicionar_en_ruta",
+                "_selected_action": [self.pendientes[0].pk, self.entregado.pk],
+            },
+            follow=True,
+        )
+        self.assertContains(respuesta, "1 pasado(s) a «En ruta»")
+        self.assertEqual(self.estados()["P0"], Despacho.Estado.EN_RUTA)
+        self.assertEqual(self.estados()["X0"], Despacho.Estado.ENTREGADO)
+        self.assertEqual(TransicionDespacho.objects.count(), 1)
+
+
+class HubEventosTests(TransporteTestCase):
+    async def recibir(self, hub, cursor, cantidad):
+        """First ``cantidad`` events (keep-alive ticks skipped) after ``cursor``."""
+        eventos = []
+        suscripcion = hub.suscribir(cursor, espera=0.05)
+        async for evento in suscripcion:
+            if evento is not None:
+                eventos.append(evento)
+            if len(eventos) == cantidad:
+                break
+        await suscripcion.aclose()
+        return eventos
+
+    def publicar(self, hub, cantidad):
+        for i in range(cantidad):
+            hub.publicar({"tipo": "actualizado", "id": i})
+
+    async def test_memoria_reanuda_desde_el_cursor(self):
+        hub = HubEventos(MemoriaBackend(), capacidad=10)
+        self.publicar(hub, 3)
+        primero = (await self.recibir(hub, hub.backend.inicio, 1))[0]
+        eventos = await self.recibir(hub, primero.cursor, 2)
+        self.assertEqual([evento.datos["id"] for evento in eventos], [1, 2])
+
+    def test_memoria_publicacion_concurrente_no_pierde_eventos(self):
+        class BackendLento(MemoriaBackend):
+            def agregar(self, datos):
+                cursor = super().agregar(datos)
+                sleep(0.0001)  # deja correr a otro publicador
+                return cursor
+
+        hub = HubEventos(BackendLento(), capacidad=1000)
+        hilos = [
+            threading.Thread(target=self.publicar, args=(hub, 50)) for _ in range(8)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        eventos, perdidos = hub._pendientes(hub.backend.inicio)
+        self.assertFalse(perdidos)
+        self.assertEqual(len(eventos), 400)
+        cursores = [evento.cursor for evento in eventos]
+        self.assertEqual(cursores, list(range(hub.backend.inicio + 1, hub.ultimo_cursor + 1)))
+
+    async def test_memoria_cursor_desconocido_reinicia(self):
+        anterior = HubEventos(MemoriaBackend())
+        self.publicar(anterior, 2)
+        # Otro proceso (o el mismo tras reiniciar) no conoce esos cursores.
+        hub = HubEventos(MemoriaBackend())
+        self.publicar(hub, 1)
+        for cursor in (anterior.ultimo_cursor, hub.ultimo_cursor + 5):
+            with self.subTest(cursor=cursor):
+                self.assertFalse(hub.conoce(cursor))
+                reinicio = (await self.recibir(hub, cursor, 1))[0]
+                self.assertEqual(reinicio.datos, {"tipo": "reinicio"})
+                self.assertEqual(reinicio.cursor, hub.ultimo_cursor)
+
+    async def test_memoria_buffer_desbordado_reinicia(self):
+        hub = HubEventos(MemoriaBackend(), capacidad=2)
+        inicio = hub.ultimo_cursor
+        self.publicar(hub, 4)
+        eventos = await self.recibir(hub, inicio + 1, 3)
+        self.assertEqual(eventos[0].datos, {"tipo": "reinicio"})
+        self.assertEqual([evento.datos["id"] for evento in eventos[1:]], [2, 3])
+
+    async def test_sqlite_cursor_anterior_a_la_retencion_reinicia(self):
+        ruta = Path(self._directorio.name) / "eventos-retencion.sqlite3"
+        backend = SQLiteBackend(ruta)
+        hub = HubEventos(backend, capacidad=1, intervalo=0.01)
+        for i in range(4):
+            backend.agregar({"tipo": "actualizado", "id": i})
+        eventos = await self.recibir(HubEventos(backend, capacidad=1), 1, 3)
+        self.assertEqual([evento.datos["id"] for evento in eventos], [1, 2, 3])
+
+        backend._conexion().execute("DELETE FROM eventos WHERE id <= 2")
+        self.assertTrue(hub.conoce(2))
+        self.assertFalse(hub.conoce(1))
+        self.assertFalse(hub.conoce(99))
+        reinicio = (await self.recibir(HubEventos(backend), 1, 1))[0]
+        self.assertEqual(reinicio.datos, {"tipo": "reinicio"})
+
+
+@override_settings(TRANSPORTE_EVENTOS_BACKEND="memoria")
+class StreamDespachosTests(TransporteTestCase):
+    async def eventos_stream(self, parametros, cantidad):
+        respuesta = await self.async_client.get("/api/despachos/stream/", parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        eventos = []
+        contenido = aiter(respuesta.streaming_content)
+        while len(eventos) < cantidad:
+            trozo = await asyncio.wait_for(anext(contenido), 5)
+            trozo = trozo.decode() if isinstance(trozo, bytes) else trozo
+            if "event: despacho" in trozo:
+                eventos.append(json.loads(trozo.split("data: ", 1)[1]))
+        await contenido.aclose()
+        return eventos
+
+    async def test_filtro_estado_incluye_salidas(self):
+        await self.async_client.aforce_login(self.usuario)
+        hub = obtener_hub()
+        inicio = hub.ultimo_cursor
+        for datos in (
+            {"id": 1, "ruta": 1, "estado": "EN_RUTA", "estado_anterior": "PENDIENTE"},
+            {"id": 2, "ruta": 1, "estado": "PENDIENTE", "estado_anterior": None},
+            {"id": 1, "ruta": 1, "estado": "ENTREGADO", "estado_anterior": "EN_RUTA"},
+        ):
+            hub.publicar({"tipo": "actualizado", **datos})
+        eventos = await self.eventos_stream({"estado": "EN_RUTA", "cursor": inicio}, 2)
+        self.assertEqual(
+            [(evento["id"], evento["estado"]) for evento in eventos],
+            [(1, "EN_RUTA"), (1, "ENTREGADO")],
+        )
+
+
+class UbicacionTests(TransporteTestCase):
+    def datos_ruta(self, **kwargs):
+        return {
+            "codigo": "R9",
+            "origen": "Puerto Montt",
+            "destino": "Valparaíso",
+            "tipo_transporte": Ruta.TipoTransporte.TERRESTRE,
+            **kwargs,
+        }
+
+    def test_busqueda_de_rutas_por_subcadena(self):
+        self.crear_ruta("R1", origen="Puerto Santiago", destino="Arica")
+        self.crear_ruta("R2", origen="Arica", destino="Gran Santiago")
+        self.crear_ruta("R3", origen="Arica", destino="Iquique")
+        filtro = RutaFilter({"q": "santiago"}, queryset=Ruta.objects.all())
+        self.assertEqual(sorted(filtro.qs.values_list("codigo", flat=True)), ["R1", "R2"])
+
+    def test_formulario_no_escribe_al_validar(self):
+        self.crear_ruta("R9")
+        ubicaciones = Ubicacion.objects.count()
+        form = RutaForm(self.datos_ruta())
+        self.assertFalse(form.is_valid())
+        self.assertIn("codigo", form.errors)
+        self.assertEqual(Ubicacion.objects.count(), ubicaciones)
+
+        form = RutaForm(self.datos_ruta(codigo="R10", destino=" valparaiso "))
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(Ubicacion.objects.count(), ubicaciones)
+        ruta = form.save()
+        self.assertEqual(ruta.origen.nombre, "Puerto Montt")
+        self.assertEqual(ruta.destino, Ruta.objects.get(codigo="R9").destino)
+        self.assertEqual(Ubicacion.objects.count(), ubicaciones + 1)
+
+    def test_formulario_edicion_muestra_nombres(self):
+        ruta = self.crear_ruta()
+        form = RutaForm(instance=ruta)
+        self.assertEqual(list(form.fields)[:3], ["codigo", "origen", "destino"])
+        self.assertEqual(form["origen"].value(), "Santiago")
+        self.assertFalse(RutaForm(self.datos_ruta(origen="--"), instance=ruta).is_valid())
+
+    def test_api_ordena_por_nombre_de_ubicacion(self):
+        for codigo, origen, destino in (("R1", "Talca", "Arica"), ("R2", "Arica", "Talca")):
+            self.crear_ruta(codigo, origen=origen, destino=destino)
+        for orden, esperado in (
+            ("origen", ["R2", "R1"]),
+            ("-origen", ["R1", "R2"]),
+            ("destino", ["R1", "R2"]),
+            ("origen__nombre", ["R2", "R1"]),
+        ):
+            with self.subTest(orden=orden):
+                respuesta = self.api.get("/api/rutas/", {"ordering": orden})
+                self.assertEqual([fila["codigo"] for fila in respuesta.data["results"]], esperado)
+
+    def test_api_interna_al_guardar(self):
+        ubicaciones = Ubicacion.objects.count()
+        respuesta = self.api.post(
+            "/api/rutas/", self.datos_ruta(tipo_transporte="OTRO"), format="json"
+        )
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(Ubicacion.objects.count(), ubicaciones)
+        respuesta = self.api.post("/api/rutas/", self.datos_ruta(), format="json")
+        self.assertEqual(respuesta.status_code, 201, respuesta.data)
+        self.assertEqual(respuesta.data["origen"], "Puerto Montt")
+        self.assertEqual(Ubicacion.objects.count(), ubicaciones + 2)
+
+
+class CacheUbicacionTests(TransporteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ruta = self.crear_ruta(origen="Santiago")
+        self.crear_despacho("D1", date(2025, 1, 1), self.ruta)
+        self.panel = Client()
+        self.panel.force_login(self.usuario)
+
+    def renombrar_origen(self, nombre):
+        ubicacion = self.ruta.origen
+        ubicacion.nombre = nombre
+        ubicacion.save()
+
+    def test_guardar_ubicacion_invalida_rutas_y_despachos(self):
+        versiones = [version_modelo(m) for m in (Ubicacion, Ruta, Despacho)]
+        self.renombrar_origen("Santiago Centro")
+        for model, version in zip((Ubicacion, Ruta, Despacho), versiones):
+            with self.subTest(model=model.__name__):
+                self.assertNotEqual(version_modelo(model), version)
+
+    def test_opciones_de_ruta_muestran_el_nuevo_nombre(self):
+        self.assertIn("Santiago ->", opciones_modelo(Ruta)[0][0][1])
+        self.renombrar_origen("Santiago Centro")
+        self.assertIn("Santiago Centro ->", opciones_modelo(Ruta)[0][0][1])
+
+    def test_fragmentos_del_panel_muestran_el_nuevo_nombre(self):
+        for modulo in ("rutas", "despachos"):
+            self.assertNotContains(self.panel.get("/", {"module": modulo}), "Santiago Centro")
+        self.renombrar_origen("Santiago Centro")
+        for modulo in ("rutas", "despachos"):
+            with self.subTest(modulo=modulo):
+                self.assertContains(self.panel.get("/", {"module": modulo}), "Santiago Centro")
+
+
+class TablasGrandesTests(TransporteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cliente = Cliente.objects.create(nombre="ACME", rut="1-9")
+        self.ruta = self.crear_ruta()
+
+    def crear_vehiculos(self, cantidad, inicio=0):
+        for i in range(inicio, inicio + cantidad):
+            Vehiculo.objects.create(patente=f"AB-{i}", marca="Volvo", capacidad_kg=1000)
+
+    def test_estimado_de_sqlite_stat1(self):
+        self.crear_vehiculos(3)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        self.assertEqual(paginacion.estimar_filas(Vehiculo), 3)
+        # Tabla chica: el estimado no se usa y se cuenta exacto.
+        with self.assertNumQueries(2):
+            self.assertEqual(paginacion.contar(Vehiculo.objects.all()), 3)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE sqlite_stat1 SET stat = '50000 1' WHERE tbl = %s",
+                [Vehiculo._meta.db_table],
+            )
+        with self.assertNumQueries(1):
+            self.assertEqual(paginacion.contar(Vehiculo.objects.all()), 50000)
+        # Con filtro el estimado de la tabla no sirve.
+        self.assertEqual(paginacion.contar(Vehiculo.objects.filter(marca="Volvo")), 3)
+
+    def test_conteo_exacto_cacheado_por_version(self):
+        self.crear_vehiculos(3)
+        volvos = Vehiculo.objects.filter(marca="Volvo")
+        with self.assertNumQueries(1):
+            self.assertEqual(paginacion.contar(volvos), 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(paginacion.contar(volvos), 3)
+        self.crear_vehiculos(1, inicio=3)
+        with self.assertNumQueries(1):
+            self.assertEqual(paginacion.contar(volvos), 4)
+
+    def test_changelist_de_despachos_no_crece_con_las_filas(self):
+        panel = Client()
+        panel.force_login(self.usuario)
+
+        def consultas(cantidad):
+            inicio = Despacho.objects.count()
+            for i in range(inicio, inicio + cantidad):
+                carga = Carga.objects.create(
+                    cliente=self.cliente, descripcion="cajas", peso_kg=10, valor_estimado="1.00"
+                )
+                vehiculo = Vehiculo.objects.create(
+                    patente=f"CD-{i}", marca="Volvo", capacidad_kg=1000
+                )
+                ruta = self.crear_ruta(f"R{i + 2}", destino=f"Destino {i}")
+                self.crear_despacho(
+                    f"D{i}", date(2025, 1, 1), ruta, vehiculo=vehiculo, carga=carga
+                )
+            with CaptureQueriesContext(connection) as capturadas:
+                respuesta = panel.get("/admin/transporte/despacho/")
+            self.assertEqual(respuesta.status_code, 200)
+            return len(capturadas)
+
+        pocas = consultas(2)
+        self.assertEqual(consultas(28), pocas)
+        self.assertLessEqual(pocas, 5)
+
+
+class PoolEnProceso:
+    """Stand-in for ``ProcessPoolExecutor`` that runs jobs in this process.
+
+    The first pool created is already broken, like one whose child was killed.
+    """
+
+    creados = []
+
+    def __init__(self, max_workers, initializer):
+        self.roto = not self.creados
+        self.creados.append(self)
+
+    def submit(self, funcion, *args):
+        futuro = Future()
+        if self.roto:
+            futuro.set_exception(BrokenProcessPool("Un proceso hijo terminó abruptamente."))
+        else:
+            try:
+                futuro.set_result(funcion(*args))
+            except Exception as exc:
+                futuro.set_exception(exc)
+        return futuro
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+class ProcesarTrabajosTests(TransporteTestCase):
+    def procesar(self):
+        salida, errores = io.StringIO(), io.StringIO()
+        with mock.patch(
+            "transporte.management.commands.procesar_trabajos.ProcessPoolExecutor",
+            PoolEnProceso,
+        ):
+            call_command("procesar_trabajos", "--una-vez", stdout=salida, stderr=errores)
+        return errores.getvalue()
+
+    def test_pool_caido_devuelve_trabajos_y_se_recrea(self):
+        PoolEnProceso.creados = []
+        reintentable = trabajos.encolar("reporte_cargas")
+        agotado = trabajos.encolar("reporte_rutas")
+        Trabajo.objects.filter(pk=agotado.pk).update(max_intentos=1)
+
+        errores = self.procesar()
+
+        self.assertIn("pool de procesos se cayó", errores)
+        self.assertEqual(len(PoolEnProceso.creados), 2)
+        reintentable.refresh_from_db()
+        agotado.refresh_from_db()
+        self.assertEqual(reintentable.estado, Trabajo.Estado.PENDIENTE)
+        self.assertEqual(reintentable.intentos, 1)
+        self.assertIn("terminó inesperadamente", reintentable.error)
+        self.assertEqual(agotado.estado, Trabajo.Estado.FALLIDO)
+
+        # El pool nuevo ejecuta el reintento.
+        Trabajo.objects.filter(pk=reintentable.pk).update(
+            disponible_desde=datetime.now(timezone.utc)
+        )
+        self.procesar()
+        reintentable.refresh_from_db()
+        self.assertEqual(reintentable.estado, Trabajo.Estado.COMPLETADO)
+        self.assertEqual(reintentable.intentos, 2)
+
+    def test_error_fuera_de_ejecutar_devuelve_el_trabajo(self):
+        PoolEnProceso.creados = [None]  # el pool que se crea ahora funciona
+        trabajo = trabajos.encolar("reporte_cargas")
+        with mock.patch.object(trabajos, "ejecutar", side_effect=RuntimeError("sin conexión")):
+            self.procesar()
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, Trabajo.Estado.PENDIENTE)
+        self.assertIn("sin conexión", trabajo.error)
+
+    def test_error_al_guardar_el_resultado_se_reintenta(self):
+        trabajo = trabajos.encolar("reporte_cargas")
+        trabajos.reclamar(1)
+        with mock.patch.object(Path, "write_bytes", side_effect=OSError("disco lleno")):
+            self.assertEqual(trabajos.ejecutar(trabajo.pk), Trabajo.Estado.PENDIENTE)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.resultado, "")
+        self.assertIn("disco lleno", trabajo.error)
+
+    def test_huerfanos_sin_intentos_quedan_fallidos(self):
+        reintentable = trabajos.encolar("reporte_cargas")
+        agotado = trabajos.encolar("reporte_rutas")
+        Trabajo.objects.filter(pk=agotado.pk).update(max_intentos=1)
+        trabajos.reclamar(2)
+        self.assertEqual(trabajos.liberar_huerfanos(timedelta(minutes=-1)), 2)
+        reintentable.refresh_from_db()
+        agotado.refresh_from_db()
+        self.assertEqual(reintentable.estado, Trabajo.Estado.PENDIENTE)
+        self.assertEqual(agotado.estado, Trabajo.Estado.FALLIDO)
+        self.assertEqual(agotado.error, trabajos.ERROR_HUERFANO)
+
+    def test_devolver_ignora_trabajos_terminados(self):
+        trabajo = trabajos.encolar("reporte_cargas")
+        self.assertIsNone(trabajos.devolver(trabajo.pk, "x"))
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, Trabajo.Estado.PENDIENTE)
+        self.assertEqual(trabajo.error, "")
+
+
+class TrabajoApiTests(TransporteTestCase):
+    def test_parametros_se_validan_segun_el_tipo(self):
+        respuesta = self.api.post(
+            "/api/trabajos/",
+            {"tipo": "reporte_utilizacion", "parametros": {}, "max_intentos": 50},
+            format="json",
+        )
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(respuesta.data["max_intentos"], 3)
+        self.assertEqual(set(respuesta.data["parametros"]), {"desde", "hasta", "include_archived"})
+        trabajos.reclamar(1)
+        self.assertEqual(trabajos.ejecutar(respuesta.data["id"]), Trabajo.Estado.COMPLETADO)
+
+        for parametros in ({"desde": "ayer"}, {"desde": "2025-02-01", "hasta": "2025-01-01"}, []):
+            with self.subTest(parametros=parametros):
+                respuesta = self.api.post(
+                    "/api/trabajos/",
+                    {"tipo": "exportar_despachos", "parametros": parametros},
+                    format="json",
+                )
+                self.assertEqual(respuesta.status_code, 400)
+                self.assertIn("parametros", respuesta.data)
+
+    def test_resultado_borrado_responde_410(self):
+        trabajo = trabajos.encolar("reporte_cargas")
+        trabajos.reclamar(1)
+        trabajos.ejecutar(trabajo.pk)
+        trabajo.refresh_from_db()
+        url = f"/api/trabajos/{trabajo.pk}/resultado/"
+        respuesta = self.api.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        respuesta.close()
+        trabajos.ruta_resultado(trabajo).unlink()
+        self.assertEqual(self.api.get(url).status_code, 410)
+
+
+class ConcurrenciaOptimistaTests(TransporteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.vehiculo = Vehiculo.objects.create(
+            patente="AB-1234", marca="Volvo", capacidad_kg=1000
+        )
+        self.url = f"/api/vehiculos/{self.vehiculo.pk}/"
+
+    def test_guardar_version_vieja_lanza_conflicto(self):
+        otra = Vehiculo.objects.get(pk=self.vehiculo.pk)
+        otra.marca = "Scania"
+        otra.save()
+        self.assertEqual(otra.version, 2)
+        self.vehiculo.marca = "Mercedes"
+        with self.assertRaises(ConflictoVersion) as contexto:
+            self.vehiculo.save()
+        self.assertEqual((contexto.exception.esperada, contexto.exception.actual), (1, 2))
+        self.assertEqual(self.vehiculo.version, 1)
+        self.assertEqual(Vehiculo.objects.get(pk=self.vehiculo.pk).marca, "Scania")
+
+    def test_version_se_restaura_ante_cualquier_error(self):
+        Vehiculo.objects.create(patente="CD-5678", marca="Volvo", capacidad_kg=1000)
+        self.vehiculo.patente = "CD-5678"
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.vehiculo.save()
+        self.assertEqual(self.vehiculo.version, 1)
+        self.vehiculo.patente = "EF-9012"
+        self.vehiculo.save()
+        self.assertEqual(self.vehiculo.version, 2)
+
+    def test_etag_y_if_match(self):
+        respuesta = self.api.get(self.url)
+        self.assertEqual(respuesta["ETag"], '"1"')
+
+        respuesta = self.api.patch(
+            self.url, {"marca": "Scania"}, format="json", HTTP_IF_MATCH='"0"'
+        )
+        self.assertEqual(respuesta.status_code, 412)
+        self.assertEqual(respuesta.data["version"], 1)
+        self.assertEqual(respuesta["ETag"], '"1"')
+        self.assertEqual(Vehiculo.objects.get(pk=self.vehiculo.pk).marca, "Volvo")
+
+        respuesta = self.api.patch(
+            self.url, {"marca": "Scania"}, format="json", HTTP_IF_MATCH='W/"1"'
+        )
+        self.assertEqual(respuesta.status_code, 412)
+
+        respuesta = self.api.patch(
+            self.url, {"marca": "Scania"}, format="json", HTTP_IF_MATCH='"1"'
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta["ETag"], '"2"')
+
+    def test_escritura_concurrente_responde_409(self):
+        original = VehiculoViewSet.get_object
+
+        def leer_y_adelantarse(vista):
+            instancia = original(vista)
+            # Otra solicitud escribe entre la lectura y el UPDATE.
+            Vehiculo.objects.filter(pk=instancia.pk).update(version=F("version") + 1)
+            return instancia
+
+        with mock.patch.object(VehiculoViewSet, "get_object", leer_y_adelantarse):
+            sin_if_match = self.api.patch(self.url, {"marca": "Scania"}, format="json")
+            con_if_match = self.api.patch(
+                self.url, {"marca": "Scania"}, format="json", HTTP_IF_MATCH='"2"'
+            )
+        self.assertEqual(sin_if_match.status_code, 409)
+        self.assertEqual(sin_if_match.data["version"], 2)
+        self.assertEqual(sin_if_match["ETag"], '"2"')
+        self.assertEqual(con_if_match.status_code, 412)
+        self.assertEqual(con_if_match.data["version"], 3)
+        self.assertEqual(Vehiculo.objects.get(pk=self.vehiculo.pk).marca, "Volvo")
+
+    def test_panel_informa_el_conflicto(self):
+        Vehiculo.objects.filter(pk=self.vehiculo.pk).update(version=F("version") + 1)
+        panel = Client()
+        panel.force_login(self.usuario)
+        respuesta = panel.post(
+            "/?module=vehiculos",
+            {
+                "module": "vehiculos",
+                "action": "update",
+                "pk": self.vehiculo.pk,
+                "version": 1,
+                "patente": "AB-1234",
+                "marca": "Scania",
+                "capacidad_kg": 1000,
+                "estado": Vehiculo.Estado.ACTIVO,
+            },
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertContains(respuesta, "Otro usuario modificó este registro")
+        self.assertContains(respuesta, 'name="version" value="2"')
+        self.assertEqual(Vehiculo.objects.get(pk=self.vehiculo.pk).marca, "Volvo")
+
+
+class KpiDespachosTests(TransporteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ruta = self.crear_ruta()
+        for codigo, dia, estado in (
+            ("D1", 6, Despacho.Estado.PENDIENTE),
+            ("D2", 8, Despacho.Estado.PENDIENTE),
+            ("D3", 13, Despacho.Estado.ENTREGADO),
+            ("D4", 20, Despacho.Estado.PENDIENTE),
+        ):
+            self.crear_despacho(codigo, date(2025, 1, dia), self.ruta, estado=estado)
+
+    def rollup(self):
+        return {
+            (fila.fecha, fila.ruta_id, fila.estado): fila.total
+            for fila in DespachoDiario.objects.exclude(total=0)
+        }
+
+    def test_rollup_sigue_altas_cambios_y_bajas(self):
+        despacho = Despacho.objects.get(codigo="D1")
+        despacho.estado = Despacho.Estado.EN_RUTA
+        despacho.save()
+        despacho.fecha = date(2025, 1, 8)
+        despacho.save()
+        Despacho.objects.get(codigo="D4").delete()
+        Despacho.objects.filter(codigo="D2").transicionar(Despacho.Estado.EN_RUTA)
+
+        incremental = self.rollup()
+        self.assertEqual(
+            incremental,
+            {
+                (date(2025, 1, 8), self.ruta.pk, Despacho.Estado.EN_RUTA): 2,
+                (date(2025, 1, 13), self.ruta.pk, Despacho.Estado.ENTREGADO): 1,
+            },
+        )
+        rollups.reconstruir()
+        self.assertEqual(self.rollup(), incremental)
+
+    def test_kpi_por_semana_y_dimension(self):
+        respuesta = self.api.get(
+            "/api/kpis/despachos/",
+            {"desde": "2025-01-06", "hasta": "2025-01-19", "periodo": "semana",
+             "dimension": "estado"},
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(
+            respuesta.data["series"],
+            [
+                {"clave": "PENDIENTE", "puntos": [{"inicio": date(2025, 1, 6), "total": 2}]},
+                {"clave": "ENTREGADO", "puntos": [{"inicio": date(2025, 1, 13), "total": 1}]},
+            ],
+        )
+
+    def test_kpi_total_diario(self):
+        respuesta = self.api.get(
+            "/api/kpis/despachos/", {"desde": "2025-01-08", "hasta": "2025-01-20"}
+        )
+        self.assertEqual(
+            [(p["inicio"], p["total"]) for p in respuesta.data["series"][0]["puntos"]],
+            [(date(2025, 1, 8), 1), (date(2025, 1, 13), 1), (date(2025, 1, 20), 1)],
+        )
+
+    def test_kpi_rango_invertido(self):
+        respuesta = self.api.get(
+            "/api/kpis/despachos/", {"desde": "2025-02-01", "hasta": "2025-01-01"}
+        )
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_kpi_rango_por_defecto(self):
+        respuesta = self.api.get("/api/kpis/despachos/", {"hasta": "2025-01-20"})
+        self.assertEqual(respuesta.data["desde"], date(2024, 12, 21))
+        self.assertEqual(len(respuesta.data["series"][0]["puntos"]), 4)
+
+
+class TiemposEstadoTests(TransporteTestCase):
+    def test_cubetas_cubren_sus_valores(self):
+        for segundos in (0, 1, 59, 60, 3599, 86400, 10 ** 7):
+            with self.subTest(segundos=segundos):
+                inferior, superior = transiciones.limites(transiciones.cubeta(segundos))
+                self.assertLessEqual(inferior, segundos)
+                self.assertLess(segundos, superior)
+
+    def test_registra_transiciones_y_tiempos(self):
+        ruta = self.crear_ruta()
+        with mock.patch("transporte.transiciones.time") as reloj:
+            reloj.time.return_value = 1000
+            lento = self.crear_despacho("D1", date(2025, 1, 1), ruta)
+            rapido = self.crear_despacho("D2", date(2025, 1, 1), ruta)
+            reloj.time.return_value = 1010
+            rapido.estado = Despacho.Estado.EN_RUTA
+            rapido.save()
+            reloj.time.return_value = 1100
+            Despacho.objects.filter(pk=lento.pk).transicionar(Despacho.Estado.EN_RUTA)
+
+        codigos = TransicionDespacho.CODIGOS
+        self.assertEqual(
+            list(
+                TransicionDespacho.objects.filter(despacho_id=lento.pk)
+                .order_by("id").values_list("desde", "hacia", "instante")
+            ),
+            [(0, codigos["PENDIENTE"], 1000), (codigos["PENDIENTE"], codigos["EN_RUTA"], 1100)],
+        )
+        self.assertEqual(
+            sorted(TiempoEstadoRuta.objects.values_list("cubeta", "total", "segundos")),
+            sorted([(transiciones.cubeta(10), 1, 10), (transiciones.cubeta(100), 1, 100)]),
+        )
+        resumen = transiciones.resumen([ruta.pk])
+        self.assertEqual(len(resumen), 1)
+        self.assertEqual(resumen[0]["estado"], "PENDIENTE")
+        self.assertEqual(resumen[0]["transiciones"], 2)
+        self.assertEqual(resumen[0]["promedio_segundos"], 55)
+        # p50 cae en la cubeta de 10 s y p90 en la de 100 s (error < 19 %).
+        self.assertAlmostEqual(resumen[0]["p50"], 10, delta=2)
+        self.assertAlmostEqual(resumen[0]["p90"], 100, delta=19)
+
+    def test_endpoint_valida_rutas(self):
+        respuesta = self.api.get("/api/kpis/tiempos-estado/", {"ruta": "1,x"})
+        self.assertEqual(respuesta.status_code, 400)
+        respuesta = self.api.get("/api/kpis/tiempos-estado/", {"ruta": "1"})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data, [])
+
+
+class AutocompletarTests(TransporteTestCase):
+    def setUp(self):
+        super().setUp()
+        for patente in ("AB-1234", "ab-9999", "CD-1111"):
+            Vehiculo.objects.create(patente=patente, marca="Volvo", capacidad_kg=1000)
+        self.panel = Client()
+        self.panel.force_login(self.usuario)
+
+    def textos(self, parametros, modulo="vehiculos"):
+        respuesta = self.panel.get(f"/autocompletar/{modulo}/", parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return [resultado["texto"] for resultado in respuesta.json()["resultados"]]
+
+    def test_prefijo_normalizado(self):
+        self.assertEqual(self.textos({"q": "ab"}), ["AB-1234 - Volvo", "ab-9999 - Volvo"])
+        self.assertEqual(self.textos({"q": "AB 12"}), ["AB-1234 - Volvo"])
+        self.assertEqual(self.textos({"q": "12"}), [])
+        self.assertEqual(self.textos({"q": "", "limite": "1"}), ["AB-1234 - Volvo"])
+        self.assertEqual(len(self.textos({"limite": "x"})), 3)
+
+    def test_modulo_desconocido_y_anonimo(self):
+        self.assertEqual(self.panel.get("/autocompletar/despachos/").status_code, 404)
+        self.assertEqual(Client().get("/autocompletar/vehiculos/").status_code, 302)
+
+    def test_select_solo_muestra_la_opcion_elegida(self):
+        vehiculo = Vehiculo.objects.get(patente="CD-1111")
+        despacho = self.crear_despacho(
+            "D1", date(2025, 1, 1), self.crear_ruta(), vehiculo=vehiculo
+        )
+        html = str(DespachoForm(instance=despacho)["vehiculo"])
+        self.assertIn('data-autocomplete-url="/autocompletar/vehiculos/"', html)
+        self.assertEqual(html.count("<option"), 2)
+        self.assertIn(f'value="{vehiculo.pk}" selected', html)
+        self.assertNotIn("AB-1234", html)
+
+
+class OpcionesCacheadasTests(TransporteTestCase):
+    def filtro(self, datos):
+        return DespachoFilter(datos, queryset=Despacho.objects.all())
+
+    def test_valida_contra_la_cache_sin_consultas(self):
+        ruta = self.crear_ruta()
+        despacho = self.crear_despacho("D1", date(2025, 1, 1), ruta)
+        self.crear_despacho("D2", date(2025, 1, 1), self.crear_ruta("R2"))
+        opciones_modelo(Ruta)
+        with self.assertNumQueries(0):
+            self.assertTrue(self.filtro({"ruta": str(ruta.pk)}).is_valid())
+            self.assertFalse(self.filtro({"ruta": "999"}).is_valid())
+        self.assertEqual(list(self.filtro({"ruta": str(ruta.pk)}).qs), [despacho])
+
+    def test_fila_nueva_es_valida_de_inmediato(self):
+        self.crear_ruta()
+        opciones_modelo(Ruta)
+        nueva = self.crear_ruta("R2")
+        filtro = self.filtro({"ruta": str(nueva.pk)})
+        self.assertTrue(filtro.is_valid())
+        self.assertIn((str(nueva.pk), str(nueva)), list(filtro.form.fields["ruta"].choices))
+
+
+class FragmentosTests(TransporteTestCase):
+    modulo = {"key": "vehiculos", "label": "Vehículos"}
+    config = {"model": Vehiculo, "fields": [("patente", "Patente"), ("marca", "Marca")]}
+
+    def setUp(self):
+        super().setUp()
+        self.vehiculos = [
+            Vehiculo.objects.create(patente=f"AB-{i}", marca="Volvo", capacidad_kg=1000)
+            for i in range(3)
+        ]
+
+    def tabla(self, cacheable=False):
+        antes = estadisticas.copy()
+        html, total = fragmentos.tabla(
+            self.modulo, self.config, Vehiculo.objects.order_by("pk"), cacheable=cacheable
+        )
+        return html, total, {
+            clave: estadisticas[clave] - antes[clave]
+            for clave in ("filas_aciertos", "filas_fallos", "tablas_aciertos")
+        }
+
+    def test_solo_se_renderizan_las_filas_cambiadas(self):
+        _, total, contadores = self.tabla()
+        self.assertEqual(total, 3)
+        self.assertEqual(contadores["filas_fallos"], 3)
+
+        self.vehiculos[1].marca = "Scania"
+        self.vehiculos[1].save()
+        with self.assertNumQueries(2):
+            # Versiones de las filas y carga de la única fila cambiada.
+            html, _, contadores = self.tabla()
+        self.assertEqual((contadores["filas_aciertos"], contadores["filas_fallos"]), (2, 1))
+        self.assertEqual(html.count("Scania"), 1)
+        self.assertEqual(html.count("Volvo"), 2)
+
+    def test_tabla_completa_cacheada_hasta_la_proxima_escritura(self):
+        self.tabla(cacheable=True)
+        with self.assertNumQueries(0):
+            _, total, contadores = self.tabla(cacheable=True)
+        self.assertEqual((total, contadores["tablas_aciertos"]), (3, 1))
+        Vehiculo.objects.create(patente="CD-1", marca="Volvo", capacidad_kg=1000)
+        _, total, contadores = self.tabla(cacheable=True)
+        self.assertEqual((total, contadores["tablas_aciertos"]), (4, 0))
+
+    def test_panel_no_cachea_listados_filtrados(self):
+        panel = Client()
+        panel.force_login(self.usuario)
+        for parametros in ({"q": "AB-1"}, {"q": "AB-1", "estado": "NO_EXISTE"}):
+            with self.subTest(parametros=parametros):
+                respuesta = panel.get("/", {"module": "vehiculos", **parametros})
+                self.assertContains(respuesta, "AB-1")
+                self.assertNotContains(respuesta, "AB-2")
+        self.assertContains(panel.get("/", {"module": "vehiculos"}), "AB-2")
+
+    def test_cambio_en_relacion_renderiza_la_fila(self):
+        ruta = self.crear_ruta()
+        self.crear_despacho("D1", date(2025, 1, 1), ruta)
+        config = {"model": Despacho, "fields": [("codigo", "Código"), ("ruta", "Ruta")]}
+        modulo = {"key": "despachos", "label": "Despachos"}
+        fragmentos.tabla(modulo, config, Despacho.objects.all())
+        ruta.codigo = "R9"
+        ruta.save()
+        html, _ = fragmentos.tabla(modulo, config, Despacho.objects.all())
+        self.assertIn("R9: Santiago", html)
+
+
+class EsquemaOpenAPITests(TransporteTestCase):
+    def test_esquema_estatico_con_etag(self):
+        ruta = Path(self._directorio.name) / "openapi.json"
+        with self.settings(LOGISTICA_OPENAPI_JSON=ruta):
+            respuesta = self.client.get("/swagger/openapi.json")
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertTrue(ruta.exists())
+            self.assertIn("/despachos/", json.loads(respuesta.content)["paths"])
+            self.assertIn("max-age=", respuesta["Cache-Control"])
+            etag = respuesta["ETag"]
+
+            respuesta = self.client.get("/swagger/openapi.json", HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(respuesta.status_code, 304)
+
+            ruta.write_bytes(b'{"paths": {}}')
+            respuesta = self.client.get("/swagger/openapi.json", HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertNotEqual(respuesta["ETag"], etag)
+
+    def test_urls_no_importan_drf_yasg(self):
+        resultado = subprocess.run(
+            [
+                sys.executable, "-c",
+                "import django, sys; django.setup(); import logistica.urls;"
+                "print(sorted(m for m in sys.modules if m.startswith('drf_yasg.')))",
+            ],
+            capture_output=True,
+            text=True,
+            env={**os.environ, "DJANGO_SETTINGS_MODULE": "logistica.settings"},
+            check=True,
+        )
+        # Solo el paquete de la app (INSTALLED_APPS), no el generador ni las vistas.
+        self.assertEqual(resultado.stdout.strip(), "[]")
+
+
+class JWTCacheTests(TransporteTestCase):
+    url = "/api/kpis/tiempos-estado/"
+
+    def setUp(self):
+        super().setUp()
+        authentication.tokens.clear()
+        authentication.usuarios.clear()
+        respuesta = APIClient().post(
+            "/api/token/", {"username": "admin", "password": "x"}, format="json"
+        )
+        self.cliente = APIClient()
+        self.cliente.credentials(HTTP_AUTHORIZATION=f"Bearer {respuesta.data['access']}")
+
+    def consultas_de_usuario(self):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.cliente.get(self.url)
+        self.assertEqual(respuesta.status_code, 200)
+        return [c["sql"] for c in consultas.captured_queries if "auth_user" in c["sql"]]
+
+    def test_usuario_se_resuelve_una_vez(self):
+        self.assertEqual(len(self.consultas_de_usuario()), 1)
+        self.assertEqual(self.consultas_de_usuario(), [])
+
+    def test_guardar_usuario_invalida_la_cache(self):
+        self.consultas_de_usuario()
+        self.usuario.is_active = False
+        self.usuario.save()
+        self.assertEqual(self.cliente.get(self.url).status_code, 401)
+
+    def test_cache_ttl_expira_y_desaloja(self):
+        cache_ttl = authentication.CacheTTL(maximo=2, ttl=10)
+        with mock.patch("transporte.authentication.time.monotonic", return_value=100):
+            for clave in "abc":
+                cache_ttl.set(clave, clave.upper())
+            self.assertIsNone(cache_ttl.get("a"))
+            self.assertEqual(cache_ttl.get("b"), "B")
+            cache_ttl.set("d", "D", ttl=1)
+        with mock.patch("transporte.authentication.time.monotonic", return_value=105):
+            self.assertIsNone(cache_ttl.get("d"))
+            self.assertEqual(cache_ttl.get("b"), "B")
+        with mock.patch("transporte.authentication.time.monotonic", return_value=111):
+            self.assertIsNone(cache_ttl.get("b"))
+
+
+class ThrottlingTests(TransporteTestCase):
+    def consumir(self, instante, clave="api:u1", costo=1):
+        with mock.patch("transporte.throttling.time.time", return_value=instante):
+            return obtener_baldes().consumir(clave, capacidad=2, por_segundo=1, costo=costo)
+
+    def test_balde_de_tokens(self):
+        self.assertEqual([self.consumir(100) for _ in range(3)], [0, 0, 1])
+        self.assertEqual(self.consumir(100.5), 0.5)
+        self.assertEqual(self.consumir(102), 0)
+        # Cada clave tiene su propio balde y el costo se acota a la capacidad.
+        self.assertEqual(self.consumir(102, clave="api:u2", costo=5), 0)
+        self.assertEqual(self.consumir(102, clave="api:u2"), 1)
+
+    def test_api_responde_429_por_scope(self):
+        tasas = {"api": "2/min", "reportes": "1/min"}
+        with mock.patch.object(BaldeThrottle, "THROTTLE_RATES", tasas):
+            codigos = [self.api.get("/api/vehiculos/").status_code for _ in range(3)]
+            self.assertEqual(codigos, [200, 200, 429])
+            self.assertEqual(self.api.get("/api/kpis/tiempos-estado/").status_code, 200)
+            respuesta = self.api.get("/api/kpis/tiempos-estado/")
+        self.assertEqual(respuesta.status_code, 429)
+        self.assertEqual(respuesta["Retry-After"], "60")
+
+    def test_descarga_por_cola_y_latencia(self):
+        url = "/api/kpis/tiempos-estado/"
+        with mock.patch.object(cola, "profundidad", return_value=10 ** 6):
+            respuesta = self.api.get(url)
+        self.assertEqual(respuesta.status_code, 503)
+        self.assertEqual(respuesta["Retry-After"], "10")
+
+        self.addCleanup(latencias.clear)
+        latencias["reportes"] = 10 ** 6
+        self.assertEqual(self.api.get(url).status_code, 503)
+        self.assertLess(latencias["reportes"], 10 ** 6)
+        latencias["reportes"] = 0
+        self.assertEqual(self.api.get(url).status_code, 200)
+
+
+class ColumnarTests(TransporteTestCase):
+    def setUp(self):
+        super().setUp()
+        ruta = self.crear_ruta()
+        for i in range(5):
+            self.crear_despacho(f"D{i}", date(2025, 1, 1 + i), ruta)
+
+    def test_columnas_equivalen_a_las_filas(self):
+        filas = self.api.get("/api/despachos/", {"page_size": 3}).json()
+        respuesta = self.api.get("/api/despachos/", {"page_size": 3, "format": "columnas"})
+        self.assertEqual(respuesta["Content-Type"], "application/vnd.logistica.columnas+json")
+        columnas = respuesta.json()
+        self.assertEqual(columnas["total"], 3)
+        self.assertEqual(set(columnas["columnas"]), set(filas["results"][0]))
+        for nombre, valores in zip(columnas["columnas"], columnas["datos"]):
+            with self.subTest(columna=nombre):
+                self.assertEqual(valores, [fila[nombre] for fila in filas["results"]])
+
+        siguiente = self.api.get(columnas["next"]).json()
+        self.assertEqual(siguiente["datos"][columnas["columnas"].index("codigo")], ["D3", "D4"])
+
+    def test_relacion_por_nombre_y_accept(self):
+        respuesta = self.api.get(
+            "/api/rutas/", HTTP_ACCEPT="application/vnd.logistica.columnas+json"
+        )
+        datos = respuesta.json()
+        self.assertEqual(datos["datos"][datos["columnas"].index("origen")], ["Santiago"])
+
+    def test_empaquetar_messagepack(self):
+        self.assertEqual(
+            columnar.empaquetar({"a": [1, -1, 300, None, True, "x", 1.5]}),
+            b"\x81\xa1a\x97\x01\xff\xcd\x01\x2c\xc0\xc3\xa1x"
+            b"\xcb\x3f\xf8\x00\x00\x00\x00\x00\x00",
+        )
+        self.assertEqual(columnar.empaquetar(date(2025, 1, 2)), b"\xaa2025-01-02")
+        self.assertEqual(columnar.empaquetar(list(range(16)))[:3], b"\xdc\x00\x10")
+
+    def test_respuesta_messagepack(self):
+        respuesta = self.api.get("/api/rutas/", {"format": "msgpack"})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta["Content-Type"], "application/msgpack")
+        # Un mapa corto (fixmap): 0x80 | cantidad de claves.
+        self.assertEqual(respuesta.content[0] & 0xF0, 0x80)
+        self.assertIn(b"Santiago", respuesta.content)
+
+
+class MetricasTests(TransporteTestCase):
+    def setUp(self):
+        super().setUp()
+        # Descarta lo acumulado por pruebas anteriores en este proceso.
+        registro.volcar()
+        obtener_almacen()._conexion().execute("DELETE FROM metricas")
+        self.panel = Client()
+        self.panel.force_login(self.usuario)
+
+    def test_exportar_histograma_acumulado(self):
+        base = 'metodo="GET",ruta="x"'
+        texto = exportar([
+            ("http_duracion_segundos_bucket", base, "0.01", 2.0),
+            ("http_duracion_segundos_bucket", base, "0.5", 1.0),
+            ("http_duracion_segundos_count", base, "", 4.0),
+            ("http_duracion_segundos_sum", base, "", 12.5),
+            ("cache_operaciones_total", 'resultado="aciertos",tipo="filas"', "", 3.0),
+            ("cache_operaciones_total", 'resultado="fallos",tipo="filas"', "", 1.0),
+        ])
+        prefijo = "logistica_http_duracion_segundos"
+        self.assertIn(f'{prefijo}_bucket{{{base},le="0.005"}} 0\n', texto)
+        self.assertIn(f'{prefijo}_bucket{{{base},le="0.01"}} 2\n', texto)
+        self.assertIn(f'{prefijo}_bucket{{{base},le="10.0"}} 3\n', texto)
+        self.assertIn(f'{prefijo}_bucket{{{base},le="+Inf"}} 4\n', texto)
+        self.assertIn(f"{prefijo}_sum{{{base}}} 12.500000\n", texto)
+        self.assertIn('logistica_cache_aciertos_ratio{tipo="filas"} 0.7500\n', texto)
+
+    def test_solicitudes_y_consultas_por_ruta(self):
+        for _ in range(2):
+            self.assertEqual(self.api.get("/api/vehiculos/").status_code, 200)
+        texto = self.panel.get("/metrics").content.decode()
+        base = 'metodo="GET",ruta="transporte:vehiculo-list"'
+        self.assertIn(
+            f'logistica_http_solicitudes_total{{estado="2xx",{base}}} 2\n', texto
+        )
+        self.assertIn(f"logistica_http_duracion_segundos_count{{{base}}} 2\n", texto)
+        self.assertRegex(texto, rf"logistica_db_consultas_total\{{{base}\}} [1-9]")
+
+    @override_settings(TRANSPORTE_METRICAS_TOKEN="secreto")
+    def test_acceso(self):
+        self.assertEqual(Client().get("/metrics").status_code, 403)
+        self.assertEqual(
+            Client().get("/metrics", HTTP_AUTHORIZATION="Bearer otro").status_code, 403
+        )
+        self.assertEqual(
+            Client().get("/metrics", HTTP_AUTHORIZATION="Bearer señal").status_code, 403
+        )
+        self.assertEqual(
+            Client().get("/metrics", HTTP_AUTHORIZATION="Bearer secreto").status_code, 200
+        )
+
+
+class PruebaCargaTests(SimpleTestCase):
+    def test_resumen_percentiles_y_tasas(self):
+        latencias = [i / 1000 for i in range(1, 101)]
+        estados = Counter({200: 94, 429: 3, 503: 1, 500: 1, 0: 1})
+        resumen = prueba_carga.resumen({"api": (latencias, estados)}, duracion=2)
+        paso = resumen["pasos"]["api"]
+        self.assertEqual(paso["solicitudes"], 100)
+        self.assertEqual(paso["rps"], 50.0)
+        self.assertEqual(paso["p50_ms"], 50.5)
+        self.assertTrue(95 <= paso["p95_ms"] <= 96)
+        self.assertEqual(paso["tasa_limitadas"], 0.04)
+        self.assertEqual(paso["tasa_error"], 0.02)
+        self.assertEqual(resumen["total"], paso)
+
+    def test_comparar_detecta_regresiones(self):
+        def datos(p95, rps, error=0.0):
+            return {"p95_ms": p95, "rps": rps, "tasa_error": error}
+
+        base = {"total": datos(10, 100), "pasos": {"api": datos(10, 100)}}
+        actual = {
+            "total": datos(11, 95),
+            "pasos": {"api": datos(20, 70, 0.05), "nuevo": datos(500, 1)},
+        }
+        self.assertEqual(
+            prueba_carga.comparar(actual, base),
+            [
+                "api: p95 10 -> 20 ms",
+                "api: rps 100 -> 70",
+                "api: errores 0.0% -> 5.0%",
+            ],
+        )
+        # Bajo el margen absoluto no es regresión aunque supere la tolerancia.
+        rapido = {"total": datos(0.5, 100), "pasos": {}}
+        self.assertEqual(
+            prueba_carga.comparar({"total": datos(1.5, 100), "pasos": {}}, rapido), []
+        )
+
+    def test_escenario_desde_json(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as archivo:
+            json.dump(
+                [{"nombre": "ping", "ruta": "/api/ping/", "autenticacion": "anonimo"}], archivo
+            )
+        self.addCleanup(os.unlink, archivo.name)
+        self.assertEqual(
+            prueba_carga.cargar_escenario(archivo.name),
+            [prueba_carga.Paso("ping", "/api/ping/", autenticacion="anonimo")],
+        )
+        self.assertIs(prueba_carga.cargar_escenario("api"), prueba_carga.ESCENARIOS["api"])
+
+
+class PerfilesTests(TransporteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.panel = Client()
+        self.panel.force_login(self.usuario)
+
+    def metadatos(self, respuesta):
+        nombre = respuesta["X-Perfil"]
+        return json.loads((perfiles.directorio() / f"{nombre}.json").read_text())
+
+    def test_perfil_cpu_del_panel(self):
+        respuesta = self.panel.get("/", {"module": "vehiculos", "_perfil": "1"})
+        self.assertEqual(respuesta.status_code, 200)
+        perfil = self.metadatos(respuesta)
+        self.assertEqual(perfil["tipo"], "cpu")
+        self.assertEqual(perfil["ruta"], "home")
+        self.assertEqual(perfil["parametros"], {"module": ["vehiculos"]})
+        self.assertEqual(perfil["usuario"], "admin")
+        self.assertTrue((perfiles.directorio() / f"{perfil['nombre']}.prof").exists())
+
+        detalle = self.panel.get(f"/admin/perfiles/{perfil['nombre']}/")
+        self.assertContains(detalle, "function calls")
+        self.assertContains(self.panel.get("/admin/perfiles/"), perfil["nombre"])
+        self.assertEqual(self.panel.get("/admin/perfiles/..%2Fsecreto/").status_code, 404)
+
+    def test_solo_staff(self):
+        get_user_model().objects.create_user("operador", password="x")
+        cliente = Client()
+        cliente.force_login(get_user_model().objects.get(username="operador"))
+        respuesta = cliente.get("/", {"module": "vehiculos"}, HTTP_X_PERFIL="1")
+        self.assertNotIn("X-Perfil", respuesta)
+        self.assertNotIn("X-Perfil", Client().get("/api/ping/", HTTP_X_PERFIL="1"))
+
+    def test_perfil_via_jwt(self):
+        acceso = APIClient().post(
+            "/api/token/", {"username": "admin", "password": "x"}, format="json"
+        ).data["access"]
+        respuesta = Client().get(
+            "/api/vehiculos/", HTTP_X_PERFIL="1", HTTP_AUTHORIZATION=f"Bearer {acceso}"
+        )
+        self.assertEqual(self.metadatos(respuesta)["ruta"], "transporte:vehiculo-list")
+
+    def test_podar_conserva_los_mas_nuevos(self):
+        carpeta = Path(self._directorio.name) / "podar"
+        carpeta.mkdir()
+        for nombre in ("20250101-000000-a", "20250102-000000-b", "20250103-000000-c"):
+            (carpeta / f"{nombre}.json").write_text("{}")
+            (carpeta / f"{nombre}.prof").write_bytes(b"")
+        perfiles.podar(carpeta, maximo=2)
+        self.assertEqual(
+            sorted(archivo.name for archivo in carpeta.iterdir()),
+            [
+                "20250102-000000-b.json", "20250102-000000-b.prof",
+                "20250103-000000-c.json", "20250103-000000-c.prof",
+            ],
+        )
+
+
+class MemoriaTests(TransporteTestCase):
+    def test_medir_pico_y_retenido(self):
+        with memoria.medir() as medicion:
+            retenido = bytearray(200_000)
+            del bytearray(2_000_000)[:]
+        self.assertGreaterEqual(medicion["pico"], 2_000_000)
+        self.assertGreaterEqual(medicion["retenido"], 200_000)
+        self.assertLess(medicion["retenido"], 2_000_000)
+        del retenido
+
+    def test_una_medicion_a_la_vez(self):
+        with memoria.medir() as externa:
+            with memoria.medir() as interna:
+                self.assertIsNone(interna)
+        self.assertIn("pico", externa)
+
+    def test_informe_atribuye_al_codigo_propio(self):
+        with memoria.medir(informe=True) as medicion:
+            datos = [str(i) * 10 for i in range(2_000)]
+        self.assertTrue(
+            any(
+                fila["ubicacion"].startswith("transporte/tests.py:")
+                for fila in medicion["por_codigo_propio"]
+            ),
+            medicion["por_codigo_propio"],
+        )
+        del datos
+
+    def test_perfil_de_memoria_de_una_solicitud(self):
+        panel = Client()
+        panel.force_login(self.usuario)
+        respuesta = panel.get("/api/ping/", HTTP_X_PERFIL="memoria")
+        self.assertGreater(int(respuesta["X-Memoria-Pico"]), 0)
+        nombre = respuesta["X-Perfil"]
+        perfil = json.loads((perfiles.directorio() / f"{nombre}.json").read_text())
+        self.assertEqual(perfil["tipo"], "memoria")
+        self.assertEqual(perfil["memoria"]["pico"], int(respuesta["X-Memoria-Pico"]))
+        self.assertContains(panel.get(f"/admin/perfiles/{nombre}/"), "Pico de memoria Python")
+
+
+class TripulacionTests(TransporteTestCase):
+    def fuerza_bruta(self, dias, desde, hasta):
+        por_fecha = Counter()
+        for fecha, cantidad in dias:
+            por_fecha[fecha] += cantidad
+
+        def ventana(fin, ancho):
+            return sum(por_fecha[fin - timedelta(days=d)] for d in range(ancho))
+
+        resultado = {}
+        for ancho in tripulacion.VENTANAS:
+            maximo = (0, None)
+            fecha = desde
+            while fecha <= hasta:
+                if ventana(fecha, ancho) > maximo[0]:
+                    maximo = (ventana(fecha, ancho), fecha)
+                fecha += timedelta(days=1)
+            resultado[ancho] = (ventana(hasta, ancho), *maximo)
+        total = sum(c for fecha, c in por_fecha.items() if desde <= fecha <= hasta)
+        return resultado, total
+
+    def test_ventanas_coinciden_con_fuerza_bruta(self):
+        generador = random.Random(48)
+        desde, hasta = date(2025, 3, 1), date(2025, 4, 15)
+        inicio = desde - timedelta(days=max(tripulacion.VENTANAS) - 1)
+        for caso in range(50):
+            fechas = sorted(
+                generador.sample(range((hasta - inicio).days + 1), generador.randint(0, 40))
+            )
+            dias = [(inicio + timedelta(days=d), generador.randint(1, 4)) for d in fechas]
+            with self.subTest(caso=caso):
+                self.assertEqual(
+                    tripulacion.ventanas(dias, desde, hasta),
+                    self.fuerza_bruta(dias, desde, hasta),
+                )
+
+    def test_reporte_por_conductor(self):
+        ruta = self.crear_ruta()
+        ocupado = Conductor.objects.create(run="1-9", nombre="Ana", licencia="A2")
+        Conductor.objects.create(run="2-7", nombre="Beto", licencia="A2")
+        Conductor.objects.create(run="3-5", nombre="Inactivo", licencia="A2", activo=False)
+        for i, dia in enumerate((1, 2, 2, 5, 20)):
+            self.crear_despacho(f"D{i}", date(2025, 1, dia), ruta, conductor=ocupado)
+        self.crear_despacho(
+            "X0", date(2025, 1, 3), ruta, conductor=ocupado, estado=Despacho.Estado.ENTREGADO
+        )
+        self.assertEqual(archivo.archivar(date(2025, 1, 4)), 1)
+
+        parametros = {"desde": "2025-01-01", "hasta": "2025-01-20", "limite_7d": 4}
+        respuesta = self.api.get("/api/reportes/tripulacion/", parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        conductores = respuesta.data["conductores"]
+        self.assertEqual([fila["nombre"] for fila in conductores], ["Ana", "Beto"])
+        self.assertEqual(
+            {clave: conductores[0][clave] for clave in (
+                "despachos", "actual_7d", "max_7d", "max_7d_fecha", "actual_30d", "sobrecarga"
+            )},
+            {
+                "despachos": 5, "actual_7d": 1, "max_7d": 4,
+                "max_7d_fecha": date(2025, 1, 5), "actual_30d": 5, "sobrecarga": False,
+            },
+        )
+        respuesta = self.api.get(
+            "/api/reportes/tripulacion/", {**parametros, "include_archived": "1"}
+        )
+        self.assertEqual(respuesta.data["conductores"][0]["max_7d"], 5)
+        self.assertTrue(respuesta.data["conductores"][0]["sobrecarga"])
+
+
+class HistorialClienteTests(TransporteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ruta = self.crear_ruta()
+        self.cliente = Cliente.objects.create(nombre="Acme", rut="76.000.000-0")
+        self.url = f"/api/clientes/{self.cliente.pk}/historial/"
+        self.cargas = [self.crear_carga(i) for i in range(3)]
+
+    def crear_carga(self, numero, despachos=4):
+        carga = Carga.objects.create(
+            cliente=self.cliente, descripcion=f"Carga {numero}", peso_kg=100,
+            valor_estimado=Decimal("10.00"),
+        )
+        for dia in range(1, despachos + 1):
+            self.crear_despacho(f"C{numero}-{dia}", date(2025, 1, dia), self.ruta, carga=carga)
+        return carga
+
+    def consultas(self, parametros):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.api.get(self.url, parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta, len(consultas)
+
+    def test_pagina_de_cargas_con_ultimos_despachos(self):
+        respuesta, _ = self.consultas({"por_pagina": 2, "despachos_por_carga": 2})
+        cargas = respuesta.data["cargas"]
+        self.assertEqual(respuesta.data["cliente"]["nombre"], "Acme")
+        self.assertEqual(cargas["total"], 3)
+        self.assertEqual(
+            [carga["id"] for carga in cargas["resultados"]],
+            [self.cargas[2].pk, self.cargas[1].pk],
+        )
+        primera = cargas["resultados"][0]
+        self.assertEqual(primera["despachos_total"], 4)
+        self.assertEqual([d["codigo"] for d in primera["despachos"]], ["C2-4", "C2-3"])
+        self.assertEqual(primera["despachos"][0]["origen"], "Santiago")
+        self.assertIsNone(cargas["anterior"])
+
+        siguiente = self.api.get(cargas["siguiente"]).data["cargas"]
+        self.assertEqual([carga["id"] for carga in siguiente["resultados"]], [self.cargas[0].pk])
+        self.assertIsNone(siguiente["siguiente"])
+
+    def test_consultas_no_crecen_con_los_datos(self):
+        _, antes = self.consultas({"despachos_por_carga": 2})
+        for numero in range(3, 8):
+            self.crear_carga(numero, despachos=6)
+        respuesta, despues = self.consultas({"despachos_por_carga": 2})
+        self.assertEqual(len(respuesta.data["cargas"]["resultados"]), 8)
+        # Cliente, conteo, página de cargas y sus despachos.
+        self.assertEqual(antes, 4)
+        self.assertEqual(despues, antes)
+
+    def test_filtro_de_despachos(self):
+        Despacho.objects.filter(codigo="C1-2").update(estado=Despacho.Estado.ENTREGADO)
+        respuesta, _ = self.consultas({"estado": Despacho.Estado.ENTREGADO})
+        cargas = respuesta.data["cargas"]
+        self.assertEqual(cargas["total"], 1)
+        self.assertEqual(cargas["resultados"][0]["despachos_total"], 1)
+        self.assertEqual(
+            [d["codigo"] for d in cargas["resultados"][0]["despachos"]], ["C1-2"]
+        )
+        respuesta = self.api.get(self.url, {"desde": "2025-02-01", "hasta": "2025-01-01"})
+        self.assertEqual(respuesta.status_code, 400)
@@ -0,0 +1,180 @@
+"""Token-bucket throttling and load shedding for the API.
+
+Buckets live in a local SQLite file (``TRANSPORTE_THROTTLE_SQLITE``) so
+every worker process on the host draws from the same counters. Each
+bucket is per scope and per user (or IP for anonymous calls). A view
+picks its scope with ``throttle_scope`` and what a call costs with
+``throttle_cost``. The rates come from ``DEFAULT_THROTTLE_RATES`` in DRF's
+``"N/period"`` format: the bucket holds N tokens and refills at N per
+period.
+
+``DescargaMixin`` sheds load on expensive views with 503 + Retry-After
+when the pending job queue or their recent latency is above the limits
+in ``TRANSPORTE_DESCARGA``.
+"""
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.throttling import SimpleRateThrottle
+
+from .models import Trabajo
+
+
+class BaldesSQLite:
+    """Token buckets shared between processes through a SQLite file."""
+
+    def __init__(self, ruta):
+        self.ruta = str(ruta)
+        self._local = threading.local()
+        self._conexion().execute(
+            "CREATE TABLE IF NOT EXISTS baldes "
+            "(clave TEXT PRIMARY KEY, tokens REAL NOT NULL, actualizado REAL NOT NULL)"
+        )
+
+    def _conexion(self):
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=5, isolation_level=None)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            # Los contadores no necesitan sobrevivir a un corte de energía.
+            conexion.execute("PRAGMA synchronous=OFF")
+            self._local.conexion = conexion
+        return conexion
+
+    def consumir(self, clave, capacidad, por_segundo, costo=1):
+        """Take ``costo`` tokens; return the seconds to wait, 0 if allowed."""
+        costo = min(costo, capacidad)
+        ahora = time.time()
+        conexion = self._conexion()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            fila = conexion.execute(
+                "SELECT tokens, actualizado FROM baldes WHERE clave = ?", (clave,)
+            ).fetchone()
+            tokens = capacidad
+            if fila is not None:
+                tokens = min(capacidad, fila[0] + max(ahora - fila[1], 0) * por_segundo)
+            espera = 0
+            if tokens >= costo:
+                tokens -= costo
+            else:
+                espera = (costo - tokens) / por_segundo
+            conexion.execute(
+                "INSERT OR REPLACE INTO baldes (clave, tokens, actualizado) VALUES (?, ?, ?)",
+                (clave, tokens, ahora),
+            )
+            conexion.execute("COMMIT")
+        except BaseException:
+            conexion.execute("ROLLBACK")
+            raise
+        return espera
+
+
+@lru_cache(maxsize=1)
+def obtener_baldes():
+    ruta = settings.TRANSPORTE_THROTTLE_SQLITE
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    return BaldesSQLite(ruta)
+
+
+class BaldeThrottle(SimpleRateThrottle):
+    """Per-user token bucket for the view's ``throttle_scope`` (``"api"`` by default)."""
+
+    scope_por_defecto = "api"
+
+    def __init__(self):
+        # El scope depende de la vista; se resuelve en allow_request.
+        pass
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, "throttle_scope", None) or self.scope_por_defecto
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        costo = getattr(view, "throttle_cost", 1)
+        if callable(costo):
+            costo = costo(request)
+        self.espera = obtener_baldes().consumir(
+            self.get_cache_key(request, view),
+            self.num_requests,
+            self.num_requests / self.duration,
+            costo,
+        )
+        return self.espera == 0
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = f"u{request.user.pk}"
+        else:
+            ident = f"ip{self.get_ident(request)}"
+        return f"{self.scope}:{ident}"
+
+    def wait(self):
+        return self.espera
+
+
+class ServicioSaturado(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "El servicio está saturado, intenta nuevamente más tarde."
+    default_code = "servicio_saturado"
+
+    def __init__(self, wait, detail=None):
+        # El manejador de DRF agrega Retry-After a partir de ``wait``.
+        self.wait = wait
+        super().__init__(detail)
+
+
+class _Cola:
+    """Pending job count, read from the database at most once per second."""
+
+    ttl = 1.0
+
+    def __init__(self):
+        self._valor = 0
+        self._leido = 0.0
+
+    def profundidad(self):
+        if time.monotonic() - self._leido > self.ttl:
+            self._valor = Trabajo.objects.filter(estado=Trabajo.Estado.PENDIENTE).count()
+            self._leido = time.monotonic()
+        return self._valor
+
+
+cola = _Cola()
+
+# Latencia promedio móvil (ms) por scope en este proceso.
+latencias = {}
+PESO_LATENCIA = 0.2
+
+
+class DescargaMixin:
+    """Reject calls with 503 while the job queue or the view latency is too high."""
+
+    metodos_descarga = ("GET", "POST")
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method not in self.metodos_descarga:
+            return
+        self._inicio = time.perf_counter()
+        limites = settings.TRANSPORTE_DESCARGA
+        if cola.profundidad() > limites["cola_maxima"]:
+            raise ServicioSaturado(limites["reintentar_en"])
+        if latencias.get(self.throttle_scope, 0) > limites["latencia_ms"]:
+            # Cada rechazo baja el promedio, así una solicitud posterior vuelve a medir.
+            latencias[self.throttle_scope] *= 1 - PESO_LATENCIA
+            raise ServicioSaturado(limites["reintentar_en"])
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        inicio = getattr(self, "_inicio", None)
+        if inicio is not None and response.status_code < 400:
+            duracion = (time.perf_counter() - inicio) * 1000
+            previa = latencias.get(self.throttle_scope, duracion)
+            latencias[self.throttle_scope] = previa + PESO_LATENCIA * (duracion - previa)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,238 @@
+"""Database-backed job queue for heavy reports and exports.
+
+Jobs are rows in ``Trabajo``; ``manage.py procesar_trabajos`` claims them
+with a conditional UPDATE and runs them in a process pool, so no broker
+is needed. Task functions register themselves with ``@tarea`` and write
+their result into ``settings.TRANSPORTE_TRABAJOS_DIR``.
+"""
+import csv
+import io
+import itertools
+import json
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import reportes, tripulacion, utilizacion
+from .models import Despacho, DespachoArchivado, Trabajo
+
+TAREAS = {}
+
+ERROR_HUERFANO = "El worker que ejecutaba el trabajo no lo terminó."
+
+
+class TrabajoCancelado(Exception):
+    pass
+
+
+def tarea(nombre, extension, tipo_contenido):
+    """Register ``funcion(parametros, avance)`` as the handler for ``nombre``."""
+
+    def registrar(funcion):
+        TAREAS[nombre] = (funcion, extension, tipo_contenido)
+        return funcion
+
+    return registrar
+
+
+def encolar(tipo, parametros=None, usuario=None) -> Trabajo:
+    if tipo not in TAREAS:
+        raise ValueError(f"Tipo de trabajo desconocido: {tipo}")
+    return Trabajo.objects.create(
+        tipo=tipo,
+        parametros=parametros or {},
+        creado_por=usuario if usuario and usuario.is_authenticated else None,
+    )
+
+
+def cancelar(trabajo) -> bool:
+    """Cancel a pending job or ask the worker to stop a running one."""
+    filas = Trabajo.objects.filter(pk=trabajo.pk)
+    if filas.filter(estado=Trabajo.Estado.PENDIENTE).update(
+        estado=Trabajo.Estado.CANCELADO, finalizado=timezone.now()
+    ):
+        return True
+    return bool(
+        filas.filter(estado=Trabajo.Estado.EN_CURSO).update(cancelacion_solicitada=True)
+    )
+
+
+def reclamar(limite):
+    """Atomically move up to ``limite`` due jobs to EN_CURSO and return their ids."""
+    ahora = timezone.now()
+    candidatos = (
+        Trabajo.objects
+        .filter(estado=Trabajo.Estado.PENDIENTE, disponible_desde__lte=ahora)
+        .order_by("disponible_desde", "id")
+        .values_list("id", flat=True)[:limite]
+    )
+    reclamados = []
+    for trabajo_id in candidatos:
+        # Solo un worker gana el UPDATE condicional sobre cada fila.
+        if Trabajo.objects.filter(pk=trabajo_id, estado=Trabajo.Estado.PENDIENTE).update(
+            estado=Trabajo.Estado.EN_CURSO,
+            iniciado=ahora,
+            intentos=F("intentos") + 1,
+            progreso=0,
+        ):
+            reclamados.append(trabajo_id)
+    return reclamados
+
+
+def liberar_huerfanos(antiguedad):
+    """Requeue, or fail once out of attempts, jobs left EN_CURSO by a worker that died.
+
+    Returns how many jobs were released.
+    """
+    huerfanos = Trabajo.objects.filter(
+        estado=Trabajo.Estado.EN_CURSO,
+        iniciado__lt=timezone.now() - antiguedad,
+    )
+    liberados = 0
+    for trabajo in huerfanos:
+        filas = Trabajo.objects.filter(pk=trabajo.pk, estado=Trabajo.Estado.EN_CURSO)
+        _reintentar(trabajo, filas, error=ERROR_HUERFANO, cancelacion_solicitada=False)
+        liberados += 1
+    return liberados
+
+
+def devolver(trabajo_id, error):
+    """Requeue, or fail once out of attempts, a job whose worker process died.
+
+    Returns the new estado, or ``None`` if the job had already finished.
+    """
+    trabajo = Trabajo.objects.filter(pk=trabajo_id, estado=Trabajo.Estado.EN_CURSO).first()
+    if trabajo is None:
+        return None
+    filas = Trabajo.objects.filter(pk=trabajo_id, estado=Trabajo.Estado.EN_CURSO)
+    return _reintentar(trabajo, filas, error=error)
+
+
+def _reintentar(trabajo, filas, **campos):
+    """Requeue ``trabajo`` with exponential backoff, or mark it FALLIDO."""
+    if trabajo.intentos < trabajo.max_intentos:
+        filas.update(
+            estado=Trabajo.Estado.PENDIENTE,
+            disponible_desde=timezone.now() + timedelta(seconds=2 ** trabajo.intentos),
+            **campos,
+        )
+        return Trabajo.Estado.PENDIENTE
+    filas.update(estado=Trabajo.Estado.FALLIDO, finalizado=timezone.now(), **campos)
+    return Trabajo.Estado.FALLIDO
+
+
+def ruta_resultado(trabajo):
+    return settings.TRANSPORTE_TRABAJOS_DIR / trabajo.resultado
+
+
+def ejecutar(trabajo_id):
+    """Run one claimed job; called inside a worker process."""
+    trabajo = Trabajo.objects.get(pk=trabajo_id)
+    filas = Trabajo.objects.filter(pk=trabajo_id)
+    inicio = time.perf_counter()
+
+    def avance(porcentaje):
+        filas.update(progreso=min(int(porcentaje), 100))
+        if filas.filter(cancelacion_solicitada=True).exists():
+            raise TrabajoCancelado
+
+    try:
+        funcion, extension, tipo_contenido = TAREAS[trabajo.tipo]
+        contenido = funcion(trabajo.parametros, avance)
+        nombre = f"{trabajo_id}.{extension}"
+        directorio = settings.TRANSPORTE_TRABAJOS_DIR
+        directorio.mkdir(parents=True, exist_ok=True)
+        (directorio / nombre).write_bytes(contenido)
+        filas.update(
+            estado=Trabajo.Estado.COMPLETADO,
+            progreso=100,
+            resultado=nombre,
+            tipo_contenido=tipo_contenido,
+            error="",
+            duracion_ejecucion_ms=int((time.perf_counter() - inicio) * 1000),
+            finalizado=timezone.now(),
+        )
+    except TrabajoCancelado:
+        filas.update(estado=Trabajo.Estado.CANCELADO, finalizado=timezone.now())
+        return Trabajo.Estado.CANCELADO
+    except Exception:
+        return _reintentar(
+            trabajo,
+            filas,
+            error=traceback.format_exc(),
+            duracion_ejecucion_ms=int((time.perf_counter() - inicio) * 1000),
+        )
+    return Trabajo.Estado.COMPLETADO
+
+
+def _json(datos) -> bytes:
+    return json.dumps(list(datos), cls=DjangoJSONEncoder, ensure_ascii=False).encode()
+
+
+@tarea("reporte_cargas", "json", "application/json")
+def tarea_reporte_cargas(parametros, avance):
+    return _json(reportes.reporte_cargas())
+
+
+@tarea("reporte_rutas", "json", "application/json")
+def tarea_reporte_rutas(parametros, avance):
+    return _json(reportes.reporte_rutas())
+
+
+@tarea("reporte_utilizacion", "json", "application/json")
+def tarea_reporte_utilizacion(parametros, avance):
+    resultado = utilizacion.calcular(
+        parse_date(parametros["desde"]),
+        parse_date(parametros["hasta"]),
+        parametros.get("periodo"),
+        parametros.get("include_archived", False),
+    )
+    return json.dumps(resultado, cls=DjangoJSONEncoder, ensure_ascii=False).encode()
+
+
+@tarea("reporte_tripulacion", "json", "application/json")
+def tarea_reporte_tripulacion(parametros, avance):
+    resultado = tripulacion.calcular(
+        parse_date(parametros["desde"]),
+        parse_date(parametros["hasta"]),
+        parametros.get("include_archived", False),
+        parametros.get("limite_7d"),
+    )
+    return json.dumps(resultado, cls=DjangoJSONEncoder, ensure_ascii=False).encode()
+
+
+@tarea("exportar_despachos", "csv", "text/csv")
+def tarea_exportar_despachos(parametros, avance):
+    columnas = [
+        "codigo", "fecha", "ruta__codigo", "estado", "vehiculo__patente",
+        "aeronave__matricula", "conductor__run", "piloto__run", "carga_id",
+    ]
+    filtros = {}
+    if parametros.get("estado"):
+        filtros["estado"] = parametros["estado"]
+    if parametros.get("desde"):
+        filtros["fecha__gte"] = parametros["desde"]
+    if parametros.get("hasta"):
+        filtros["fecha__lte"] = parametros["hasta"]
+    consultas = [Despacho.objects.filter(**filtros).order_by("id")]
+    if parametros.get("include_archived"):
+        consultas.append(DespachoArchivado.objects.filter(**filtros).order_by("id"))
+
+    total = sum(consulta.count() for consulta in consultas) or 1
+    filas = itertools.chain.from_iterable(
+        consulta.values_list(*columnas).iterator(chunk_size=2000) for consulta in consultas
+    )
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    escritor.writerow(columnas)
+    for numero, fila in enumerate(filas, 1):
+        escritor.writerow(fila)
+        if numero % 2000 == 0:
+            avance(numero * 100 / total)
+    return salida.getvalue().encode()
@@ -0,0 +1,134 @@
+"""Estado transition log and incremental time-in-state histograms.
+
+Every estado change appends a ``TransicionDespacho`` row. When a despacho
+leaves a state, the time it spent there is added to a log-scaled
+histogram bucket in ``TiempoEstadoRuta`` so percentiles per ruta come
+from a handful of summary rows instead of the raw history.
+"""
+import math
+import time
+from collections import defaultdict
+
+from django.db.models import Max
+from django.dispatch import receiver
+
+from .models import TiempoEstadoRuta, TransicionDespacho
+from .rollups import incrementar
+from .signals import despacho_cambiado, despachos_cambiados
+
+# Cuatro cubetas por potencia de dos: error relativo máximo de ~19 %.
+CUBETAS_POR_OCTAVA = 4
+ESTADOS = {codigo: estado for estado, codigo in TransicionDespacho.CODIGOS.items()}
+
+
+def cubeta(segundos) -> int:
+    return int(math.log2(max(segundos, 0) + 1) * CUBETAS_POR_OCTAVA)
+
+
+def limites(indice):
+    """Return the ``[inferior, superior)`` seconds covered by a bucket."""
+    return (
+        2 ** (indice / CUBETAS_POR_OCTAVA) - 1,
+        2 ** ((indice + 1) / CUBETAS_POR_OCTAVA) - 1,
+    )
+
+
+@receiver(despacho_cambiado)
+def registrar_transicion(sender, antes, despues, **kwargs):
+    registrar_transiciones(sender, [(antes, despues)])
+
+
+@receiver(despachos_cambiados)
+def registrar_transiciones(sender, cambios, **kwargs):
+    """Log the estado changes of ``cambios`` with a fixed number of queries."""
+    cambios = [
+        (antes, despues)
+        for antes, despues in cambios
+        if despues is not None and (antes is None or antes.estado != despues.estado)
+    ]
+    if not cambios:
+        return
+    ahora = int(time.time())
+    codigos = TransicionDespacho.CODIGOS
+    previas = {}
+    ids = [despues.id for antes, despues in cambios if antes is not None]
+    if ids:
+        ultimas = (
+            TransicionDespacho.objects.filter(despacho_id__in=ids)
+            .values("despacho_id")
+            .annotate(ultima=Max("id"))
+            .values("ultima")
+        )
+        previas = {
+            despacho_id: previa
+            for despacho_id, *previa in TransicionDespacho.objects.filter(id__in=ultimas)
+            .values_list("despacho_id", "ruta_id", "hacia", "instante")
+        }
+    tiempos = defaultdict(lambda: [0, 0])
+    for antes, despues in cambios:
+        if antes is not None and despues.id in previas:
+            ruta_id, estado, desde = previas[despues.id]
+            duracion = max(ahora - desde, 0)
+            acumulado = tiempos[(ruta_id, estado, cubeta(duracion))]
+            acumulado[0] += 1
+            acumulado[1] += duracion
+    for (ruta_id, estado, indice), (total, segundos) in tiempos.items():
+        incrementar(
+            TiempoEstadoRuta,
+            {"ruta_id": ruta_id, "estado": estado, "cubeta": indice},
+            total=total,
+            segundos=segundos,
+        )
+    TransicionDespacho.objects.bulk_create([
+        TransicionDespacho(
+            despacho_id=despues.id,
+            ruta_id=despues.ruta_id,
+            desde=codigos[antes.estado if antes else None],
+            hacia=codigos[despues.estado],
+            instante=ahora,
+        )
+        for antes, despues in cambios
+    ])
+
+
+def percentiles(cubetas, cuantiles=(0.5, 0.9, 0.95)):
+    """Estimate quantiles from ``[(cubeta, total), ...]`` sorted by cubeta."""
+    total = sum(cantidad for _, cantidad in cubetas)
+    resultado = {}
+    for cuantil in cuantiles:
+        objetivo = cuantil * total
+        acumulado = 0
+        for indice, cantidad in cubetas:
+            acumulado += cantidad
+            if acumulado >= objetivo:
+                inferior, superior = limites(indice)
+                # Media geométrica de la cubeta, acorde a su escala logarítmica.
+                estimado = math.sqrt((inferior + 1) * (superior + 1)) - 1
+                resultado[f"p{round(cuantil * 100)}"] = round(estimado)
+                break
+    return resultado
+
+
+def resumen(rutas=None):
+    """Time-in-state stats per ruta and estado, read from the summary rows."""
+    filas = TiempoEstadoRuta.objects.filter(total__gt=0).order_by("ruta_id", "estado", "cubeta")
+    if rutas:
+        filas = filas.filter(ruta_id__in=rutas)
+    grupos = {}
+    for ruta_id, estado, indice, total, segundos in filas.values_list(
+        "ruta_id", "estado", "cubeta", "total", "segundos"
+    ):
+        grupo = grupos.setdefault((ruta_id, estado), {"cubetas": [], "total": 0, "segundos": 0})
+        grupo["cubetas"].append((indice, total))
+        grupo["total"] += total
+        grupo["segundos"] += segundos
+    return [
+        {
+            "ruta": ruta_id,
+            "estado": ESTADOS.get(estado),
+            "transiciones": grupo["total"],
+            "promedio_segundos": round(grupo["segundos"] / grupo["total"]),
+            **percentiles(grupo["cubetas"]),
+        }
+        for (ruta_id, estado), grupo in grupos.items()
+    ]
@@ -0,0 +1,118 @@
+"""Crew workload: despachos per conductor and piloto over rolling windows.
+
+One grouped query per role returns ``(persona, fecha, despachos)`` sorted
+by person and date. A single pass then slides a 7- and a 30-day window
+over each person's days, giving the count in the windows ending on
+``hasta`` and the busiest window inside ``[desde, hasta]``. The query
+starts ``max(VENTANAS) - 1`` days before ``desde`` so the first windows
+are complete.
+"""
+import heapq
+from collections import deque
+from datetime import timedelta
+from itertools import groupby
+
+from django.db.models import Count
+
+from .models import Conductor, Despacho, DespachoArchivado, Piloto
+
+VENTANAS = (7, 30)
+# (clave en la respuesta, modelo, columna en Despacho)
+ROLES = (
+    ("conductores", Conductor, "conductor_id"),
+    ("pilotos", Piloto, "piloto_id"),
+)
+
+
+def _dias(modelo, campo, desde, hasta):
+    return (
+        modelo.objects.filter(fecha__range=(desde, hasta), **{f"{campo}__isnull": False})
+        .order_by()
+        .values(campo, "fecha")
+        .annotate(total=Count("id"))
+        .order_by(campo, "fecha")
+        .values_list(campo, "fecha", "total")
+        .iterator(chunk_size=5000)
+    )
+
+
+def ventanas(dias, desde, hasta):
+    """Slide every window over one person's ``(fecha, despachos)`` sorted by date.
+
+    Returns ``{dias_ventana: (actual, maximo, fecha_maximo)}`` and the
+    total inside ``[desde, hasta]``. A window's count only grows on days
+    with despachos, so its maximum is on one of those days or on ``desde``,
+    whose window may still hold the days before the range.
+    """
+    anchos = {ancho: timedelta(days=ancho) for ancho in VENTANAS}
+    colas = {ancho: deque() for ancho in VENTANAS}
+    sumas = dict.fromkeys(VENTANAS, 0)
+    maximos = dict.fromkeys(VENTANAS, (0, None))
+    total = 0
+
+    def cerrar_en_desde():
+        for ancho, cola in colas.items():
+            limite = desde - anchos[ancho]
+            while cola and cola[0][0] <= limite:
+                sumas[ancho] -= cola.popleft()[1]
+            if sumas[ancho] > maximos[ancho][0]:
+                maximos[ancho] = (sumas[ancho], desde)
+
+    en_rango = False
+    for fecha, cantidad in dias:
+        if fecha >= desde:
+            if not en_rango:
+                cerrar_en_desde()
+                en_rango = True
+            total += cantidad
+        for ancho, cola in colas.items():
+            cola.append((fecha, cantidad))
+            sumas[ancho] += cantidad
+            limite = fecha - anchos[ancho]
+            while cola[0][0] <= limite:
+                sumas[ancho] -= cola.popleft()[1]
+            if fecha >= desde and sumas[ancho] > maximos[ancho][0]:
+                maximos[ancho] = (sumas[ancho], fecha)
+    if not en_rango:
+        cerrar_en_desde()
+    resultado = {}
+    for ancho, cola in colas.items():
+        # La ventana que termina en ``hasta`` pierde los días previos a su inicio.
+        limite = hasta - anchos[ancho]
+        actual = sumas[ancho] - sum(cantidad for fecha, cantidad in cola if fecha <= limite)
+        resultado[ancho] = (actual, *maximos[ancho])
+    return resultado, total
+
+
+def calcular(desde, hasta, incluir_archivados=False, limite_7d=None):
+    """Return the workload of every active conductor and piloto (and anyone with despachos)."""
+    inicio = desde - timedelta(days=max(VENTANAS) - 1)
+    modelos = [Despacho, DespachoArchivado] if incluir_archivados else [Despacho]
+    resultado = {"desde": desde, "hasta": hasta, "ventanas": list(VENTANAS)}
+    for nombre, modelo, campo in ROLES:
+        # Cada tabla viene ordenada por persona y fecha: se intercalan sin reordenar.
+        filas = heapq.merge(*(_dias(m, campo, inicio, hasta) for m in modelos))
+        cargas = {}
+        for persona, dias in groupby(filas, key=lambda fila: fila[0]):
+            cargas[persona] = ventanas(
+                ((fecha, cantidad) for _, fecha, cantidad in dias), desde, hasta
+            )
+
+        columnas = ["pk", "nombre", "run"] + (["horas_vuelo"] if modelo is Piloto else [])
+        vacio = ({ancho: (0, 0, None) for ancho in VENTANAS}, 0)
+        filas_respuesta = []
+        for persona in modelo._base_manager.values(*columnas, "activo"):
+            if not persona.pop("activo") and persona["pk"] not in cargas:
+                continue
+            por_ventana, total = cargas.get(persona["pk"], vacio)
+            fila = {"id": persona.pop("pk"), **persona, "despachos": total}
+            for ancho, (actual, maximo, fecha_maximo) in por_ventana.items():
+                fila[f"actual_{ancho}d"] = actual
+                fila[f"max_{ancho}d"] = maximo
+                fila[f"max_{ancho}d_fecha"] = fecha_maximo
+            if limite_7d is not None:
+                fila["sobrecarga"] = fila["max_7d"] > limite_7d
+            filas_respuesta.append(fila)
+        filas_respuesta.sort(key=lambda fila: (-fila["actual_7d"], -fila["actual_30d"], fila["id"]))
+        resultado[nombre] = filas_respuesta
+    return resultado
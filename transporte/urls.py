@@ -7,12 +7,18 @@ from .views import (
     ClienteViewSet,
     ConductorViewSet,
     DespachoViewSet,
+    KpiDespachosView,
     PilotoViewSet,
     ReporteCargasView,
     ReporteRutasView,
     RutaViewSet,
+    TiemposEstadoView,
+    TrabajoViewSet,
+    TripulacionView,
+    UtilizacionView,
     VehiculoViewSet,
     ping,
+    stream_despachos,
 )
 
 router = DefaultRouter()
@@ -24,12 +30,22 @@ router.register("clientes", ClienteViewSet)
 router.register("cargas", CargaViewSet)
 router.register("rutas", RutaViewSet)
 router.register("despachos", DespachoViewSet)
+router.register("trabajos", TrabajoViewSet)
 
 app_name = "transporte"
 
 urlpatterns = [
+    path("despachos/stream/", stream_despachos, name="despachos-stream"),
     path("", include(router.urls)),
     path("ping/", ping, name="ping"),
     path("reportes/cargas/", ReporteCargasView.as_view(), name="reporte-cargas"),
     path("reportes/rutas/", ReporteRutasView.as_view(), name="reporte-rutas"),
+    path(
+        "reportes/utilizacion/", UtilizacionView.as_view(), name="reporte-utilizacion"
+    ),
+    path(
+        "reportes/tripulacion/", TripulacionView.as_view(), name="reporte-tripulacion"
+    ),
+    path("kpis/despachos/", KpiDespachosView.as_view(), name="kpi-despachos"),
+    path("kpis/tiempos-estado/", TiemposEstadoView.as_view(), name="kpi-tiempos-estado"),
 ]
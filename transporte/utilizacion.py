@@ -0,0 +1,125 @@
+"""Fleet capacity utilization: ``Carga.peso_kg`` over the capacity used.
+
+Each despacho contributes ``peso / capacidad`` for its vehiculo, its
+aeronave and its ruta (which uses the vehiculo capacity, or the aeronave
+one when the route's ``tipo_transporte`` is AEREO, whatever else is set). The joined columns come from a single query per
+table streamed through a raw cursor in batches and are grouped in one
+pass; the period start is computed once per distinct date.
+"""
+import math
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.db import connections
+
+from .models import Aeronave, Despacho, DespachoArchivado, Ruta, Vehiculo
+
+AEREO = Ruta.TipoTransporte.AEREO.value
+CUANTILES = (0.5, 0.9, 0.95)
+LOTE = 10000
+PERIODOS = ("dia", "semana", "mes")
+# (clave en la respuesta, modelo, columna con la etiqueta)
+RECURSOS = (
+    ("vehiculos", Vehiculo, "patente"),
+    ("aeronaves", Aeronave, "matricula"),
+    ("rutas", Ruta, "codigo"),
+)
+
+
+def _lotes(modelo, desde, hasta):
+    """Yield row batches of the despacho columns unpacked in ``_agregar``."""
+    consulta = (
+        modelo.objects.filter(fecha__range=(desde, hasta))
+        .order_by()
+        .values_list(
+            "vehiculo_id", "aeronave_id", "ruta_id", "ruta__tipo_transporte", "fecha",
+            "carga__peso_kg",
+            "vehiculo__capacidad_kg", "aeronave__capacidad_kg",
+        )
+    )
+    sql, params = consulta.query.sql_with_params()
+    # Cursor directo: sin conversores de Django por fila. El período se
+    # calcula después; TruncWeek/TruncMonth en SQLite son funciones Python.
+    with connections[consulta.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        while lote := cursor.fetchmany(LOTE):
+            yield lote
+
+
+def _inicio_periodo(fecha, periodo):
+    if periodo == "semana":
+        return fecha - timedelta(days=fecha.weekday())
+    if periodo == "mes":
+        return fecha.replace(day=1)
+    return fecha
+
+
+def _percentil(ordenados, cuantil):
+    posicion = cuantil * (len(ordenados) - 1)
+    bajo = math.floor(posicion)
+    alto = min(bajo + 1, len(ordenados) - 1)
+    return ordenados[bajo] + (ordenados[alto] - ordenados[bajo]) * (posicion - bajo)
+
+
+def _agregar(lotes, periodo):
+    """Group the ratios in one pass; sort each group once for its percentiles."""
+    grupos = {nombre: defaultdict(list) for nombre, _, _ in RECURSOS}
+    inicios = {}
+    filas = (fila for lote in lotes for fila in lote)
+    for vehiculo, aeronave, ruta, tipo, fecha, peso, cap_vehiculo, cap_aeronave in filas:
+        if peso is None:
+            continue
+        inicio = None
+        if periodo:
+            inicio = inicios.get(fecha)
+            if inicio is None:
+                inicio = inicios[fecha] = _inicio_periodo(fecha, periodo)
+        if vehiculo is not None and cap_vehiculo:
+            grupos["vehiculos"][(vehiculo, inicio)].append(peso / cap_vehiculo)
+        if aeronave is not None and cap_aeronave:
+            grupos["aeronaves"][(aeronave, inicio)].append(peso / cap_aeronave)
+        capacidad = cap_aeronave if tipo == AEREO else cap_vehiculo
+        if capacidad:
+            grupos["rutas"][(ruta, inicio)].append(peso / capacidad)
+    resultado = {}
+    for nombre, grupo in grupos.items():
+        resultado[nombre] = []
+        for (recurso, inicio), valores in grupo.items():
+            valores.sort()
+            resultado[nombre].append((
+                recurso, inicio, len(valores), sum(valores) / len(valores),
+                [_percentil(valores, cuantil) for cuantil in CUANTILES],
+            ))
+    return resultado
+
+
+def calcular(desde, hasta, periodo=None, incluir_archivados=False):
+    """Return utilization per vehiculo, aeronave and ruta (and period, if given)."""
+    modelos = [Despacho, DespachoArchivado] if incluir_archivados else [Despacho]
+    lotes = (lote for modelo in modelos for lote in _lotes(modelo, desde, hasta))
+    grupos = _agregar(lotes, periodo)
+
+    resultado = {"desde": desde, "hasta": hasta, "periodo": periodo}
+    for nombre, modelo, etiqueta in RECURSOS:
+        nombres = dict(
+            modelo._base_manager.filter(pk__in={recurso for recurso, *_ in grupos[nombre]})
+            .values_list("pk", etiqueta)
+        )
+        resultado[nombre] = sorted(
+            (
+                {
+                    "id": recurso,
+                    "nombre": nombres.get(recurso),
+                    "periodo": inicio,
+                    "despachos": cantidad,
+                    "promedio": round(promedio * 100, 1),
+                    **{
+                        f"p{round(cuantil * 100)}": round(valor * 100, 1)
+                        for cuantil, valor in zip(CUANTILES, valores)
+                    },
+                }
+                for recurso, inicio, cantidad, promedio, valores in grupos[nombre]
+            ),
+            key=lambda fila: (fila["id"], fila["periodo"] or date.min),
+        )
+    return resultado
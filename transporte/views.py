@@ -1,20 +1,32 @@
+from collections import Counter
+
 from django.contrib import messages
 from django.contrib.auth import login as auth_login
 from django.contrib.auth import logout as auth_logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import AuthenticationForm
-from django.http import HttpResponseRedirect
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
-from django.db.models import Count, Sum
-from rest_framework import filters, permissions, viewsets
-from rest_framework.decorators import api_view
+from django.db.models import Count, Exists, F, OuterRef, Prefetch, Q, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils.http import parse_etags
+from rest_framework import filters, mixins, permissions, status, viewsets
+from rest_framework.decorators import action, api_view
+from rest_framework.exceptions import APIException, AuthenticationFailed, ValidationError
+from rest_framework.pagination import replace_query_param
 from rest_framework.permissions import BasePermission, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
 
 
+from . import archivo, columnar, fragmentos, reportes, trabajos, transiciones, tripulacion, utilizacion
+from .authentication import CachedJWTAuthentication
+from .eventos import obtener_hub
 from .forms import (
     AeronaveForm,
     CargaForm,
@@ -30,21 +42,34 @@ from .models import (
     Carga,
     Cliente,
     Conductor,
+    ConflictoVersion,
     Despacho,
+    DespachoArchivado,
+    DespachoDiario,
     Piloto,
     Ruta,
+    Trabajo,
     Vehiculo,
 )
+from .renderers import ColumnarJSONRenderer, MessagePackRenderer
 from .serializers import (
     AeronaveSerializer,
+    CargaHistorialSerializer,
     CargaSerializer,
     ClienteSerializer,
     ConductorSerializer,
     DespachoSerializer,
+    HistorialClienteParametrosSerializer,
+    KpiDespachosParametrosSerializer,
     PilotoSerializer,
     RutaSerializer,
+    TrabajoSerializer,
+    TransicionDespachosSerializer,
+    TripulacionParametrosSerializer,
+    UtilizacionParametrosSerializer,
     VehiculoSerializer,
 )
+from .throttling import DescargaMixin
 
 from .filters import (
     VehiculoFilter, AeronaveFilter, ConductorFilter, PilotoFilter,
@@ -151,6 +176,10 @@ def home(request):
                 ("piloto", "Piloto"), ("carga", "Carga"), ("estado", "Estado"),
             ],
             "filterset_class": DespachoFilter,
+            "archive_model": DespachoArchivado,
+            "transiciones": [
+                (estado, Despacho.Estado(estado).label) for estado in Despacho.TRANSICIONES
+            ],
         },
     }
 
@@ -163,21 +192,10 @@ def home(request):
         
     current_view_mode = request.GET.get("view", "list") # 'list' por defecto
     current_edit_pk = request.GET.get("pk")
+    action = None
 
     search_query = request.GET.get('q', '')
 
-    def _format_value(instance, field_name):
-        display_method = getattr(instance, f"get_{field_name}_display", None)
-        if callable(display_method):
-            value = display_method()
-        else:
-            value = getattr(instance, field_name)
-        if value is None or value == "":
-            return "—"
-        if isinstance(value, bool):
-            return "Sí" if value else "No"
-        return str(value)
-
     module_contexts = {}
     
     # 2. Procesar la lógica POST (Crear, Actualizar, Borrar)
@@ -208,18 +226,77 @@ def home(request):
             messages.success(request, f"{config['label']} — registro eliminado correctamente.")
             return HttpResponseRedirect(redirect_url)
 
+        if action == "transicion" and config.get("transiciones"):
+            # Cambio de estado en bloque sobre el listado filtrado actual.
+            estado = request.POST.get("estado")
+            if estado not in dict(config["transiciones"]):
+                messages.error(request, "El estado de destino no es válido.")
+                return HttpResponseRedirect(redirect_url)
+            filtro = config["filterset_class"](request.GET, queryset=config["model"].objects.all())
+            if not filtro.filtrado:
+                messages.error(
+                    request, "Filtra el listado antes de cambiar estados en bloque."
+                )
+                return HttpResponseRedirect(redirect_url)
+            total = filtro.qs.count()
+            if total > config["model"].TRANSICION_MAXIMA:
+                messages.error(
+                    request,
+                    f"El filtro abarca {total} registros; el máximo por cambio en bloque es "
+                    f"{config['model'].TRANSICION_MAXIMA}. Acota el filtro.",
+                )
+                return HttpResponseRedirect(redirect_url)
+            resumen = Counter(resultado for resultado, _ in filtro.qs.transicionar(estado).values())
+            messages.success(
+                request,
+                f"{config['label']} — {resumen['actualizado']} pasado(s) a "
+                f"«{dict(config['transiciones'])[estado]}», {resumen['sin_cambio']} ya lo estaban, "
+                f"{resumen['invalido'] + resumen['conflicto']} sin transición permitida.",
+            )
+            return HttpResponseRedirect(redirect_url)
+
         instance = None
         if action == "update":
             pk = request.POST.get("pk")
             instance = get_object_or_404(config["model"], pk=pk)
+            # Versión con la que se abrió el formulario: el guardado la exige.
+            version = request.POST.get("version", "")
+            if version.isdigit():
+                instance.version = int(version)
 
         form = config["form_class"](request.POST, instance=instance)
 
+        conflicto = None
         if form.is_valid():
-            form.save()
-            verb = "actualizado" if action == "update" else "creado"
-            messages.success(request, f"{config['label']} — registro {verb} correctamente.")
+            try:
+                form.save()
+            except ConflictoVersion as error:
+                conflicto = error
+            else:
+                verb = "actualizado" if action == "update" else "creado"
+                messages.success(request, f"{config['label']} — registro {verb} correctamente.")
+                return HttpResponseRedirect(redirect_url)
+
+        if conflicto is not None and conflicto.actual is None:
+            messages.error(
+                request,
+                f"{config['label']} — otro usuario eliminó el registro mientras lo editabas.",
+            )
             return HttpResponseRedirect(redirect_url)
+        if conflicto is not None:
+            # Se muestran los valores enviados con la versión actual: guardar
+            # de nuevo sobrescribe los cambios del otro usuario a sabiendas.
+            instance.version = conflicto.actual
+            form.add_error(
+                None,
+                "Otro usuario modificó este registro mientras lo editabas; tus cambios no "
+                "se guardaron. Revisa el listado y vuelve a guardar para sobrescribirlos.",
+            )
+            module_contexts['failed_edit_form'] = form
+            module_contexts['failed_edit_instance'] = instance
+            current_view_mode = 'edit'
+            current_edit_pk = instance.pk
+            messages.error(request, f"{config['label']} — conflicto de edición, no se guardó.")
         else:
             # Si el formulario NO es válido, el POST falla.
             # Guardamos el formulario con errores para mostrarlo.
@@ -236,9 +313,11 @@ def home(request):
             
             messages.error(request, "Error al guardar, por favor revisa los campos.")
 
-    # 3. Construir el contexto para TODOS los módulos (para GET y POST fallidos)
+    # 3. Construir el contexto del módulo activo (para GET y POST fallidos)
     for key, config in module_config.items():
-        
+        if key != requested_module_key:
+            continue
+
         # Filtrar el queryset
         instances_qs = config["model"].objects.all()
         filter_form = None
@@ -247,7 +326,16 @@ def home(request):
             instances_qs = filter_form.qs
 
         instances = instances_qs
-        
+        filtrado = filter_form is not None and filter_form.filtrado
+        # Con algún filtro inválido, qs aplica solo los válidos: tampoco es la tabla completa.
+        completa = not filtrado and (filter_form is None or filter_form.is_valid())
+        if config.get("archive_model") and archivo.incluye_archivados(request):
+            # Modo explícito: se agrega la tabla de archivo a la consulta.
+            archived_qs = config["archive_model"].objects.all()
+            if filter_form is not None:
+                archived_qs = config["filterset_class"](request.GET, queryset=archived_qs).qs
+            instances = archivo.combinar(instances_qs, archived_qs)
+
         # Determinar el modo de visualización final
         display_mode = 'list' # Por defecto
         create_form_instance = config["form_class"]() # Formulario 'create' limpio
@@ -276,23 +364,26 @@ def home(request):
                         messages.error(request, "El registro a editar no fue encontrado.")
                         display_mode = 'list' # Volver a la lista si hay error
 
+        # Filas servidas desde la caché de fragmentos; la tabla completa solo sin filtros.
+        table_html, total = fragmentos.tabla(
+            {"key": key, "label": config["label"]},
+            config,
+            instances,
+            cacheable=completa and not isinstance(instances, list),
+        )
+
         module_contexts[key] = {
             "key": key,
             "label": config["label"],
             "singular_label": config["singular_label"],
             "headers": [label for _, label in config["fields"]],
-            "rows": [
-                {
-                    "pk": instance.pk,
-                    "values": [
-                        _format_value(instance, field_name)
-                        for field_name, _ in config["fields"]
-                    ],
-                }
-                for instance in instances
-            ],
-            "total": instances.count(),
+            "table_html": table_html,
+            "total": total,
             "filter_form": filter_form,
+            "has_archive": "archive_model" in config,
+            "transiciones": config.get("transiciones"),
+            "filtrado": filtrado,
+            "include_archived": archivo.incluye_archivados(request),
             
             "display_mode": display_mode, # 'list', 'create', o 'edit'
             "create_form": create_form_instance, # Siempre hay un form 'create'
@@ -318,6 +409,37 @@ def home(request):
     )
 
 
+AUTOCOMPLETE_MODELS = {
+    "vehiculos": Vehiculo.objects.all(),
+    "aeronaves": Aeronave.objects.all(),
+    "conductores": Conductor.objects.all(),
+    "pilotos": Piloto.objects.all(),
+    "clientes": Cliente.objects.all(),
+    "cargas": Carga.objects.select_related("cliente"),
+    "rutas": Ruta.objects.all(),
+}
+
+
+@login_required(login_url="login")
+def autocompletar(request, modulo):
+    """Return up to ``limite`` options whose normalized key starts with ``q``."""
+
+    queryset = AUTOCOMPLETE_MODELS.get(modulo)
+    if queryset is None:
+        raise Http404("Módulo sin autocompletado.")
+    try:
+        limite = min(max(int(request.GET.get("limite", 20)), 1), 50)
+    except ValueError:
+        limite = 20
+    resultados = queryset.model.buscar_por_prefijo(request.GET.get("q", ""), queryset)
+    return JsonResponse({
+        "resultados": [
+            {"id": instance.pk, "texto": str(instance)}
+            for instance in resultados[:limite]
+        ]
+    })
+
+
 def login_view(request):
     """Handle user authentication for the management panel."""
 
@@ -365,7 +487,124 @@ class IsAuthenticatedForWrite(BasePermission):
         return request.user and request.user.is_authenticated
 
 
-class VehiculoViewSet(viewsets.ModelViewSet):
+class VersionNoCoincide(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = "El registro cambió desde la versión indicada en If-Match."
+    default_code = "version_no_coincide"
+
+    def __init__(self, version):
+        super().__init__()
+        self.version = version
+
+
+class ConflictoEdicion(VersionNoCoincide):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Otro usuario modificó el registro mientras se guardaba; vuelve a leerlo."
+    default_code = "conflicto_version"
+
+
+class VersionadoMixin:
+    """Optimistic concurrency for ``ModeloVersionado`` rows.
+
+    Single-row responses carry the row version as a strong ``ETag``.
+    Updates and deletes may send it back in ``If-Match``; a different
+    version answers 412 without writing. The UPDATE itself only matches
+    the version read by this request, so a write that lands in between
+    answers 412 with ``If-Match`` and 409 without it. Both carry the
+    current version in the body and the ``ETag``.
+    """
+
+    def versiones_if_match(self):
+        """Versions listed in ``If-Match``, or None when absent or ``*``."""
+        cabecera = self.request.headers.get("If-Match")
+        if cabecera is None:
+            return None
+        etiquetas = parse_etags(cabecera)
+        if etiquetas == ["*"]:
+            return None
+        # If-Match compara en forma estricta: las etiquetas débiles no coinciden.
+        return {etiqueta.strip('"') for etiqueta in etiquetas if not etiqueta.startswith("W/")}
+
+    def get_object(self):
+        instancia = super().get_object()
+        versiones = self.versiones_if_match()
+        if (
+            self.action in ("update", "partial_update", "destroy")
+            and versiones is not None
+            and str(instancia.version) not in versiones
+        ):
+            raise VersionNoCoincide(instancia.version)
+        return instancia
+
+    def perform_update(self, serializer):
+        try:
+            super().perform_update(serializer)
+        except ConflictoVersion as error:
+            if error.actual is None:
+                raise Http404
+            excepcion = ConflictoEdicion if self.versiones_if_match() is None else VersionNoCoincide
+            raise excepcion(error.actual)
+
+    def handle_exception(self, exc):
+        response = super().handle_exception(exc)
+        if isinstance(exc, VersionNoCoincide):
+            response.data["version"] = exc.version
+            response["ETag"] = f'"{exc.version}"'
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if (
+            self.action in ("retrieve", "create", "update", "partial_update")
+            and response.status_code < 300
+            and isinstance(response.data, dict)
+            and "version" in response.data
+        ):
+            response["ETag"] = f'"{response.data["version"]}"'
+        return response
+
+
+class ColumnarMixin:
+    """Let list views answer in the columnar JSON or MessagePack formats.
+
+    Clients opt in with ``Accept: application/vnd.logistica.columnas+json``,
+    ``Accept: application/msgpack`` or ``?format=columnas|msgpack``.
+    """
+
+    renderer_classes = [
+        *api_settings.DEFAULT_RENDERER_CLASSES, ColumnarJSONRenderer, MessagePackRenderer,
+    ]
+
+    def es_columnar(self, request):
+        return request.accepted_renderer.format in columnar.FORMATOS
+
+    def list(self, request, *args, **kwargs):
+        if not self.es_columnar(request):
+            return super().list(request, *args, **kwargs)
+        columnas = columnar.columnas(self.get_serializer())
+        filas = self.filas_columnares([columna.lookup for columna in columnas])
+        datos = columnar.tabla(filas, columnas)
+        if self.paginator is not None:
+            datos.update(self.paginator.enlaces())
+        return Response(datos)
+
+    def filas_columnares(self, campos):
+        return self.paginar_filas(
+            [self.filter_queryset(self.get_queryset())],
+            campos,
+            lambda queryset, columnas, limite: queryset.values_list(*columnas)[:limite],
+        )
+
+    def paginar_filas(self, consultas, campos, obtener):
+        """Fetch one page of ``campos`` tuples, or every row if pagination is off."""
+        if self.paginator is not None:
+            filas = self.paginator.paginar_valores(consultas, campos, obtener, self.request, self)
+            if filas is not None:
+                return filas
+        return obtener(*consultas, campos, None)
+
+
+class VehiculoViewSet(VersionadoMixin, ColumnarMixin, viewsets.ModelViewSet):
     queryset = Vehiculo.objects.all()
     serializer_class = VehiculoSerializer
     permission_classes = [IsAuthenticatedForWrite]
@@ -374,7 +613,7 @@ class VehiculoViewSet(viewsets.ModelViewSet):
     ordering_fields = ["patente", "marca", "modelo", "capacidad_kg", "anio"]
 
 
-class AeronaveViewSet(viewsets.ModelViewSet):
+class AeronaveViewSet(VersionadoMixin, ColumnarMixin, viewsets.ModelViewSet):
     queryset = Aeronave.objects.all()
     serializer_class = AeronaveSerializer
     permission_classes = [IsAuthenticatedForWrite]
@@ -383,7 +622,7 @@ class AeronaveViewSet(viewsets.ModelViewSet):
     ordering_fields = ["matricula", "fabricante", "modelo", "capacidad_kg"]
 
 
-class ConductorViewSet(viewsets.ModelViewSet):
+class ConductorViewSet(VersionadoMixin, ColumnarMixin, viewsets.ModelViewSet):
     queryset = Conductor.objects.all()
     serializer_class = ConductorSerializer
     permission_classes = [permissions.IsAdminUser]
@@ -392,7 +631,7 @@ class ConductorViewSet(viewsets.ModelViewSet):
     ordering_fields = ["run", "nombre", "licencia", "activo"]
 
 
-class PilotoViewSet(viewsets.ModelViewSet):
+class PilotoViewSet(VersionadoMixin, ColumnarMixin, viewsets.ModelViewSet):
     queryset = Piloto.objects.all()
     serializer_class = PilotoSerializer
     permission_classes = [permissions.IsAdminUser]
@@ -401,7 +640,7 @@ class PilotoViewSet(viewsets.ModelViewSet):
     ordering_fields = ["run", "nombre", "licencia", "horas_vuelo", "activo"]
 
 
-class ClienteViewSet(viewsets.ModelViewSet):
+class ClienteViewSet(VersionadoMixin, ColumnarMixin, viewsets.ModelViewSet):
     queryset = Cliente.objects.all()
     serializer_class = ClienteSerializer
     permission_classes = [IsAuthenticatedForWrite]
@@ -409,26 +648,111 @@ class ClienteViewSet(viewsets.ModelViewSet):
     search_fields = ["nombre", "rut"]
     ordering_fields = ["nombre", "rut", "telefono"]
 
+    @action(
+        detail=True,
+        permission_classes=[IsAuthenticated],
+        serializer_class=HistorialClienteParametrosSerializer,
+    )
+    def historial(self, request, pk=None):
+        """The cliente, a page of its cargas and each carga's latest despachos.
+
+        ``desde``, ``hasta`` and ``estado`` filter the despachos and keep only
+        the cargas with at least one match. Four queries regardless of size:
+        cliente, count, the page of cargas with their despacho totals, and
+        the despachos of the whole page.
+        """
+        cliente = self.get_object()
+        parametros = self.get_serializer(data=request.query_params)
+        parametros.is_valid(raise_exception=True)
+        datos = parametros.validated_data
+        campos = {"desde": "fecha__gte", "hasta": "fecha__lte", "estado": "estado"}
+        filtro = {campo: datos[clave] for clave, campo in campos.items() if datos.get(clave)}
 
-class CargaViewSet(viewsets.ModelViewSet):
+        cargas = Carga.objects.filter(cliente=cliente)
+        if filtro:
+            cargas = cargas.filter(
+                Exists(Despacho.objects.filter(carga=OuterRef("pk"), **filtro))
+            )
+        total = cargas.count()
+        pagina, por_pagina = datos["pagina"], datos["por_pagina"]
+        inicio = (pagina - 1) * por_pagina
+        despachos = (
+            Despacho.objects.filter(**filtro)
+            .select_related(
+                "ruta__origen", "ruta__destino", "vehiculo", "aeronave", "conductor", "piloto"
+            )
+            .order_by("-fecha", "-id")
+        )
+        cargas = (
+            cargas.annotate(
+                despachos_total=Count(
+                    "despacho",
+                    filter=Q(**{f"despacho__{campo}": valor for campo, valor in filtro.items()}),
+                )
+            )
+            .order_by("-id")
+            .prefetch_related(Prefetch(
+                "despacho_set",
+                # Un slice en el Prefetch limita cada carga con ROW_NUMBER() en una consulta.
+                queryset=despachos[: datos["despachos_por_carga"]],
+                to_attr="despachos_historial",
+            ))[inicio : inicio + por_pagina]
+        )
+
+        url = request.build_absolute_uri()
+        return Response({
+            "cliente": ClienteSerializer(cliente).data,
+            "cargas": {
+                "total": total,
+                "pagina": pagina,
+                "por_pagina": por_pagina,
+                "siguiente": (
+                    replace_query_param(url, "pagina", pagina + 1)
+                    if inicio + por_pagina < total else None
+                ),
+                "anterior": replace_query_param(url, "pagina", pagina - 1) if pagina > 1 else None,
+                "resultados": CargaHistorialSerializer(cargas, many=True).data,
+            },
+        })
+
+
+class CargaViewSet(VersionadoMixin, ColumnarMixin, viewsets.ModelViewSet):
     queryset = Carga.objects.select_related("cliente")
     serializer_class = CargaSerializer
     permission_classes = [IsAuthenticatedForWrite]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ["descripcion", "tipo", "cliente__nombre", "cliente__rut"]
     ordering_fields = ["descripcion", "peso_kg", "tipo", "valor_estimado"]
+    max_page_size = 200
+
+
+class OrdenamientoConAlias(filters.OrderingFilter):
+    """``OrderingFilter`` that also accepts the view's ``ordering_aliases``.
 
+    Keeps ``?ordering=origen`` working after a column moved to a related
+    table (``{"origen": "origen__nombre"}``).
+    """
 
-class RutaViewSet(viewsets.ModelViewSet):
+    def remove_invalid_fields(self, queryset, fields, view, request):
+        alias = getattr(view, "ordering_aliases", {})
+        traducidos = []
+        for campo in fields:
+            signo, nombre = ("-", campo[1:]) if campo.startswith("-") else ("", campo)
+            traducidos.append(signo + alias.get(nombre, nombre))
+        return super().remove_invalid_fields(queryset, traducidos, view, request)
+
+
+class RutaViewSet(VersionadoMixin, ColumnarMixin, viewsets.ModelViewSet):
     queryset = Ruta.objects.all()
     serializer_class = RutaSerializer
     permission_classes = [IsAuthenticatedForWrite]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ["codigo", "origen", "destino"]
-    ordering_fields = ["codigo", "origen", "destino", "duracion_estimada_min"]
+    filter_backends = [filters.SearchFilter, OrdenamientoConAlias]
+    search_fields = ["codigo", "origen__nombre", "destino__nombre"]
+    ordering_fields = ["codigo", "origen__nombre", "destino__nombre", "duracion_estimada_min"]
+    ordering_aliases = {"origen": "origen__nombre", "destino": "destino__nombre"}
 
 
-class DespachoViewSet(viewsets.ModelViewSet):
+class DespachoViewSet(VersionadoMixin, ColumnarMixin, viewsets.ModelViewSet):
     queryset = Despacho.objects.select_related(
         "ruta",
         "vehiculo",
@@ -442,29 +766,343 @@ class DespachoViewSet(viewsets.ModelViewSet):
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ["codigo", "estado", "ruta__codigo"]
     ordering_fields = ["codigo", "fecha", "estado", "ruta__codigo"]
+    throttle_scope = "despachos"
+    max_page_size = 200
 
+    def list(self, request, *args, **kwargs):
+        if not archivo.incluye_archivados(request) or self.es_columnar(request):
+            return super().list(request, *args, **kwargs)
+        consultas = [
+            self.filter_queryset(self.get_queryset()),
+            self.filter_queryset(DespachoArchivado.objects.all()),
+        ]
+        if self.paginator is not None:
+            despachos = self.paginator.paginar(consultas, archivo.combinar, request, self)
+            if despachos is not None:
+                return self.get_paginated_response(self.get_serializer(despachos, many=True).data)
+        despachos = archivo.combinar(*consultas)
+        return Response(self.get_serializer(despachos, many=True).data)
 
-class ReporteCargasView(APIView):
+    def filas_columnares(self, campos):
+        if not archivo.incluye_archivados(self.request):
+            return super().filas_columnares(campos)
+        return self.paginar_filas(
+            [
+                self.filter_queryset(self.get_queryset()),
+                self.filter_queryset(DespachoArchivado.objects.all()),
+            ],
+            campos,
+            archivo.combinar_filas,
+        )
+
+    @action(detail=False, methods=["post"], serializer_class=TransicionDespachosSerializer)
+    def transicion(self, request):
+        """Move many despachos to ``estado`` at once and report the result per id."""
+        parametros = self.get_serializer(data=request.data)
+        parametros.is_valid(raise_exception=True)
+        datos = parametros.validated_data
+        if "ids" in datos:
+            despachos = Despacho.objects.filter(pk__in=datos["ids"])
+        else:
+            filtro = DespachoFilter(datos["filtro"], queryset=Despacho.objects.all())
+            if not filtro.is_valid():
+                raise ValidationError(filtro.errors)
+            if not filtro.filtrado:
+                # Un filtro vacío abarcaría la tabla completa.
+                raise ValidationError({"filtro": ["Indica al menos un filtro con valor."]})
+            despachos = filtro.qs
+            total = despachos.count()
+            if total > Despacho.TRANSICION_MAXIMA:
+                raise ValidationError({"filtro": [
+                    f"El filtro abarca {total} despachos; el máximo por solicitud es "
+                    f"{Despacho.TRANSICION_MAXIMA}. Acótalo o envía 'ids'."
+                ]})
+        resultados = despachos.transicionar(datos["estado"])
+        for pk in datos.get("ids", ()):
+            resultados.setdefault(pk, ("no_encontrado", None))
+        return Response({
+            "estado": datos["estado"],
+            "resumen": Counter(resultado for resultado, _ in resultados.values()),
+            "resultados": [
+                {"id": pk, "resultado": resultado, "estado": estado}
+                for pk, (resultado, estado) in sorted(resultados.items())
+            ],
+        })
+
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            if self.action != "retrieve" or not archivo.incluye_archivados(self.request):
+                raise
+            return get_object_or_404(DespachoArchivado, pk=self.kwargs["pk"])
+
+
+class EncolableMixin:
+    """Run the report in the job queue when the request carries ``?async=1``.
+
+    Synchronous runs cost ``costo_sincrono`` tokens of the ``reportes``
+    throttle bucket; enqueueing costs one.
+    """
+
+    tipo_trabajo = None
+    throttle_scope = "reportes"
+    costo_sincrono = 5
+
+    def throttle_cost(self, request):
+        return 1 if request.query_params.get("async") == "1" else self.costo_sincrono
+
+    def encolar(self, request, parametros=None):
+        trabajo = trabajos.encolar(self.tipo_trabajo, parametros, usuario=request.user)
+        url = reverse("transporte:trabajo-detail", args=[trabajo.pk])
+        return Response(
+            TrabajoSerializer(trabajo).data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={"Location": url},
+        )
+
+
+class ReporteCargasView(DescargaMixin, EncolableMixin, APIView):
+    permission_classes = [IsAuthenticated]
+    tipo_trabajo = "reporte_cargas"
+
+    def get(self, request):
+        if request.query_params.get("async") == "1":
+            return self.encolar(request)
+        return Response(reportes.reporte_cargas())
+
+
+class ReporteRutasView(DescargaMixin, EncolableMixin, APIView):
+    permission_classes = [IsAuthenticated]
+    tipo_trabajo = "reporte_rutas"
+
+    def get(self, request):
+        if request.query_params.get("async") == "1":
+            return self.encolar(request)
+        return Response(reportes.reporte_rutas())
+
+
+class UtilizacionView(DescargaMixin, EncolableMixin, APIView):
+    """Capacity utilization (peso / capacidad) per vehiculo, aeronave and ruta."""
+
+    permission_classes = [IsAuthenticated]
+    tipo_trabajo = "reporte_utilizacion"
+
+    def get(self, request):
+        parametros = UtilizacionParametrosSerializer(data=request.query_params)
+        parametros.is_valid(raise_exception=True)
+        if request.query_params.get("async") == "1":
+            return self.encolar(request, dict(parametros.data))
+        datos = parametros.validated_data
+        return Response(utilizacion.calcular(
+            datos["desde"], datos["hasta"], datos.get("periodo"), datos["include_archived"]
+        ))
+
+
+class TripulacionView(DescargaMixin, EncolableMixin, APIView):
+    """Despachos per conductor and piloto in rolling 7- and 30-day windows."""
+
+    permission_classes = [IsAuthenticated]
+    tipo_trabajo = "reporte_tripulacion"
+
+    def get(self, request):
+        parametros = TripulacionParametrosSerializer(data=request.query_params)
+        parametros.is_valid(raise_exception=True)
+        if request.query_params.get("async") == "1":
+            return self.encolar(request, dict(parametros.data))
+        datos = parametros.validated_data
+        return Response(tripulacion.calcular(
+            datos["desde"], datos["hasta"], datos["include_archived"], datos.get("limite_7d")
+        ))
+
+
+class TrabajoViewSet(
+    DescargaMixin,
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.ListModelMixin,
+    viewsets.GenericViewSet,
+):
+    """Enqueue background jobs and poll their status, progress and result."""
+
+    queryset = Trabajo.objects.order_by("-id")
+    serializer_class = TrabajoSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = "trabajos"
+    max_page_size = 100
+    # Consultar el estado de un trabajo no se rechaza aunque la cola esté llena.
+    metodos_descarga = ("POST",)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if getattr(self, "swagger_fake_view", False):
+            return queryset
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(creado_por=self.request.user)
+        return queryset
+
+    def perform_create(self, serializer):
+        serializer.save(creado_por=self.request.user)
+
+    @action(detail=True, methods=["post"])
+    def cancelar(self, request, pk=None):
+        trabajo = self.get_object()
+        if not trabajos.cancelar(trabajo):
+            return Response(
+                {"detail": f"El trabajo ya está {trabajo.get_estado_display().lower()}."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        trabajo.refresh_from_db()
+        return Response(self.get_serializer(trabajo).data)
+
+    @action(detail=True)
+    def resultado(self, request, pk=None):
+        trabajo = self.get_object()
+        if trabajo.estado != Trabajo.Estado.COMPLETADO:
+            return Response(
+                {"detail": "El resultado aún no está disponible."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        ruta = trabajos.ruta_resultado(trabajo)
+        try:
+            archivo_resultado = ruta.open("rb")
+        except FileNotFoundError:
+            return Response(
+                {"detail": "El archivo del resultado ya no existe."},
+                status=status.HTTP_410_GONE,
+            )
+        return FileResponse(
+            archivo_resultado,
+            as_attachment=True,
+            filename=f"{trabajo.tipo}-{trabajo.pk}{ruta.suffix}",
+            content_type=trabajo.tipo_contenido,
+        )
+
+
+class KpiDespachosView(DescargaMixin, APIView):
+    """Time-bucketed despacho counts served from the daily rollup table."""
+
+    permission_classes = [IsAuthenticated]
+    throttle_scope = "reportes"
+    inicio_periodo = {
+        "dia": F("fecha"),
+        "semana": TruncWeek("fecha"),
+        "mes": TruncMonth("fecha"),
+    }
+    columnas_dimension = {
+        "estado": "estado",
+        "tipo_transporte": "ruta__tipo_transporte",
+        "ruta": "ruta__codigo",
+    }
 
     def get(self, request):
-        data = (
-            Carga.objects
-            .values("cliente__nombre")
-            .annotate(total_peso=Sum("peso_kg"))
-            .order_by("-total_peso")
+        parametros = KpiDespachosParametrosSerializer(data=request.query_params)
+        parametros.is_valid(raise_exception=True)
+        datos = parametros.validated_data
+        desde, hasta = datos["desde"], datos["hasta"]
+        periodo = datos["periodo"]
+        dimension = datos.get("dimension")
+
+        columnas = ["inicio"]
+        if dimension:
+            columnas.append(self.columnas_dimension[dimension])
+        filas = (
+            DespachoDiario.objects
+            .filter(fecha__range=(desde, hasta))
+            .exclude(total=0)
+            .annotate(inicio=self.inicio_periodo[periodo])
+            .values(*columnas)
+            .annotate(total=Sum("total"))
+            .order_by(*columnas)
         )
-        return Response(data)
+
+        series = {}
+        for fila in filas:
+            clave = fila[columnas[-1]] if dimension else "total"
+            series.setdefault(clave, []).append(
+                {"inicio": fila["inicio"], "total": fila["total"]}
+            )
+        return Response({
+            "desde": desde,
+            "hasta": hasta,
+            "periodo": periodo,
+            "dimension": dimension,
+            "series": [
+                {"clave": clave, "puntos": puntos} for clave, puntos in series.items()
+            ],
+        })
 
 
-class ReporteRutasView(APIView):
+class TiemposEstadoView(DescargaMixin, APIView):
+    """Time-in-state percentiles per ruta, read from incremental summary rows."""
+
     permission_classes = [IsAuthenticated]
+    throttle_scope = "reportes"
 
     def get(self, request):
-        data = (
-            Despacho.objects
-            .values("ruta__codigo", "ruta__origen", "ruta__destino")
-            .annotate(total_despachos=Count("id"))
-            .order_by("-total_despachos")
+        rutas = request.query_params.get("ruta")
+        try:
+            rutas = [int(valor) for valor in rutas.split(",")] if rutas else None
+        except ValueError:
+            return Response(
+                {"ruta": ["Debe ser una lista de ids separados por coma."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(transiciones.resumen(rutas))
+
+
+async def _usuario_stream(request):
+    """Resolve the user from a JWT ``Authorization`` header or the session."""
+    if request.headers.get("Authorization"):
+        resultado = await sync_to_async(CachedJWTAuthentication().authenticate)(request)
+        if resultado:
+            return resultado[0]
+    return await request.auser()
+
+
+async def stream_despachos(request):
+    """Server-Sent Events stream of Despacho changes (ASGI only).
+
+    Optional filters: ``ruta`` (id) and ``estado``; ``estado`` also matches
+    the changes that leave it (``estado_anterior``). ``cursor`` or the
+    ``Last-Event-ID`` header resume right after an already received event.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {"detail": "El stream de despachos requiere un servidor ASGI."}, status=501
+        )
+    try:
+        usuario = await _usuario_stream(request)
+    except AuthenticationFailed as exc:
+        return JsonResponse({"detail": str(exc.detail)}, status=401)
+    if not usuario.is_authenticated:
+        return JsonResponse(
+            {"detail": "Las credenciales de autenticación no se proveyeron."}, status=401
         )
-        return Response(data)
\ No newline at end of file
+
+    try:
+        ruta = int(request.GET["ruta"]) if request.GET.get("ruta") else None
+        cursor = request.GET.get("cursor") or request.headers.get("Last-Event-ID")
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        return JsonResponse({"detail": "Parámetros 'ruta' y 'cursor' deben ser enteros."}, status=400)
+    estado = request.GET.get("estado") or None
+
+    async def flujo():
+        yield "retry: 3000\n\n"
+        async for evento in obtener_hub().suscribir(cursor):
+            if evento is None:
+                yield ": ping\n\n"
+                continue
+            datos = evento.datos
+            if datos["tipo"] != "reinicio" and (
+                (ruta and datos["ruta"] != ruta)
+                or (estado and estado not in (datos["estado"], datos["estado_anterior"]))
+            ):
+                continue
+            yield f"id: {evento.cursor}\nevent: despacho\ndata: {evento.json}\n\n"
+
+    response = StreamingHttpResponse(flujo(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response